@@ -0,0 +1,73 @@
+from classes.constants import ALARM_SEVERITY_IDS
+from classes.table import PipeTable
+from classes.ssh import ALARM_COLUMNS
+
+__author__ = 'Andy Nguyen'
+
+
+class AlarmWatcher:
+	"""Tracks the alarm table of one device between polls.
+
+	Each poll returns only the alarms raised and cleared since the previous one.
+	Rows whose eventId is already known are skipped after reading the ID cell,
+	so no dict is built for them, and an index of active eventIds by severity
+	is kept up to date.
+
+	Args:
+			alarm_severity: dictionary of severity name to number, defaults to constants.ALARM_SEVERITY_IDS
+	"""
+
+	def __init__(self, alarm_severity=None):
+		self.alarm_severity = alarm_severity or ALARM_SEVERITY_IDS
+		self.active = {}
+		self.by_severity = {}
+		self.polls = 0
+
+	def update(self, lines):
+		"""Applies a new copy of the show alarm output.
+
+		Args:
+				lines: iterable of output lines
+
+		Returns:
+				Tuple of (raised, cleared) lists of alarms ex. {'eventId': 175, 'severity': 4, 'desc': '...'}
+		"""
+		table = PipeTable('ID', ALARM_COLUMNS)
+		seen = set()
+		raised = []
+		for cells in table.rows(lines):
+			event_id = int(cells[table.index['eventId']])
+			seen.add(event_id)
+			if event_id in self.active:
+				continue
+			row = table.record(cells)
+			alarm = {
+				'eventId': event_id,
+				'severity': self.alarm_severity.get(row['severity']),
+				'desc': row['desc']
+			}
+			self.active[event_id] = alarm
+			self.by_severity.setdefault(alarm['severity'], set()).add(event_id)
+			raised.append(alarm)
+		cleared = []
+		for event_id in self.active.keys() - seen:
+			alarm = self.active.pop(event_id)
+			self.by_severity[alarm['severity']].discard(event_id)
+			cleared.append(alarm)
+		self.polls += 1
+		return raised, cleared
+
+	def poll(self, ssh):
+		"""Runs show alarm on an SSH device and applies it with update()."""
+		return self.update(ssh.iter_cmd_lines('show alarm'))
+
+	def alarms_with(self, severity):
+		"""Returns the active alarms of a severity, given as a name ex. 'MAJOR' or a number."""
+		if isinstance(severity, str):
+			severity = self.alarm_severity.get(severity.upper())
+		return [self.active[i] for i in self.by_severity.get(severity, ())]
+
+	def counts(self):
+		"""Returns the number of active alarms for every severity name."""
+		return {name: len(self.by_severity.get(number, ()))
+				for name, number in self.alarm_severity.items()}
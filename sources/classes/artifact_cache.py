@@ -0,0 +1,243 @@
+import contextlib
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+__author__ = 'Andy Nguyen'
+
+
+def file_sha256(path, chunk=1024 * 1024):
+	"""Hex SHA-256 of a file, read in chunks."""
+	digest = hashlib.sha256()
+	with open(path, 'rb') as f:
+		for block in iter(lambda: f.read(chunk), b''):
+			digest.update(block)
+	return digest.hexdigest()
+
+
+class ArtifactCache:
+	"""Local content-addressed cache of firmware files.
+
+	Files are stored once per content hash as <root>/<sha256>/<name>, so an
+	upload still sees the original file name, and an index maps (version, name)
+	to the hash. The least recently used files are removed when the cache grows
+	over its disk budget, except the one just added and pinned ones.
+
+	Concurrent access is safe between threads and between processes: the index
+	is only changed under an fcntl lock on <root>/index.lock, and fetch() holds
+	a lock per artifact while downloading so a build is only downloaded once
+	however many upgrades ask for it at the same time. A pinned file holds a
+	shared fcntl lock on its own lock file under <root>/pins, which any process
+	has to take exclusively to evict it.
+
+	Args:
+			root: cache directory, created if missing
+			budget: most bytes kept on disk
+
+	ex.
+			cache = ArtifactCache('/var/cache/k2')
+			path = cache.fetch('5.1.2.0', 'SyncServer6x0_v5.1.2.bin', download, pin=True)
+			with SharedImage(path) as image:
+				cache.release(path)
+	"""
+
+	def __init__(self, root, budget=8 * 1024 ** 3):
+		self.root = root
+		self.budget = budget
+		self.hits = 0
+		self.misses = 0
+		os.makedirs(os.path.join(root, 'locks'), exist_ok=True)
+		os.makedirs(os.path.join(root, 'pins'), exist_ok=True)
+		self._index_path = os.path.join(root, 'index.json')
+		self._thread_lock = threading.RLock()
+		self._key_locks = {}
+		self._pinned = {}
+
+	@contextlib.contextmanager
+	def _file_lock(self, path):
+		with open(path, 'a') as f:
+			fcntl.flock(f, fcntl.LOCK_EX)
+			try:
+				yield
+			finally:
+				fcntl.flock(f, fcntl.LOCK_UN)
+
+	@contextlib.contextmanager
+	def _locked_index(self):
+		"""Yields the index and writes it back afterwards, holding both locks."""
+		with self._thread_lock, self._file_lock(os.path.join(self.root, 'index.lock')):
+			try:
+				with open(self._index_path) as f:
+					index = json.load(f)
+			except (IOError, ValueError):
+				index = {}
+			yield index
+			tmp = self._index_path + '.tmp'
+			with open(tmp, 'w') as f:
+				json.dump(index, f)
+			os.replace(tmp, self._index_path)
+
+	@staticmethod
+	def _key(version, name):
+		return str(version) + '/' + name
+
+	def _path(self, entry):
+		return os.path.join(self.root, entry['sha256'], entry['name'])
+
+	def get(self, version, name, pin=False):
+		"""Returns the cached path of an artifact, or None if it is not cached.
+
+		Args:
+				version: build version
+				name: artifact file name
+				pin: keep the file from being evicted until release(path) is called
+		"""
+		with self._locked_index() as index:
+			entry = index.get(self._key(version, name))
+			if entry is None or not os.path.exists(self._path(entry)):
+				index.pop(self._key(version, name), None)
+				return None
+			entry['used'] = time.time()
+			if pin:
+				self._pin(self._path(entry))
+			return self._path(entry)
+
+	def put(self, version, name, src, expected_sha256=None, pin=False):
+		"""Moves a downloaded file into the cache.
+
+		Args:
+				version: build version ex. '5.1.2.0'
+				name: artifact file name
+				src: path of the downloaded file, it is moved, not copied
+				expected_sha256: hex digest the file must have
+				pin: keep the file from being evicted until release(path) is called
+
+		Returns:
+				Path of the cached file
+
+		Raises:
+				ValueError: If expected_sha256 is given and does not match
+		"""
+		sha256 = file_sha256(src)
+		if expected_sha256 is not None and sha256 != expected_sha256.lower():
+			os.remove(src)
+			raise ValueError(name + ' checksum mismatch. Expected ' + expected_sha256 + ', got ' + sha256)
+		entry = {'sha256': sha256, 'name': name, 'size': os.path.getsize(src), 'used': time.time()}
+		path = self._path(entry)
+		with self._locked_index() as index:
+			os.makedirs(os.path.dirname(path), exist_ok=True)
+			if os.path.exists(path):
+				# Same content is already stored under another version
+				os.remove(src)
+			else:
+				os.replace(src, path)
+			index[self._key(version, name)] = entry
+			if pin:
+				self._pin(path)
+			self._evict(index, keep=path)
+		return path
+
+	def fetch(self, version, name, download, expected_sha256=None, pin=False):
+		"""Returns the cached artifact, downloading it first if it is missing.
+
+		Args:
+				version: build version
+				name: artifact file name
+				download: function(directory) that downloads name into directory
+				expected_sha256: hex digest the file must have
+				pin: keep the file from being evicted until release(path) is called,
+						so another fetch can not remove it before the caller opens it
+
+		Returns:
+				Path of the cached file
+		"""
+		key = self._key(version, name)
+		with self._thread_lock:
+			key_lock = self._key_locks.setdefault(key, threading.Lock())
+		lock_file = os.path.join(self.root, 'locks', hashlib.sha1(key.encode('utf-8')).hexdigest())
+		with key_lock, self._file_lock(lock_file):
+			path = self.get(version, name, pin)
+			if path is not None:
+				self.hits += 1
+				return path
+			self.misses += 1
+			logging.info('Downloading ' + name + ' ' + str(version) + ' into the artifact cache')
+			tmp_dir = tempfile.mkdtemp(prefix='.download-', dir=self.root)
+			try:
+				download(tmp_dir)
+				return self.put(version, name, os.path.join(tmp_dir, name), expected_sha256, pin)
+			finally:
+				shutil.rmtree(tmp_dir, ignore_errors=True)
+
+	def _pin_file(self, path):
+		return os.path.join(self.root, 'pins', hashlib.sha1(path.encode('utf-8')).hexdigest())
+
+	def _pin(self, path):
+		with self._thread_lock:
+			if path not in self._pinned:
+				f = open(self._pin_file(path), 'a')
+				fcntl.flock(f, fcntl.LOCK_SH)
+				self._pinned[path] = [0, f]
+			self._pinned[path][0] += 1
+
+	def release(self, path):
+		"""Lets a file pinned by get, put or fetch be evicted again."""
+		with self._thread_lock:
+			pin = self._pinned[path]
+			pin[0] -= 1
+			if not pin[0]:
+				del self._pinned[path]
+				fcntl.flock(pin[1], fcntl.LOCK_UN)
+				pin[1].close()
+
+	@contextlib.contextmanager
+	def pinned(self, path):
+		"""Keeps a cached file from being evicted while it is in use."""
+		self._pin(path)
+		try:
+			yield path
+		finally:
+			self.release(path)
+
+	def _evict(self, index, keep=None):
+		files = {}
+		for key, entry in index.items():
+			files.setdefault(self._path(entry), []).append(key)
+		sizes = {path: index[keys[0]]['size'] for path, keys in files.items()}
+		total = sum(sizes.values())
+		used = {path: max(index[k]['used'] for k in keys) for path, keys in files.items()}
+		for path in sorted(files, key=used.get):
+			if total <= self.budget:
+				break
+			if path == keep:
+				continue
+			with open(self._pin_file(path), 'a') as pin:
+				try:
+					fcntl.flock(pin, fcntl.LOCK_EX | fcntl.LOCK_NB)
+				except OSError:
+					# Pinned by this or another process
+					continue
+				logging.info('Evicting ' + path + ' from the artifact cache')
+				with contextlib.suppress(OSError):
+					os.remove(path)
+					os.rmdir(os.path.dirname(path))
+				fcntl.flock(pin, fcntl.LOCK_UN)
+			for key in files[path]:
+				del index[key]
+			total -= sizes[path]
+
+	def evict(self):
+		"""Removes least recently used files until the cache fits its budget."""
+		with self._locked_index() as index:
+			self._evict(index)
+
+	def size(self):
+		"""Bytes used by the cached files."""
+		with self._locked_index() as index:
+			return sum({self._path(e): e['size'] for e in index.values()}.values())
@@ -0,0 +1,163 @@
+import asyncio
+import functools
+import json
+import logging
+import requests
+import urllib3
+from classes.constants import CLOCK_STATE, REFERENCE_IDS
+from classes.transport import Transport, TargetConnectionError, CircuitOpenError
+logging.getLogger('urllib3').propagate = False
+urllib3.disable_warnings()
+
+__author__ = 'Andy Nguyen'
+
+
+class AsyncTarget:
+	"""Asyncio counterpart of Target with the same endpoint methods.
+
+	The blocking requests calls are run on an executor so many AsyncTargets can
+	be awaited together from one event loop. Requests go through the same
+	Transport as Target, so they are retried and raise TargetError subclasses
+	that a Fleet reports per device.
+	"""
+
+	def __init__(self, IP, v1_or_v2, user, passwd, timeout=30, executor=None, transport=None,
+				 metrics=None):
+		self.IP = IP
+		self.user = user
+		self.passwd = passwd
+		self.v1_or_v2 = v1_or_v2
+		self.base_url = 'https://' + self.IP + '/api/' + self.v1_or_v2
+		self.timeout = timeout
+		self.executor = executor
+		self.transport = transport or Transport(timeout=timeout, metrics=metrics)
+		self.curr_ref = None
+		self.failed_lock = False
+		self.clock_state = CLOCK_STATE
+		self.reference_IDs = REFERENCE_IDS
+		self.session = None
+		self._open_lock = None
+		self._open_loop = None
+
+	@property
+	def metrics(self):
+		return self.transport.metrics
+
+	def _open(self):
+		"""Starts the requests session on first use."""
+		session = requests.Session()
+		session.auth = (self.user, self.passwd)
+		self.transport.request(session, 'POST', self.base_url, device=self.IP)
+		self.session = session
+
+	def _send(self, method, endpoint, **kwargs):
+		return self.transport.request(self.session, method, self.base_url + endpoint,
+									  device=self.IP, endpoint=endpoint, **kwargs)
+
+	async def _request(self, method, endpoint, **kwargs):
+		loop = asyncio.get_running_loop()
+		if self.session is None:
+			# One lock per event loop, as a Fleet.call runs each fan-out on a new one
+			if self._open_loop is not loop:
+				self._open_lock = asyncio.Lock()
+				self._open_loop = loop
+			async with self._open_lock:
+				# Concurrent first calls wait here for the one session instead of each opening one
+				if self.session is None:
+					await loop.run_in_executor(self.executor, self._open)
+		call = functools.partial(self._send, method, endpoint, **kwargs)
+		return await loop.run_in_executor(self.executor, call)
+
+	async def get(self, endpoint):
+		"""Makes a GET request using the given in self.IP
+
+		Args:
+				endpoint: API endpoint string ex: /system/state
+
+		Returns:
+				The data for the GET request
+
+		Raises:
+				TargetError: If there is an error in the request
+		"""
+		response = await self._request('GET', endpoint)
+		return json.loads(response.text)
+
+	async def post(self, endpoint, data):
+		"""Makes a POST request using the given in self.IP
+
+		Args:
+				endpoint: API endpoint string ex: /system/state
+
+		Returns:
+				The status code if the POST request was successful
+
+		Raises:
+				TargetError: If there is an error in the request
+		"""
+		response = await self._request('POST', endpoint, data=json.dumps(data))
+		return response.status_code
+
+	async def put(self, endpoint, data):
+		"""Makes a PUT request using the given IP
+
+		Args:
+				endpoint: API endpoint string ex: /system/state
+
+		Returns:
+				The status code of if the PUT request was successful
+
+		Raises:
+				TargetError: If there is an error in the request
+		"""
+		response = await self._request('PUT', endpoint, data=json.dumps(data))
+		return response.status_code
+
+	async def delete(self, endpoint):
+		"""Makes a DELETE request using the given IP
+
+		Args:
+				endpoint: API endpoint string ex: /system/state
+
+		Returns:
+				The status code of if the DELETE request was successful
+
+		Raises:
+				TargetError: If there is an error in the request
+		"""
+		# The API requires an empty {} for the data even though its optional
+		response = await self._request('DELETE', endpoint, data=json.dumps({}))
+		return response.status_code
+
+	async def lock_poll_for(self, endpoint, ref, interval=60, attempts=30):
+		"""Polls until it is "Locked" to the ref given without blocking the event loop.
+
+		Args:
+				endpoint: API endpoint string ex: /system/state
+				ref: Reference that the user wants to lock to ex: GNSS, NTP, or PTP
+				interval: seconds to wait between checks
+				attempts: number of checks before giving up
+
+		Return:
+				True or False depending on if the K2 is "Locked" to the given ref
+		"""
+		state = None
+		sys_ref = None
+		for _ in range(attempts):
+			try:
+				data = await self.get(endpoint)
+				state = self.clock_state.get(int(data.get('syncState')))
+				sys_ref = self.reference_IDs.get(int(data.get('currRef')))
+				if state == 'Locked' and sys_ref == ref:
+					logging.info(self.IP + ': Sucessfully locked to ' + sys_ref + '.')
+					self.curr_ref = sys_ref
+					self.failed_lock = False
+					return True
+			except (TargetConnectionError, CircuitOpenError):
+				logging.info(self.IP + ': Server is down. Sleeping still.')
+			await asyncio.sleep(interval)
+		logging.error(self.IP + ': Failed to lock to ' + ref + '.')
+		self.curr_ref = 'FAILED. Timed out before locking.\nCurrently locked to ' + \
+			str(sys_ref) + '.\nCurrent sync state = ' + str(state) + '.'
+		self.failed_lock = True
+		return False
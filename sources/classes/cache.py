@@ -0,0 +1,89 @@
+import json
+import threading
+import time
+
+__author__ = 'Andy Nguyen'
+
+
+class ResponseCache:
+	"""TTL cache for GET responses, keyed by endpoint.
+
+	The response text is stored and decoded on every hit, so callers that modify
+	the returned dict (most of the Target helpers do) never change the cached copy.
+	Writes to a resource invalidate it together with its parents and children,
+	ex. PUT /ntp/servers/1 drops /ntp/servers and /ntp/servers/1.
+
+	Args:
+			ttl: default seconds an entry stays valid
+			ttls: dictionary of endpoint prefix to seconds, 0 means never cache it.
+					The longest matching prefix wins ex. {'/system/state': 0, '/gnss': 30}
+			clock: function returning the current time in seconds
+	"""
+
+	def __init__(self, ttl=5, ttls=None, clock=time.monotonic):
+		self.ttl = ttl
+		self.ttls = dict(ttls or {})
+		self.clock = clock
+		self.hits = 0
+		self.misses = 0
+		self._entries = {}
+		self._lock = threading.Lock()
+
+	def ttl_for(self, endpoint):
+		best = None
+		for prefix in self.ttls:
+			if endpoint.startswith(prefix) and (best is None or len(prefix) > len(best)):
+				best = prefix
+		if best is None:
+			return self.ttl
+		return self.ttls[best]
+
+	def get(self, endpoint):
+		"""Looks up an endpoint.
+
+		Returns:
+				Tuple of (hit, data). data is None on a miss.
+		"""
+		with self._lock:
+			entry = self._entries.get(endpoint)
+			if entry is not None and entry[0] > self.clock():
+				self.hits += 1
+				text = entry[1]
+			else:
+				if entry is not None:
+					del self._entries[endpoint]
+				self.misses += 1
+				return False, None
+		return True, json.loads(text)
+
+	def put(self, endpoint, text):
+		"""Stores the response text for an endpoint if its TTL allows caching."""
+		ttl = self.ttl_for(endpoint)
+		if ttl <= 0:
+			return
+		with self._lock:
+			self._entries[endpoint] = (self.clock() + ttl, text)
+
+	def invalidate(self, endpoint):
+		"""Drops every entry for the resource path, its parents and its children."""
+		path = endpoint.rstrip('/')
+		with self._lock:
+			for key in list(self._entries):
+				k = key.rstrip('/')
+				if k == path or path.startswith(k + '/') or k.startswith(path + '/'):
+					del self._entries[key]
+
+	def clear(self):
+		with self._lock:
+			self._entries.clear()
+
+	def stats(self):
+		"""Returns a dictionary with hits, misses, entries and hit_rate."""
+		with self._lock:
+			total = self.hits + self.misses
+			return {
+				'hits': self.hits,
+				'misses': self.misses,
+				'entries': len(self._entries),
+				'hit_rate': self.hits / total if total else 0.0
+			}
@@ -0,0 +1,207 @@
+import json
+import logging
+import os
+import re
+import shlex
+import threading
+import time
+from classes.session_pool import read_lines
+
+__author__ = 'Andy Nguyen'
+
+DATE_REG = re.compile(r'([0-9]{4}_[0-9]{2}_[0-9]{2})_sdk')
+AUTH_REG = re.compile(r'[\d]*.[\d]*.[\d]*.[\d]*_auth.dat')
+# Device type -> regex of its upgrade image in a build folder
+IMAGE_REGS = {
+	'K2': re.compile(r'SyncServer6x0_v5.*bin'),
+	'tp4100': re.compile(r'TimeProvider4100_v.*bin')
+}
+# Version in an image file name ex. TimeProvider4100_v2.4.1.bin -> 2.4.1
+VERSION_REG = re.compile(r'_v([0-9]+(?:\.[0-9]+)*)')
+_FOLDER_MARK = '== '
+
+
+class Build:
+	"""The artifacts of one device type in one build folder."""
+
+	def __init__(self, type, folder, date, name, auth_name, version, sizes):
+		self.type = type
+		self.folder = folder
+		self.date = date
+		self.name = name
+		self.auth_name = auth_name
+		self.version = version
+		self.sizes = sizes
+
+	def __repr__(self):
+		return 'Build(' + self.type + ', ' + str(self.version) + ', ' + self.folder + ')'
+
+
+def parse_folder(folder, files):
+	"""Finds the builds in a folder listing.
+
+	Each image gets the version in its own file name, or the longer one of the
+	auth file that starts with it ex. SyncServer6x0_v5.1.2.bin and
+	5.1.2.0_auth.dat -> 5.1.2.0. That auth file goes with the image, or the
+	only auth file of the folder if none matches.
+
+	Args:
+			folder: folder name ex. 2021_09_09_sdk
+			files: dictionary of file name to size
+
+	Returns:
+			Dictionary of device type to Build
+	"""
+	date = DATE_REG.search(folder)
+	date = date.group(1) if date is not None else None
+	auths = {}
+	for name in sorted(files):
+		if AUTH_REG.search(name):
+			auths[re.search('.+?(?=_)', name).group()] = name
+	builds = {}
+	for type, reg in IMAGE_REGS.items():
+		name = next((n for n in sorted(files) if reg.search(n)), None)
+		if name is None or not auths:
+			continue
+		version = VERSION_REG.search(name)
+		version = version.group(1) if version is not None else None
+		matching = [v for v in auths if version is not None and (v == version or v.startswith(version + '.'))]
+		if matching:
+			version = max(matching, key=len)
+			auth_name = auths[version]
+		elif len(auths) == 1:
+			auth_name = next(iter(auths.values()))
+			if version is None:
+				version = next(iter(auths))
+		else:
+			continue
+		sizes = {name: files[name], auth_name: files[auth_name]}
+		builds[type] = Build(type, folder, date, name, auth_name, version, sizes)
+	return builds
+
+
+class BuildCatalog:
+	"""Local index of the build folders on the build server.
+
+	The index remembers every folder it has listed, so refresh() only lists
+	the folders that are new since the last scan (plus the newest known one, in
+	case it was still being written). latest() and find() are answered from the
+	index without logging in to the build server.
+
+	Args:
+			path: JSON file the index is kept in, None to keep it in memory only
+			max_age: seconds after which stale() says the index should be refreshed
+
+	ex.
+			catalog = BuildCatalog('builds.json')
+			with image._session(...) as child:
+				catalog.refresh(child, image.prompt, image.path)
+			catalog.latest('K2')
+			catalog.find('tp4100', '2.4.1')
+	"""
+
+	def __init__(self, path=None, max_age=600):
+		self.path = path
+		self.max_age = max_age
+		self.folders = {}
+		self.scanned = 0.0
+		self._lock = threading.Lock()
+		self._builds = {}
+		if path is not None and os.path.exists(path):
+			self.load()
+
+	def load(self):
+		with open(self.path) as f:
+			data = json.load(f)
+		with self._lock:
+			self.folders = data.get('folders', {})
+			self.scanned = data.get('scanned', 0.0)
+			self._reindex()
+
+	def save(self):
+		if self.path is None:
+			return
+		with self._lock:
+			data = {'folders': self.folders, 'scanned': self.scanned}
+		tmp = self.path + '.tmp'
+		with open(tmp, 'w') as f:
+			json.dump(data, f)
+		os.replace(tmp, self.path)
+
+	def _reindex(self):
+		# type -> list of Build, newest first
+		builds = {}
+		for folder, files in self.folders.items():
+			for type, build in parse_folder(folder, files).items():
+				builds.setdefault(type, []).append(build)
+		for type in builds:
+			builds[type].sort(key=lambda b: (b.date or '', b.folder), reverse=True)
+		self._builds = builds
+
+	def stale(self):
+		return time.time() - self.scanned > self.max_age
+
+	def refresh(self, child, prompt, path):
+		"""Lists the build folders that are new since the last scan over a logged in session.
+
+		Args:
+				child: pexpect child logged in to the build server
+				prompt: regex of its shell prompt
+				path: directory holding the build folders
+
+		Returns:
+				List of the folders that were listed
+		"""
+		child.sendline('cd ' + path)
+		child.expect(prompt)
+		folders = []
+		for line in read_lines(child, 'ls -1d -- */', prompt):
+			name = line.strip().rstrip('/')
+			if DATE_REG.search(name):
+				folders.append(name)
+		with self._lock:
+			known = set(self.folders)
+			newest = max(known, key=lambda f: (DATE_REG.search(f).group(1), f)) if known else None
+		todo = [f for f in folders if f not in known or f == newest]
+		listed = {}
+		if todo:
+			# One command for all new folders, each listing starts with a marker line
+			cmd = ('for d in ' + ' '.join(shlex.quote(f) for f in todo) + '; ' +
+				   'do echo "' + _FOLDER_MARK + '$d"; ' +
+				   'ls -l -- "$d"; done')
+			current = None
+			for line in read_lines(child, cmd, prompt):
+				if line.startswith(_FOLDER_MARK):
+					current = line[len(_FOLDER_MARK):].strip()
+					listed[current] = {}
+					continue
+				parts = line.split()
+				if current is not None and len(parts) >= 9 and parts[4].isdigit():
+					listed[current][parts[-1]] = int(parts[4])
+		with self._lock:
+			# Folders removed from the build server are dropped
+			self.folders = {f: self.folders.get(f, {}) for f in folders}
+			self.folders.update(listed)
+			self.scanned = time.time()
+			self._reindex()
+		logging.info('Build catalog: ' + str(len(listed)) + ' folders listed, ' +
+					 str(len(self.folders)) + ' known')
+		self.save()
+		return list(listed)
+
+	def builds(self, type):
+		"""All builds of a device type, newest first."""
+		with self._lock:
+			return list(self._builds.get(type, []))
+
+	def latest(self, type):
+		"""Newest build of a device type ('K2' or 'tp4100'), or None."""
+		builds = self.builds(type)
+		return builds[0] if builds else None
+
+	def find(self, type, version):
+		"""Newest build of a device type with a version ex. '5.1.2.0', or '5.1.2' for any 5.1.2.x."""
+		for build in self.builds(type):
+			if build.version == version or build.version.startswith(version + '.'):
+				return build
+		return None
@@ -0,0 +1,121 @@
+import concurrent.futures
+import logging
+import time
+from classes.fleet import FleetResult
+from classes.ssh import SSH
+
+__author__ = 'Andy Nguyen'
+
+
+class CliFleet:
+	"""Runs a CLI command or an SSH parser on many devices at once.
+
+	Devices are either SSH objects that are already logged in, or dictionaries
+	of SSH arguments ex. {'IP': ..., 'user': ..., 'passwd': ..., 'root_passwd': ...,
+	'prompt': ...}. Those are logged in on the worker threads, so logins overlap
+	as well as commands, and closed (or given back to the pool) afterwards.
+
+	Every login and every wait for the prompt is limited to timeout seconds
+	instead of the 300 s pexpect default, so a hung device only costs its own
+	worker that long. Results are streamed back as each device finishes.
+
+	Args:
+			devices: list of SSH objects or dictionaries of SSH arguments
+			concurrency: maximum number of devices worked on at once
+			timeout: seconds a login or command may wait for the prompt
+			pool: optional SessionPool used for devices given as dictionaries
+
+	ex.
+			fleet = CliFleet(devices, concurrency=16, timeout=30)
+			for result in fleet.stream('get_system'):
+				print(result.device, result.value)
+	"""
+
+	def __init__(self, devices, concurrency=8, timeout=60, pool=None):
+		self.devices = list(devices)
+		self.concurrency = concurrency
+		self.timeout = timeout
+		self.pool = pool
+
+	def __len__(self):
+		return len(self.devices)
+
+	@staticmethod
+	def _key(device):
+		if isinstance(device, dict):
+			return device['IP']
+		return getattr(device, 'IP', device)
+
+	def _open(self, device):
+		"""Returns (ssh, owned), logging in if the device is given as arguments."""
+		if not isinstance(device, dict):
+			return device, False
+		kwargs = dict(device)
+		kwargs.setdefault('timeout', self.timeout)
+		kwargs.setdefault('pool', self.pool)
+		return SSH(**kwargs), True
+
+	def _run(self, device, method, args, kwargs):
+		start = time.monotonic()
+		ssh = None
+		owned = False
+		broken = False
+		child = None
+		try:
+			ssh, owned = self._open(device)
+			if not owned:
+				# The caller's session only gets the fleet timeout for this call
+				child = getattr(ssh, 'child', None)
+				if child is not None:
+					old_timeout = child.timeout
+					child.timeout = self.timeout
+			if callable(method):
+				value = method(ssh, *args, **kwargs)
+			else:
+				value = getattr(ssh, method)(*args, **kwargs)
+			return FleetResult(self._key(device), value, None, time.monotonic() - start)
+		except Exception as e:
+			broken = True
+			logging.warning(str(self._key(device)) + ': ' + repr(e))
+			return FleetResult(self._key(device), None, e, time.monotonic() - start)
+		finally:
+			if child is not None:
+				child.timeout = old_timeout
+			if owned and ssh is not None:
+				ssh.close(broken=broken)
+
+	def stream(self, method, *args, **kwargs):
+		"""Yields a FleetResult for every device in the order they finish.
+
+		Args:
+				method: name of an SSH method ex. 'get_system', or a function called
+						with the SSH object followed by args and kwargs
+
+		Returns:
+				Generator of FleetResult
+		"""
+		executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency)
+		try:
+			futures = [executor.submit(self._run, d, method, args, kwargs) for d in self.devices]
+			for future in concurrent.futures.as_completed(futures):
+				yield future.result()
+		finally:
+			# Devices not started yet are dropped if the caller stops early
+			executor.shutdown(wait=True, cancel_futures=True)
+
+	def call(self, method, *args, **kwargs):
+		"""Runs method on every device and waits for all of them.
+
+		Returns:
+				Dictionary of IP to FleetResult in device order
+		"""
+		results = {r.device: r for r in self.stream(method, *args, **kwargs)}
+		return {self._key(d): results[self._key(d)] for d in self.devices}
+
+	def command(self, cmd):
+		"""Runs one CLI command everywhere, ex. fleet.command('show clock').
+
+		Returns:
+				Dictionary of IP to FleetResult holding the command output
+		"""
+		return self.call('get_cmd_results', cmd)
@@ -0,0 +1,53 @@
+__author__ = 'Andy Nguyen'
+
+ALARM_SEVERITY = {
+	3: 'MAJOR',
+	4: 'MINOR',
+	5: 'NOTIFY'
+}
+ALARM_SEVERITY_IDS = {name: id for id, name in ALARM_SEVERITY.items()}
+CLOCK_STATE = {
+	0: 'Warmup',
+	1: 'Freerun',
+	2: 'Handset',
+	3: 'Locking',
+	4: 'Locked',
+	5: 'Bridging',
+	6: 'Holdover',
+	7: 'Holdover expired',
+	8: 'Recovering',
+	9: 'Handset -M',
+	10: 'Locked - M',
+	11: 'Holdover - M'
+}
+API_INPUT_TIME_SRC = {
+	0: 'GNSS',
+	1: 'Slot A J1 Timecode',
+	2: 'Slot B J1 Timecode',
+	3: 'PTP'
+}
+READABLE_INPUT_TIME_SRC = {
+	'GNSS': 0,
+	'Slot A J1 Timecode': 1,
+	'Slot B J1 Timecode': 2,
+	'PTP': 3
+}
+REFERENCE_IDS = {
+	0: 'GNSS',
+	1: 'Slot A J1 Timecode',
+	2: 'Slot B J1 Timecode',
+	3: 'PPS Slot A',
+	4: 'PPS Slot B',
+	5: 'Frequency signal connected to J2 Slot A',
+	6: 'Frequency signal connected to J2 Slot B',
+	7: 'Frequency signal connected to J1 Slot A',
+	8: 'Frequency signal connected to J1 Slot B',
+	9: 'Frequency signal connected to J7 Slot A',
+	10: 'Frequency signal connected to J7 Slot B',
+	11: 'PTP',
+	12: 'NTP',
+	13: 'Standard',
+	14: 'OCXO Oscillator',
+	15: 'Rubidium Oscillator',
+	16: 'High Performance Rubidium Oscillator'
+}
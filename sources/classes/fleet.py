@@ -0,0 +1,158 @@
+import asyncio
+import concurrent.futures
+import functools
+import inspect
+import logging
+import time
+from classes.metrics import Metrics
+from classes.transport import deadline
+
+__author__ = 'Andy Nguyen'
+
+
+class FleetResult:
+	"""Outcome of one call on one device."""
+
+	def __init__(self, device, value=None, error=None, elapsed=0.0):
+		self.device = device
+		self.value = value
+		self.error = error
+		self.elapsed = elapsed
+
+	@property
+	def ok(self):
+		return self.error is None
+
+	def __repr__(self):
+		if self.ok:
+			return 'FleetResult(' + str(self.device) + ', value=' + repr(self.value) + ')'
+		return 'FleetResult(' + str(self.device) + ', error=' + repr(self.error) + ')'
+
+
+class Fleet:
+	"""Fans one call out to many targets with a concurrency limit.
+
+	Targets can be AsyncTarget (coroutine methods are awaited) or blocking
+	objects such as Target (methods are run on an executor). A slow or dead
+	device only holds its own slot; its error or timeout is returned in its
+	FleetResult and the rest of the fleet carries on. Blocking calls run under a
+	transport deadline of the same timeout, so a Target's requests give up and
+	free their thread too.
+
+	Args:
+			targets: list of objects with an IP attribute
+			concurrency: maximum number of devices worked on at once
+			timeout: seconds allowed per device call, None for no limit
+	"""
+
+	def __init__(self, targets, concurrency=16, timeout=None):
+		self.targets = list(targets)
+		self.concurrency = concurrency
+		self.timeout = timeout
+		self._executor = None
+
+	def __len__(self):
+		return len(self.targets)
+
+	def __iter__(self):
+		return iter(self.targets)
+
+	@staticmethod
+	def _key(target):
+		return getattr(target, 'IP', target)
+
+	def _blocking(self, func, args, kwargs):
+		with deadline(self.timeout):
+			return func(*args, **kwargs)
+
+	async def _dispatch(self, target, method, args, kwargs):
+		if isinstance(method, str):
+			func = getattr(target, method)
+		else:
+			func = functools.partial(method, target)
+		if inspect.iscoroutinefunction(func):
+			value = await func(*args, **kwargs)
+		else:
+			loop = asyncio.get_running_loop()
+			value = await loop.run_in_executor(
+				self._executor, functools.partial(self._blocking, func, args, kwargs))
+		if inspect.isawaitable(value):
+			value = await value
+		return value
+
+	async def _invoke(self, semaphore, target, method, args, kwargs):
+		async with semaphore:
+			start = time.monotonic()
+			try:
+				value = await asyncio.wait_for(
+					self._dispatch(target, method, args, kwargs), self.timeout)
+				return FleetResult(self._key(target), value=value,
+								   elapsed=time.monotonic() - start)
+			except asyncio.TimeoutError:
+				error = TimeoutError(str(self._key(target)) + ' timed out after ' +
+									 str(self.timeout) + ' seconds')
+			except Exception as e:
+				error = e
+			logging.error(str(self._key(target)) + ': ' + repr(error))
+			return FleetResult(self._key(target), error=error,
+							   elapsed=time.monotonic() - start)
+
+	async def stream(self, method, *args, **kwargs):
+		"""Runs method on every target and yields each FleetResult as it finishes.
+
+		Args:
+				method: name of the target method or a callable taking the target first
+				*args, **kwargs: passed through to the method
+		"""
+		semaphore = asyncio.Semaphore(self.concurrency)
+		tasks = [asyncio.ensure_future(self._invoke(semaphore, t, method, args, kwargs))
+				 for t in self.targets]
+		try:
+			for next_done in asyncio.as_completed(tasks):
+				yield await next_done
+		finally:
+			for task in tasks:
+				task.cancel()
+
+	async def run(self, method, *args, **kwargs):
+		"""Runs method on every target.
+
+		Returns:
+				Dictionary of device IP to FleetResult, in target order
+		"""
+		results = {}
+		async for result in self.stream(method, *args, **kwargs):
+			results[result.device] = result
+		return {self._key(t): results[self._key(t)] for t in self.targets}
+
+	def metrics(self):
+		"""Combines the request Metrics of every target into one.
+
+		Targets sharing a Metrics instance are only counted once.
+
+		Returns:
+				Metrics for the whole fleet
+		"""
+		combined = Metrics()
+		seen = set()
+		for target in self.targets:
+			metrics = getattr(target, 'metrics', None)
+			if metrics is not None and id(metrics) not in seen:
+				seen.add(id(metrics))
+				combined.merge(metrics)
+		return combined
+
+	def call(self, method, *args, **kwargs):
+		"""Blocking entry point for run() from scripts that are not async.
+
+		Blocking targets run on an executor of their own, sized to the
+		concurrency limit. It is not waited for on the way out, so a call still
+		stuck after its timeout can not hold up the results of the others.
+		"""
+		executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency)
+		self._executor = executor
+		try:
+			return asyncio.run(self.run(method, *args, **kwargs))
+		finally:
+			self._executor = None
+			executor.shutdown(wait=False, cancel_futures=True)
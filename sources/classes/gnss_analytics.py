@@ -0,0 +1,217 @@
+import array
+import math
+
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
+__author__ = 'Andy Nguyen'
+
+# Numeric columns of the satellite view, in SSH.get_gnss key names
+NUMERIC_FIELDS = ('satId', 'snr', 'azimuthAngle', 'elevationAngle', 'prRes')
+SATELLITE_DTYPE = [
+	('device', 'i4'),
+	('sample', 'i4'),
+	('satId', 'i4'),
+	('gnssId', 'U16'),
+	('snr', 'f4'),
+	('azimuthAngle', 'f4'),
+	('elevationAngle', 'f4'),
+	('prRes', 'f4')
+]
+
+
+def _require_numpy():
+	if np is None:
+		raise ImportError('numpy is needed for the GNSS array analytics, install it with pip install numpy')
+
+
+def _float(value):
+	try:
+		return float(value)
+	except (TypeError, ValueError):
+		return math.nan
+
+
+def _numeric(values):
+	"""Converts a list of strings to a float64 array, NaN where a cell is not a number."""
+	try:
+		# numpy parses the whole column in C when every cell is a number
+		return np.array(values, dtype='f8')
+	except (TypeError, ValueError):
+		return np.fromiter((_float(v) for v in values), dtype='f8', count=len(values))
+
+
+def to_columns(view):
+	"""Converts a satellite view from SSH.get_gnss to columns, without numpy.
+
+	Args:
+			view: list of satellite dictionaries of strings
+
+	Returns:
+			Dictionary of field to array.array('d') for the numeric fields and a
+			list of strings for gnssId. Cells that are not numbers become NaN.
+	"""
+	columns = {name: array.array('d') for name in NUMERIC_FIELDS}
+	columns['gnssId'] = []
+	for sat in view:
+		for name in NUMERIC_FIELDS:
+			columns[name].append(_float(sat.get(name)))
+		columns['gnssId'].append(sat.get('gnssId') or '')
+	return columns
+
+
+def to_array(view, device=0, sample=0):
+	"""Converts a satellite view from SSH.get_gnss to a numpy structured array.
+
+	Args:
+			view: list of satellite dictionaries of strings
+			device: device number stored in every row
+			sample: sample number stored in every row
+
+	Returns:
+			numpy array of SATELLITE_DTYPE. Cells that are not numbers become NaN,
+			and satId -1.
+	"""
+	_require_numpy()
+	out = np.zeros(len(view), dtype=SATELLITE_DTYPE)
+	if not view:
+		return out
+	out['device'] = device
+	out['sample'] = sample
+	out['gnssId'] = [sat.get('gnssId') or '' for sat in view]
+	for name in NUMERIC_FIELDS:
+		values = _numeric([sat.get(name) for sat in view])
+		if name == 'satId':
+			values = np.where(np.isnan(values), -1, values)
+		out[name] = values
+	return out
+
+
+class SatelliteSamples:
+	"""Collects satellite views from many samples and devices into one array.
+
+	Rows are only converted once, when they are added, and the summaries run on
+	whole columns so millions of rows stay in numpy instead of Python loops.
+
+	ex.
+			samples = SatelliteSamples()
+			for device in devices:
+				view, status = device.get_gnss()
+				samples.add(device.IP, view)
+			summarize(samples.to_array(), min_elevation=10)
+	"""
+
+	def __init__(self):
+		_require_numpy()
+		self.devices = []
+		self._device_index = {}
+		self._samples = {}
+		self._chunks = []
+
+	def add(self, device, view):
+		"""Adds one satellite view (list of dicts or an array from to_array) of a device.
+
+		Returns:
+				The sample number given to the view
+		"""
+		index = self._device_index.get(device)
+		if index is None:
+			index = self._device_index[device] = len(self.devices)
+			self.devices.append(device)
+		sample = self._samples.get(index, 0)
+		self._samples[index] = sample + 1
+		if isinstance(view, np.ndarray):
+			view = view.copy()
+			view['device'] = index
+			view['sample'] = sample
+		else:
+			view = to_array(view, index, sample)
+		self._chunks.append(view)
+		return sample
+
+	def __len__(self):
+		return sum(len(c) for c in self._chunks)
+
+	def to_array(self):
+		"""Returns every row added so far as one structured array."""
+		if not self._chunks:
+			return np.zeros(0, dtype=SATELLITE_DTYPE)
+		if len(self._chunks) > 1:
+			self._chunks = [np.concatenate(self._chunks)]
+		return self._chunks[0]
+
+
+def elevation_mask(sats, min_elevation):
+	"""Boolean mask of the satellites at or above min_elevation degrees."""
+	_require_numpy()
+	return sats['elevationAngle'] >= min_elevation
+
+
+def snr_percentiles(sats, percentiles=(5, 25, 50, 75, 95), mask=None):
+	"""SNR percentiles of the satellites, ignoring NaN.
+
+	Returns:
+			Dictionary of percentile to SNR, NaN if there are no satellites
+	"""
+	_require_numpy()
+	snr = sats['snr'] if mask is None else sats['snr'][mask]
+	snr = snr[~np.isnan(snr)]
+	if not len(snr):
+		return {p: math.nan for p in percentiles}
+	values = np.percentile(snr, percentiles)
+	return {p: float(v) for p, v in zip(percentiles, values)}
+
+
+def constellation_counts(sats, mask=None):
+	"""Number of satellite rows per constellation (gnssId)."""
+	_require_numpy()
+	ids = sats['gnssId'] if mask is None else sats['gnssId'][mask]
+	names, counts = np.unique(ids, return_counts=True)
+	return {str(n): int(c) for n, c in zip(names, counts)}
+
+
+def summarize(sats, min_elevation=None, percentiles=(5, 50, 95)):
+	"""Summary of a satellite array, optionally above an elevation mask.
+
+	Returns:
+			Dictionary with rows, used (rows above the mask), snrMean,
+			snrPercentiles, constellations and satsPerSample (mean satellites in view)
+	"""
+	_require_numpy()
+	mask = None if min_elevation is None else elevation_mask(sats, min_elevation)
+	used = sats if mask is None else sats[mask]
+	snr = used['snr'][~np.isnan(used['snr'])]
+	keys = (sats['device'].astype('i8') << 32) | sats['sample'].astype('i8')
+	samples = len(np.unique(keys))
+	return {
+		'rows': int(len(sats)),
+		'used': int(len(used)),
+		'snrMean': float(snr.mean()) if len(snr) else math.nan,
+		'snrPercentiles': snr_percentiles(used, percentiles),
+		'constellations': constellation_counts(used),
+		'satsPerSample': float(len(used)) / samples if samples else 0.0
+	}
+
+
+def summarize_by_device(sats, devices=None, min_elevation=None, percentiles=(5, 50, 95)):
+	"""summarize() for every device in the array.
+
+	Args:
+			sats: structured array ex. SatelliteSamples.to_array()
+			devices: list of device names by device number ex. SatelliteSamples.devices
+
+	Returns:
+			Dictionary of device name (or number) to its summary
+	"""
+	_require_numpy()
+	order = np.argsort(sats['device'], kind='stable')
+	ordered = sats[order]
+	numbers, starts = np.unique(ordered['device'], return_index=True)
+	ends = list(starts[1:]) + [len(ordered)]
+	out = {}
+	for number, start, end in zip(numbers, starts, ends):
+		name = devices[number] if devices is not None else int(number)
+		out[name] = summarize(ordered[start:end], min_elevation, percentiles)
+	return out
@@ -1,3 +1,4 @@
+import contextlib
 import os
 import subprocess
 import re
@@ -5,11 +6,14 @@ import re
 import time
 import pexpect
 import urllib3
+from classes.netprobe import ping
+from classes.session_pool import login, read_lines
 urllib3.disable_warnings()
 
 
 class Image:
-    def __init__(self, DUTIP, path, IP, user, passwd, prompt, type):
+    def __init__(self, DUTIP, path, IP, user, passwd, prompt, type, pool=None, spawn=None,
+                 cache=None, catalog=None, transfer=None):
         self.DUTIP = DUTIP
         self.path = path
         self.IP = IP
@@ -25,31 +29,68 @@ class Image:
         self.is_found = False
         self.success_upgrade = False
         self.version = None
+        # Optional SessionPool so the build server and DUT logins are reused
+        self.pool = pool
+        # Replaces pexpect.spawn ex. a RecordingSpawn or ReplaySpawn
+        self.spawn = spawn
+        # Optional ArtifactCache. With a cache each build is downloaded once and
+        # the local files are kept for the next DUT instead of being removed
+        self.cache = cache
+        # Optional BuildCatalog. With a catalog the build folders are looked up
+        # in the local index and the build server is only listed when it is stale
+        self.catalog = catalog
+        # Optional RangedTransfer. With one the build files are downloaded over
+        # parallel resumable streams and hash checked instead of one scp
+        self.transfer = transfer
+        # Local paths of the downloaded files by name
+        self.files = {}
+        # Sizes of the build files on the build server by name
+        self.sizes = {}
+        # Seconds each step actually took ex. {'scp': 41.2, 'install': 512.0, 'ready': 95.3}
+        self.timings = {}
 
-    def get_image(self):
+    @contextlib.contextmanager
+    def _session(self, host, user, passwd, prompt, root_passwd=None, timeout=300):
+        # Logged in session from the pool, or a new one that is closed afterwards
+        if self.pool is not None:
+            with self.pool.session(host, user, passwd, prompt, root_passwd, timeout) as child:
+                yield child
+        else:
+            child = login(host, user, passwd, prompt, root_passwd, timeout, self.spawn)
+            try:
+                yield child
+            finally:
+                child.close()
+
+    def get_image(self, version=None):
+        """Finds the latest build, or the build of version when there is a catalog,
+        and downloads it for K2."""
+        if self.catalog is not None:
+            return self._get_catalog_image(version)
         ### get latest image version ###
-        os.system("ssh-keygen -f " +
-                  "$HOME/.ssh/known_hosts " + "-R " + self.IP)
-        SSH = 'ssh ' + self.user + '@' + self.IP + ' -o StrictHostKeyChecking=no'
-        child = pexpect.spawn(SSH, timeout=120)
-        child.expect('(?i)Password')
-        child.sendline(self.passwd)
-        child.expect(self.prompt)
-        child.sendline("cd " + self.path)
-        child.expect(self.prompt)
-        child.sendline("ls -td -- */ | head -n 1")
-        child.expect(self.prompt)
-        folder = re.search(self.date_reg, str(child.before))
-        self.date = subprocess.check_output(['date', '+%Y_%m_%d'])
-        if folder is not None:
-            folder = folder.group(0)
-            child.sendline("cd " + folder)
+        with self._session(self.IP, self.user, self.passwd, self.prompt, timeout=120) as child:
+            child.sendline("cd " + self.path)
             child.expect(self.prompt)
-            child.sendline("ls -1")
+            child.sendline("ls -td -- */ | head -n 1")
             child.expect(self.prompt)
-            tmp = str(child.before, encoding="ascii")
-            child.close()
-
+            folder = re.search(self.date_reg, str(child.before))
+            tmp = None
+            if folder is not None:
+                folder = folder.group(0)
+                self.folder = folder
+                child.sendline("cd " + folder)
+                child.expect(self.prompt)
+                # Stream the listing and keep only the firmware files, a build
+                # folder can hold thousands of other artifacts. The sizes are kept
+                # to check the downloads against.
+                self.sizes = {}
+                for line in read_lines(child, "ls -l", self.prompt):
+                    parts = line.split()
+                    if len(parts) >= 9 and parts[-1].endswith(("bin", "_auth.dat")):
+                        self.sizes[parts[-1]] = int(parts[4])
+                tmp = "\n".join(self.sizes)
+        self.date = subprocess.check_output(['date', '+%Y_%m_%d'])
+        if folder is not None:
             self.auth_name = re.search(
                 r"[\d]*.[\d]*.[\d]*.[\d]*_auth.dat", tmp)
             # will make this better later if there are more
@@ -68,21 +109,100 @@ class Image:
                 fw = fw.group(0)
                 self.name = self.name.group(0)
                 self.auth_name = self.auth_name.group(0)
-                tmp = "scp -o StrictHostKeyChecking=no " + str(self.user) + "@" + str(self.IP) + ":" + str(
-                    self.path) + str(folder) + "/{" + str(self.name) + "," + str(self.auth_name) + "} ."
-                child = pexpect.spawn(tmp)
-                child.expect('(?i)Password')
-                child.sendline(self.passwd)
-                time.sleep(20)
-                print('Auth_file_name = ' + self.auth_name +
-                      ". Image Name = " + self.name + '.')
                 # Get version number from auth file
                 search = re.search(".+?(?=_)", self.auth_name)
                 self.version = search.group()
+                self._download_k2(folder)
+                print('Auth_file_name = ' + self.auth_name +
+                      ". Image Name = " + self.name + '.')
                 self.is_found = True
         else:
             print("error in getting K2 image")
 
+    def _download_k2(self, folder):
+        if self.cache is not None:
+            for name in (self.name, self.auth_name):
+                # Pinned until release_files, so no other download evicts it before the upload
+                self.files[name] = self.cache.fetch(
+                    self.version, name, lambda dest, name=name: self._fetch(folder, [name], dest),
+                    pin=True)
+        else:
+            self._fetch(folder, [self.name, self.auth_name])
+            self.files = {self.name: self.name, self.auth_name: self.auth_name}
+
+    def _get_catalog_image(self, version=None):
+        def lookup():
+            if version is None:
+                return self.catalog.latest(self.type)
+            return self.catalog.find(self.type, version)
+        build = None if self.catalog.stale() else lookup()
+        if build is None:
+            with self._session(self.IP, self.user, self.passwd, self.prompt, timeout=120) as child:
+                self.catalog.refresh(child, self.prompt, self.path)
+            build = lookup()
+        if build is None:
+            print("could not find")
+            return
+        self.folder = build.folder
+        self.name = build.name
+        self.auth_name = build.auth_name
+        self.version = build.version
+        self.sizes = dict(build.sizes)
+        if self.type == "K2":
+            self._download_k2(build.folder)
+        print('Auth_file_name = ' + self.auth_name + ". Image Name = " + self.name + '.')
+        self.is_found = True
+
+    def _fetch(self, folder, names, dest="."):
+        # Downloads with the RangedTransfer if there is one, otherwise with scp
+        if self.transfer is None:
+            return self._scp(folder, names, dest)
+        for name in names:
+            report = self.transfer.download(str(self.path) + str(folder) + "/" + name,
+                                            os.path.join(dest, name), size=self.sizes.get(name))
+            self.timings["transfer"] = self.timings.get("transfer", 0.0) + report.elapsed
+            print(repr(report))
+
+    def _scp(self, folder, names, dest=".", timeout=1800):
+        """Copies build files from the build server and waits for scp to finish.
+
+        Raises:
+            IOError: If scp fails or a file does not have the size it has on the build server
+        """
+        start = time.monotonic()
+        files = names[0] if len(names) == 1 else "{" + ",".join(names) + "}"
+        tmp = "scp -o StrictHostKeyChecking=no " + str(self.user) + "@" + str(self.IP) + ":" + str(
+            self.path) + str(folder) + "/" + files + " " + dest
+        child = (self.spawn or pexpect.spawn)(tmp)
+        child.expect('(?i)Password')
+        child.sendline(self.passwd)
+        child.expect(pexpect.EOF, timeout=timeout)
+        child.close()
+        if child.exitstatus != 0:
+            raise IOError("scp of " + files + " failed with exit status " + str(child.exitstatus))
+        total = 0
+        for name in names:
+            size = os.path.getsize(os.path.join(dest, name))
+            if name in self.sizes and size != self.sizes[name]:
+                raise IOError(name + " is " + str(size) + " bytes, expected " + str(self.sizes[name]))
+            total += size
+        elapsed = time.monotonic() - start
+        self.timings["scp"] = self.timings.get("scp", 0.0) + elapsed
+        print("Copied " + str(total) + " bytes in " + str(round(elapsed, 1)) + " s")
+
+    def local_path(self, name):
+        """Local path of a downloaded file, from the cache if there is one."""
+        return self.files.get(name, name)
+
+    def release_files(self):
+        """Removes the downloaded files once the upgrade is done, or unpins them if they are cached."""
+        for path in self.files.values():
+            if self.cache is not None:
+                self.cache.release(path)
+            elif os.path.exists(path):
+                os.remove(path)
+        self.files = {}
+
     def _get_tp4100_image(self, tmp):
         self.name = re.search(r"TimeProvider4100_v.*bin", tmp)
         if(self.name != None and self.auth_name != None):
@@ -98,40 +218,67 @@ class Image:
 
     def upgrade(self):
         if self.type == "tp4100":
-            self._upgrade_tp4100()
+            return self._upgrade_tp4100()
+        return False
 
     def _upgrade_tp4100(self):
-        os.system("ssh-keygen -f " +
-                  "$HOME/.ssh/known_hosts " + "-R " + self.DUTIP)
-        SSH = 'ssh ' + self.user + '@' + self.DUTIP + ' -o StrictHostKeyChecking=no'
-        child = pexpect.spawn(SSH, timeout=90)
-        child.expect('(?i)Password')
-        child.sendline(self.passwd)
-        child.expect(self.prompt)
-        child.sendline("show status")
-        child.expect(self.prompt)
-        child.sendline("show image")
-        child.expect(self.prompt)
-        ImageStr = re.search("Active Image Version.*", str(child.before))
-        if ImageStr is not None:
-            upgrade = "upgrade imagefilepath " + \
-                str(self.path) + str(self.folder) + '/' + str(self.name) + ' '
-            auth = "authfilepath " + \
-                str(self.path) + str(self.folder) + '/' + str(self.auth_name)
-            scp = " scp:" + str(self.IP) + " " + str(self.user)
-            clicmd = upgrade + auth + scp
-            # print(clicmd)
-            child.sendline(clicmd)
-            child.expect('(?i)Password')
-            child.sendline(self.passwd)
-            child.expect('Please Confirm')
-            child.sendline('yes')
-            time.sleep(900)
-            child.close()
-            return True
-        else:
-            print("Error couldn't get image #")
-            return False
+        with self._session(self.DUTIP, self.user, self.passwd, self.prompt, timeout=90) as child:
+            child.sendline("show status")
+            child.expect(self.prompt)
+            child.sendline("show image")
+            child.expect(self.prompt)
+            ImageStr = re.search("Active Image Version.*", str(child.before))
+            if ImageStr is not None:
+                upgrade = "upgrade imagefilepath " + \
+                    str(self.path) + str(self.folder) + '/' + str(self.name) + ' '
+                auth = "authfilepath " + \
+                    str(self.path) + str(self.folder) + '/' + str(self.auth_name)
+                scp = " scp:" + str(self.IP) + " " + str(self.user)
+                clicmd = upgrade + auth + scp
+                # print(clicmd)
+                child.sendline(clicmd)
+                child.expect('(?i)Password')
+                child.sendline(self.passwd)
+                child.expect('Please Confirm')
+                child.sendline('yes')
+                # The DUT prints its progress while it copies and installs the
+                # image, then reboots and drops the session
+                start = time.monotonic()
+                try:
+                    while child.expect(['\r\n', pexpect.EOF], timeout=900) == 0:
+                        line = child.before.decode('utf-8', 'replace').strip()
+                        if line:
+                            print(line)
+                except pexpect.TIMEOUT:
+                    print("No reboot after " + str(round(time.monotonic() - start)) + " s")
+                    child.close()
+                    return False
+                self.timings["install"] = time.monotonic() - start
+                # The DUT reboots, so the session can not be reused
+                child.close()
+                return self.wait_ready()
+            else:
+                print("Error couldn't get image #")
+                return False
+
+    def wait_ready(self, timeout=900, interval=10):
+        """Waits until the DUT accepts a CLI login again after a reboot.
+
+        Returns:
+            True once a login and show image succeed, False after timeout seconds
+        """
+        start = time.monotonic()
+        while time.monotonic() - start < timeout:
+            try:
+                with self._session(self.DUTIP, self.user, self.passwd, self.prompt, timeout=30) as child:
+                    child.sendline("show image")
+                    child.expect(self.prompt)
+                self.timings["ready"] = time.monotonic() - start
+                return True
+            except (pexpect.EOF, pexpect.TIMEOUT, OSError):
+                time.sleep(interval)
+        print("DUT " + str(self.DUTIP) + " not ready after " + str(timeout) + " s")
+        return False
 
     def check_version(self, software_version):
         if self.type == "tp4100" or "tp4100v2":
@@ -146,20 +293,14 @@ class Image:
                 return False
 
     def _check_tp4100_image(self):
-        os.system("ssh-keygen -f " +
-                  "$HOME/.ssh/known_hosts " + "-R " + self.DUTIP)
-        SSH = 'ssh ' + self.user + '@' + self.DUTIP + ' -o StrictHostKeyChecking=no'
-        child = pexpect.spawn(SSH, timeout=90)
-        child.expect('(?i)Password')
-        child.sendline(self.passwd)
-        child.expect(self.prompt)
-        child.sendline('show image')
-        child.expect(self.prompt)
-        tmp = str(child.before, encoding="ascii")
+        with self._session(self.DUTIP, self.user, self.passwd, self.prompt, timeout=90) as child:
+            child.sendline('show image')
+            child.expect(self.prompt)
+            tmp = str(child.before, encoding="ascii")
         software_version = re.search(
             r"Active Image Version.*[\d]+\.[\d]+\.[\d]+\.*[\d]*", str(tmp))
         if software_version is not None:
-            return re.search(r"[\d]+\.[\d]+\.[\d]+\.*[\d]*", str(software_version))
+            return re.search(r"[\d]+\.[\d]+\.[\d]+\.*[\d]*", software_version.group(0)).group(0)
 
     def _get_login_info(self):
         if self.type == 'tp4100':
@@ -179,50 +320,38 @@ class Image:
             root_pass = None
         return user, Prompt, passwd, root_pass
 
-    def _connect(self):
-        try:
-            print("Running script on machine " + str(self.IP))
-            user, Prompt, passwd, root_pass = self._get_login_info()
-            if user is None:
-                print("Failed to get login info")
-                return False, Prompt
-            SSH = 'ssh ' + user + '@' + self.DUTIP + ' -o StrictHostKeyChecking=no'
-            os.system("ssh-keygen -f " + "$HOME/.ssh/known_hosts " +
-                      "-R " + self.DUTIP + " >/dev/null 2>&1")
-            child = pexpect.spawn(SSH, timeout=300)
-            child.expect('(?i)Password')
-            child.sendline(passwd)
-            child.expect(Prompt)
-            child.sendline('su')
-            child.expect('(?i)Password')
-            child.sendline(root_pass)
-            child.expect(Prompt)
-            return child, Prompt
-        except:
-            print("Failed to login to machine")
-            return False, Prompt
-
     def _create_gateway_ip(self):
         IPtmp = re.split('[.]', str(self.DUTIP))
         IPtmp = str(IPtmp[0]) + '.' + str(IPtmp[1]) + \
             '.' + str(IPtmp[2]) + '.' + "1"
         return IPtmp
 
+    def probe_gateway(self, count=4, rounds=5, interval=0.2):
+        """Pings the DUT gateway rounds times over one root session.
+
+        Returns:
+            List of netprobe.PingResult, one per round
+        """
+        user, Prompt, passwd, root_pass = self._get_login_info()
+        if user is None:
+            raise ValueError("No login info for type " + str(self.type))
+        IP_GW = self._create_gateway_ip()
+        with self._session(self.DUTIP, user, passwd, Prompt, root_pass, timeout=60) as child:
+            return [ping(child, Prompt, IP_GW, count, interval) for i in range(0, rounds)]
+
     def ping_gateway(self):
-        for i in range(0, 5):
-            child, Prompt = self._connect()
-            print("LOOP = " + str(i))
-            if (child == 0):
-                return False
-            IP_GW = self._create_gateway_ip()
-            child.sendline("ping " + str(IP_GW) + " -c 4")
-            child.expect(Prompt)
-            result = re.search(", 0% packet loss", str(child.before))
-            if(result == None):
+        try:
+            results = self.probe_gateway()
+        except ValueError:
+            print("Failed to get login info")
+            return False
+        except Exception:
+            print("Failed to login to machine")
+            return False
+        for i, result in enumerate(results):
+            print("LOOP = " + str(i) + " " + repr(result))
+            if not result.ok:
                 print("packets missing")
                 return False
-            else:
-                print("All packets found")
-            time.sleep(5)
-        child.close
+        print("All packets found")
         return True
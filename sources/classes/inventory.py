@@ -0,0 +1,158 @@
+import logging
+import re
+from classes.cli_fleet import CliFleet
+from classes.models import Inventory
+from classes.ssh import SSH
+
+__author__ = 'Andy Nguyen'
+
+
+def version_key(version):
+	"""Sortable key of a version string, trailing zero parts ignored so 5.1.2 == 5.1.2.0."""
+	parts = [int(p) for p in re.findall(r'\d+', str(version))]
+	while parts and parts[-1] == 0:
+		parts.pop()
+	return tuple(parts)
+
+
+def _key(device):
+	if isinstance(device, tuple):
+		return _key(device[0])
+	if isinstance(device, dict):
+		return device['IP']
+	return getattr(device, 'IP', device)
+
+
+def _read_rest(target):
+	return target.get_typed(Inventory)
+
+
+def _read_cli(device, timeout):
+	if isinstance(device, SSH):
+		return Inventory.from_dict(device.get_system())
+	kwargs = dict(device)
+	kwargs.setdefault('timeout', timeout)
+	ssh = SSH(**kwargs)
+	broken = False
+	try:
+		return Inventory.from_dict(ssh.get_system())
+	except Exception:
+		broken = True
+		raise
+	finally:
+		ssh.close(broken=broken)
+
+
+def read_inventory(device, timeout=60):
+	"""Reads software version, model, serial number and oscillator of one device.
+
+	Args:
+			device: a Target (REST /system/inventory), an SSH object or a dictionary
+					of SSH arguments (CLI show system), or a (Target, SSH arguments)
+					tuple to fall back to the CLI when the REST API fails
+			timeout: seconds a CLI login or command may wait for the prompt
+
+	Returns:
+			Inventory
+	"""
+	if isinstance(device, tuple):
+		target, cli = device
+		try:
+			return _read_rest(target)
+		except Exception as e:
+			logging.warning(str(target.IP) + ': REST inventory failed, using the CLI. ' + repr(e))
+			return _read_cli(cli, timeout)
+	if hasattr(device, 'get_typed'):
+		return _read_rest(device)
+	return _read_cli(device, timeout)
+
+
+class _InventoryFleet(CliFleet):
+	"""CliFleet that also hands Targets and (Target, SSH arguments) tuples to read_inventory."""
+
+	@staticmethod
+	def _key(device):
+		return _key(device)
+
+	def _open(self, device):
+		if isinstance(device, (dict, SSH)):
+			return super()._open(device)
+		return device, False
+
+
+def collect_inventory(devices, concurrency=16, timeout=60, pool=None):
+	"""Reads the inventory of the whole fleet at once.
+
+	Args:
+			devices: list of anything read_inventory takes
+			concurrency: maximum number of devices read at once
+			timeout: seconds a CLI login or command may wait for the prompt
+			pool: optional SessionPool for devices given as SSH arguments
+
+	Returns:
+			Dictionary of IP to FleetResult whose value is an Inventory, in device order
+	"""
+	return _InventoryFleet(devices, concurrency, timeout, pool).call(read_inventory, timeout)
+
+
+class UpgradePlan:
+	"""Which devices differ from a target build.
+
+	Attributes:
+			upgrade: list of (IP, current version) of devices to move to the target build,
+					older or newer (see downgrades)
+			current: IPs that already run the target build
+			skipped: IPs whose model does not take this build
+			unknown: list of (IP, error) of devices whose inventory could not be read
+	"""
+
+	def __init__(self, version):
+		self.version = version
+		self.upgrade = []
+		self.current = []
+		self.skipped = []
+		self.unknown = []
+
+	@property
+	def downgrades(self):
+		"""IPs in upgrade that run a newer build than the target."""
+		return [ip for ip, current in self.upgrade if version_key(current) > version_key(self.version)]
+
+	def select(self, devices):
+		"""Keeps the devices that need the build ex. to hand to Rollout, in their original order."""
+		todo = set(ip for ip, _ in self.upgrade)
+		return [d for d in devices if _key(d) in todo or getattr(d, 'DUTIP', None) in todo]
+
+	def __repr__(self):
+		return ('UpgradePlan(' + str(self.version) + ', upgrade=' + str(len(self.upgrade)) + ', current=' +
+				str(len(self.current)) + ', skipped=' + str(len(self.skipped)) + ', unknown=' +
+				str(len(self.unknown)) + ')')
+
+
+def plan_upgrade(inventory, version, models=None):
+	"""Lists only the devices whose version differs from the target build.
+
+	Args:
+			inventory: result of collect_inventory
+			version: target build version ex. image.version
+			models: optional list of model name parts the build is for ex. ['S650'],
+					devices of other models are skipped
+
+	Returns:
+			UpgradePlan
+	"""
+	plan = UpgradePlan(version)
+	target_key = version_key(version)
+	for ip, result in inventory.items():
+		if not result.ok or result.value.software_ver is None:
+			plan.unknown.append((ip, result.error))
+			continue
+		info = result.value
+		if models is not None and not any(m in str(info.model) for m in models):
+			plan.skipped.append(ip)
+		elif version_key(info.software_ver) == target_key:
+			plan.current.append(ip)
+		else:
+			plan.upgrade.append((ip, info.software_ver))
+	logging.info(str(plan))
+	return plan
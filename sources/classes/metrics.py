@@ -0,0 +1,182 @@
+import json
+import os
+import re
+import threading
+
+__author__ = 'Andy Nguyen'
+
+# Upper bounds of the latency histogram buckets in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, float('inf'))
+
+_ID_SEGMENT = re.compile(r'/\d+(?=/|$)')
+
+
+def normalize_endpoint(endpoint):
+	"""Collapses numeric path segments so /ntp/servers/1 and /ntp/servers/2 share one series."""
+	if endpoint is None:
+		return ''
+	return _ID_SEGMENT.sub('/{id}', endpoint)
+
+
+def _escape(value):
+	"""Escapes a Prometheus label value."""
+	return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class RequestStats:
+	"""Counters and latency histogram for one device, method and endpoint."""
+
+	def __init__(self):
+		self.count = 0
+		self.errors = 0
+		self.retries = 0
+		self.bytes_sent = 0
+		self.bytes_received = 0
+		self.latency_sum = 0.0
+		self.latency_max = 0.0
+		self.buckets = [0] * len(LATENCY_BUCKETS)
+		self.statuses = {}
+
+	def add(self, status, latency, bytes_sent, bytes_received, retries):
+		self.count += 1
+		if not isinstance(status, int) or status >= 400:
+			self.errors += 1
+		self.statuses[status] = self.statuses.get(status, 0) + 1
+		self.retries += retries
+		self.bytes_sent += bytes_sent
+		self.bytes_received += bytes_received
+		self.latency_sum += latency
+		if latency > self.latency_max:
+			self.latency_max = latency
+		for index, bound in enumerate(LATENCY_BUCKETS):
+			if latency <= bound:
+				self.buckets[index] += 1
+				break
+
+	def merge(self, other):
+		self.count += other.count
+		self.errors += other.errors
+		self.retries += other.retries
+		self.bytes_sent += other.bytes_sent
+		self.bytes_received += other.bytes_received
+		self.latency_sum += other.latency_sum
+		self.latency_max = max(self.latency_max, other.latency_max)
+		self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+		for status, n in other.statuses.items():
+			self.statuses[status] = self.statuses.get(status, 0) + n
+
+	def to_dict(self):
+		return {
+			'count': self.count,
+			'errors': self.errors,
+			'retries': self.retries,
+			'bytesSent': self.bytes_sent,
+			'bytesReceived': self.bytes_received,
+			'latencyMean': self.latency_sum / self.count if self.count else 0.0,
+			'latencyMax': self.latency_max,
+			'latencyBuckets': {str(b): n for b, n in zip(LATENCY_BUCKETS, self.buckets)},
+			'statuses': {str(s): n for s, n in self.statuses.items()}
+		}
+
+
+class Metrics:
+	"""Per device, per endpoint request metrics. One instance can be shared by many Targets."""
+
+	def __init__(self):
+		self._stats = {}
+		self._lock = threading.Lock()
+
+	def record(self, device, method, endpoint, status, latency, bytes_sent=0,
+			   bytes_received=0, retries=0):
+		"""Records one request.
+
+		Args:
+				device: IP of the K2
+				method: HTTP method
+				endpoint: API endpoint, numeric segments are collapsed
+				status: HTTP status code, or a string such as 'error' or 'circuit_open'
+				latency: seconds the request took including retries
+				bytes_sent: size of the request body
+				bytes_received: size of the response body
+				retries: number of retries before the final answer
+		"""
+		key = (str(device), method, normalize_endpoint(endpoint))
+		with self._lock:
+			stats = self._stats.get(key)
+			if stats is None:
+				stats = self._stats[key] = RequestStats()
+			stats.add(status, latency, bytes_sent, bytes_received, retries)
+
+	def merge(self, other):
+		"""Adds the counts of another Metrics into this one."""
+		with other._lock:
+			items = [(key, stats) for key, stats in other._stats.items()]
+		with self._lock:
+			for key, stats in items:
+				mine = self._stats.get(key)
+				if mine is None:
+					mine = self._stats[key] = RequestStats()
+				mine.merge(stats)
+
+	def snapshot(self):
+		"""Returns a list of dictionaries, one per device, method and endpoint."""
+		with self._lock:
+			rows = []
+			for (device, method, endpoint), stats in sorted(self._stats.items()):
+				row = {'device': device, 'method': method, 'endpoint': endpoint}
+				row.update(stats.to_dict())
+				rows.append(row)
+			return rows
+
+	def to_json(self, path):
+		with open(path, 'w') as f:
+			json.dump(self.snapshot(), f, indent=2)
+
+	def prometheus_text(self, prefix='k2'):
+		"""Formats the metrics in the Prometheus text exposition format.
+
+		Every metric family is written as one block under its own HELP and TYPE
+		lines, as strict parsers require.
+		"""
+		with self._lock:
+			items = sorted(self._stats.items())
+		families = {
+			'requests_total': ('counter', 'Requests sent, by final status.', []),
+			'request_duration_seconds': ('histogram', 'Request latency including retries.', []),
+			'request_retries_total': ('counter', 'Retries after a failed attempt.', []),
+			'request_bytes_total': ('counter', 'Bytes sent and received.', [])
+		}
+		for (device, method, endpoint), stats in items:
+			labels = ('device="' + _escape(device) + '",method="' + _escape(method) +
+					  '",endpoint="' + _escape(endpoint) + '"')
+			samples = families['requests_total'][2]
+			for status, n in sorted(stats.statuses.items(), key=lambda s: str(s[0])):
+				samples.append(('', labels + ',status="' + _escape(status) + '"', str(n)))
+			samples = families['request_duration_seconds'][2]
+			cumulative = 0
+			for bound, n in zip(LATENCY_BUCKETS, stats.buckets):
+				cumulative += n
+				le = '+Inf' if bound == float('inf') else repr(bound)
+				samples.append(('_bucket', labels + ',le="' + le + '"', str(cumulative)))
+			samples.append(('_sum', labels, repr(stats.latency_sum)))
+			samples.append(('_count', labels, str(stats.count)))
+			families['request_retries_total'][2].append(('', labels, str(stats.retries)))
+			samples = families['request_bytes_total'][2]
+			samples.append(('', labels + ',direction="sent"', str(stats.bytes_sent)))
+			samples.append(('', labels + ',direction="received"', str(stats.bytes_received)))
+		lines = []
+		for family, (type, description, samples) in families.items():
+			name = prefix + '_' + family
+			lines.append('# HELP ' + name + ' ' + description)
+			lines.append('# TYPE ' + name + ' ' + type)
+			for suffix, labels, value in samples:
+				lines.append(name + suffix + '{' + labels + '} ' + value)
+		return '\n'.join(lines) + '\n'
+
+	def to_prometheus(self, path, prefix='k2'):
+		"""Writes prometheus_text() to a file, ex. for the node_exporter textfile collector."""
+		tmp = path + '.tmp'
+		with open(tmp, 'w') as f:
+			f.write(self.prometheus_text(prefix))
+		# Replace in one step so a scraper never reads a half written file
+		os.replace(tmp, path)
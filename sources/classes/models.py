@@ -0,0 +1,170 @@
+import json
+from classes.constants import CLOCK_STATE, REFERENCE_IDS, API_INPUT_TIME_SRC
+
+__author__ = 'Andy Nguyen'
+
+
+def _default_loads():
+	try:
+		import orjson
+		return orjson.loads
+	except ImportError:
+		return json.loads
+
+
+_loads = _default_loads()
+
+
+def set_json_backend(loads):
+	"""Sets the function used to decode response bodies ex. orjson.loads or ujson.loads.
+	It must accept bytes. Passing None goes back to the default (orjson if installed, else json).
+	"""
+	global _loads
+	_loads = loads if loads is not None else _default_loads()
+
+
+def decode_json(content):
+	return _loads(content)
+
+
+def _int(value):
+	return None if value is None else int(value)
+
+
+class Model:
+	"""Base class of the typed response models.
+
+	Subclasses set ENDPOINT and implement from_dict(). Enum fields are resolved
+	to their readable names once, when the response is decoded.
+	"""
+	__slots__ = ()
+	ENDPOINT = None
+
+	@classmethod
+	def decode(cls, content):
+		"""Builds the model straight from the raw response bytes."""
+		return cls.from_dict(decode_json(content))
+
+	@classmethod
+	def from_dict(cls, data):
+		raise NotImplementedError
+
+	def __repr__(self):
+		fields = ', '.join(name + '=' + repr(getattr(self, name)) for name in self.__slots__)
+		return type(self).__name__ + '(' + fields + ')'
+
+	def __eq__(self, other):
+		return type(self) is type(other) and \
+			all(getattr(self, n) == getattr(other, n) for n in self.__slots__)
+
+
+class SystemState(Model):
+	"""/system/state"""
+	__slots__ = ('sync_state', 'curr_ref', 'state', 'reference')
+	ENDPOINT = '/system/state'
+
+	def __init__(self, sync_state, curr_ref):
+		self.sync_state = sync_state
+		self.curr_ref = curr_ref
+		self.state = CLOCK_STATE.get(sync_state)
+		self.reference = REFERENCE_IDS.get(curr_ref)
+
+	@classmethod
+	def from_dict(cls, data):
+		return cls(_int(data.get('syncState')), _int(data.get('currRef')))
+
+	@property
+	def locked(self):
+		return self.state == 'Locked'
+
+
+class Inventory(Model):
+	"""/system/inventory"""
+	__slots__ = ('software_ver', 'model', 'serial_number', 'oscillator')
+	ENDPOINT = '/system/inventory'
+
+	def __init__(self, software_ver, model, serial_number, oscillator):
+		self.software_ver = software_ver
+		self.model = model
+		self.serial_number = serial_number
+		self.oscillator = oscillator
+
+	@classmethod
+	def from_dict(cls, data):
+		# Depending on the firmware the fields are either at the top or under 'inventory'
+		inventory = data.get('inventory') or {}
+
+		def field(name):
+			value = data.get(name)
+			return inventory.get(name) if value is None else value
+		return cls(field('softwareVer'), field('model'), field('serialNumber'), field('oscillator'))
+
+
+class InputPriority(Model):
+	"""One entry of timeRefPriority or freqRefPriority."""
+	__slots__ = ('source', 'name', 'priority', 'enabled')
+
+	def __init__(self, source, priority, enabled):
+		self.source = source
+		self.name = API_INPUT_TIME_SRC.get(source)
+		self.priority = priority
+		self.enabled = enabled
+
+	@classmethod
+	def from_dict(cls, data):
+		return cls(_int(data.get('source')), _int(data.get('priority')), data.get('enabled'))
+
+
+class TimingConfig(Model):
+	"""/timing"""
+	__slots__ = ('time_ref_priority', 'freq_ref_priority')
+	ENDPOINT = '/timing'
+
+	def __init__(self, time_ref_priority, freq_ref_priority):
+		self.time_ref_priority = time_ref_priority
+		self.freq_ref_priority = freq_ref_priority
+
+	@classmethod
+	def from_dict(cls, data):
+		return cls([InputPriority.from_dict(t) for t in data.get('timeRefPriority') or []],
+				   [InputPriority.from_dict(f) for f in data.get('freqRefPriority') or []])
+
+	def first_priority(self):
+		"""Returns the time input with the lowest priority number, or None."""
+		if not self.time_ref_priority:
+			return None
+		return min(self.time_ref_priority, key=lambda t: t.priority)
+
+
+class Constellation(Model):
+	"""One entry of constellation.satelliteSystem."""
+	__slots__ = ('name', 'enabled')
+
+	def __init__(self, name, enabled):
+		self.name = name
+		self.enabled = enabled
+
+	@classmethod
+	def from_dict(cls, data):
+		name = data.get('satConstellation')
+		return cls(name.upper() if name else name, data.get('state') == 'enabled')
+
+
+class GnssConfig(Model):
+	"""/gnss"""
+	__slots__ = ('constellations', 'sbas')
+	ENDPOINT = '/gnss'
+
+	def __init__(self, constellations, sbas):
+		self.constellations = constellations
+		self.sbas = sbas
+
+	@classmethod
+	def from_dict(cls, data):
+		constellation = data.get('constellation') or {}
+		return cls([Constellation.from_dict(s) for s in constellation.get('satelliteSystem') or []],
+				   constellation.get('sbas'))
+
+	def enabled(self):
+		"""Returns the set of enabled constellation names."""
+		return {c.name for c in self.constellations if c.enabled}
@@ -0,0 +1,153 @@
+import concurrent.futures
+import logging
+import math
+import re
+import time
+from classes.fleet import FleetResult
+from classes.session_pool import read_lines
+
+__author__ = 'Andy Nguyen'
+
+# 4 packets transmitted, 4 received, 0% packet loss (iputils)
+# 4 packets transmitted, 4 packets received, 0% packet loss (busybox)
+_SUMMARY = re.compile(r'(\d+) packets transmitted, (\d+) (?:packets )?received.*?([\d.]+)% packet loss')
+# rtt min/avg/max/mdev = 0.045/0.058/0.070/0.010 ms, busybox says round-trip min/avg/max
+_RTT = re.compile(r'(?:rtt|round-trip) min/avg/max(?:/\w+)? = ([\d.]+)/([\d.]+)/([\d.]+)(?:/([\d.]+))?')
+_REPLY = re.compile(r'time[=<]([\d.]+) ?ms')
+
+
+class PingResult:
+	"""Numbers from one ping run. Times are in milliseconds, NaN if no reply came back."""
+
+	def __init__(self, host, sent=0, received=0, loss=100.0, rtt_min=math.nan, rtt_avg=math.nan,
+				 rtt_max=math.nan, rtt_mdev=math.nan, rtts=None):
+		self.host = host
+		self.sent = sent
+		self.received = received
+		self.loss = loss
+		self.rtt_min = rtt_min
+		self.rtt_avg = rtt_avg
+		self.rtt_max = rtt_max
+		self.rtt_mdev = rtt_mdev
+		self.rtts = rtts if rtts is not None else []
+
+	@property
+	def ok(self):
+		return self.sent > 0 and self.received == self.sent
+
+	def __repr__(self):
+		return ('PingResult(' + str(self.host) + ', ' + str(self.received) + '/' + str(self.sent) +
+				', avg=' + str(self.rtt_avg) + ' ms)')
+
+
+def parse_ping(lines, host=None):
+	"""Parses the output of ping (iputils or busybox) in one pass.
+
+	Args:
+			lines: iterable of output lines
+			host: pinged host, kept in the result
+
+	Returns:
+			PingResult
+	"""
+	result = PingResult(host)
+	for line in lines:
+		m = _REPLY.search(line)
+		if m is not None:
+			result.rtts.append(float(m.group(1)))
+			continue
+		m = _SUMMARY.search(line)
+		if m is not None:
+			result.sent = int(m.group(1))
+			result.received = int(m.group(2))
+			result.loss = float(m.group(3))
+			continue
+		m = _RTT.search(line)
+		if m is not None:
+			result.rtt_min, result.rtt_avg, result.rtt_max = (float(v) for v in m.group(1, 2, 3))
+			if m.group(4) is not None:
+				result.rtt_mdev = float(m.group(4))
+	return result
+
+
+def ping(child, prompt, host, count=4, interval=None, timeout=-1):
+	"""Pings host from a logged in session and parses the output as it streams in.
+
+	Args:
+			child: logged in pexpect child, root if interval is below 0.2
+			prompt: regex of the shell prompt
+			host: address to ping
+			count: number of echo requests
+			interval: seconds between requests, None for the ping default of 1 s
+			timeout: seconds to wait for each line, -1 for the child's timeout
+
+	Returns:
+			PingResult
+	"""
+	cmd = 'ping -c ' + str(count)
+	if interval is not None:
+		cmd += ' -i ' + str(interval)
+	return parse_ping(read_lines(child, cmd + ' ' + str(host), prompt, timeout), host)
+
+
+def _percentile(ordered, q):
+	if not ordered:
+		return math.nan
+	k = (len(ordered) - 1) * q / 100.0
+	low = int(math.floor(k))
+	high = min(low + 1, len(ordered) - 1)
+	return ordered[low] + (ordered[high] - ordered[low]) * (k - low)
+
+
+def latency_summary(results, percentiles=(50, 90, 99)):
+	"""Latency distribution over every reply of many PingResults.
+
+	Returns:
+			Dictionary with runs, sent, received, loss (percent), min, max, mean and
+			p<q> for every percentile, all in milliseconds
+	"""
+	rtts = sorted(t for r in results for t in r.rtts)
+	sent = sum(r.sent for r in results)
+	received = sum(r.received for r in results)
+	summary = {
+		'runs': len(results),
+		'sent': sent,
+		'received': received,
+		'loss': 100.0 * (sent - received) / sent if sent else math.nan,
+		'min': rtts[0] if rtts else math.nan,
+		'max': rtts[-1] if rtts else math.nan,
+		'mean': sum(rtts) / len(rtts) if rtts else math.nan
+	}
+	for q in percentiles:
+		summary['p' + str(q)] = _percentile(rtts, q)
+	return summary
+
+
+def _probe_one(image, kwargs):
+	start = time.monotonic()
+	try:
+		return FleetResult(image.DUTIP, image.probe_gateway(**kwargs), None, time.monotonic() - start)
+	except Exception as e:
+		logging.warning('Gateway probe of ' + str(image.DUTIP) + ' failed: ' + repr(e))
+		return FleetResult(image.DUTIP, None, e, time.monotonic() - start)
+
+
+def probe_all(images, concurrency=16, **kwargs):
+	"""Probes the gateway of many DUTs at once with Image.probe_gateway.
+
+	Args:
+			images: list of Image objects, one per DUT
+			concurrency: maximum number of DUTs probed at once
+			kwargs: passed on to probe_gateway ex. count, rounds, interval
+
+	Returns:
+			Tuple of (dictionary of DUT IP to FleetResult whose value is the list of
+			PingResult, in image order, and latency_summary over every DUT)
+	"""
+	start = time.monotonic()
+	with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+		results = list(executor.map(lambda image: _probe_one(image, kwargs), images))
+	runs = [run for r in results if r.ok for run in r.value]
+	logging.info('Probed ' + str(len(results)) + ' gateways in ' +
+				 str(round(time.monotonic() - start, 1)) + ' s')
+	return {r.device: r for r in results}, latency_summary(runs)
@@ -0,0 +1,55 @@
+__author__ = 'Andy Nguyen'
+
+
+def _matches(current, desired):
+	"""True if every field given in desired already has that value in current."""
+	for key, value in desired.items():
+		if current.get(key) != value:
+			return False
+	return True
+
+
+def plan_ntp_changes(current, desired):
+	"""Works out the fewest requests that turn the current NTP server list into the desired one.
+
+	Servers are matched by addrName. The K2 renumbers /ntp/servers/<n> after every
+	DELETE, so deletes are sent from the highest index down and updates use the
+	index the server has once the deletes are done.
+
+	Args:
+			current: list of servers from GET /ntp/servers
+			desired: list of servers ex. [{'role': 0, 'addrName': '10.241.55.21', 'prefer': True}]
+
+	Returns:
+			List of (method, endpoint, data) tuples, empty if nothing needs to change
+	"""
+	wanted = {}
+	for server in desired:
+		wanted.setdefault(server.get('addrName'), server)
+
+	deletes = []
+	kept = []
+	seen = set()
+	for index, server in enumerate(current, start=1):
+		name = server.get('addrName')
+		if name in wanted and name not in seen:
+			seen.add(name)
+			kept.append(server)
+		else:
+			deletes.append(index)
+
+	ops = []
+	for index in reversed(deletes):
+		ops.append(('DELETE', '/ntp/servers/' + str(index), None))
+
+	for index, server in enumerate(kept, start=1):
+		target = wanted[server.get('addrName')]
+		if not _matches(server, target):
+			merged = dict(server)
+			merged.update(target)
+			ops.append(('PUT', '/ntp/servers/' + str(index), {'server': merged}))
+
+	adds = [server for name, server in wanted.items() if name not in seen]
+	if adds:
+		ops.append(('POST', '/ntp/servers', {'servers': adds}))
+	return ops
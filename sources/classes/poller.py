@@ -0,0 +1,263 @@
+import concurrent.futures
+import heapq
+import itertools
+import logging
+import time
+from classes.constants import CLOCK_STATE, REFERENCE_IDS
+
+__author__ = 'Andy Nguyen'
+
+
+class Condition:
+	"""Base class for a state a Poller waits for.
+
+	check() returns True once the target state is reached, False if the device
+	has settled into a state that can never reach it, and None to keep polling.
+	signature() is what the adaptive backoff watches for change.
+	"""
+	endpoint = '/system/state'
+
+	def check(self, data, watch):
+		raise NotImplementedError
+
+	def signature(self, data):
+		return None
+
+
+class LockedTo(Condition):
+	"""Waits for syncState == Locked and currRef == ref."""
+
+	def __init__(self, ref, endpoint='/system/state'):
+		self.ref = ref
+		self.endpoint = endpoint
+
+	def check(self, data, watch):
+		if self.signature(data) == ('Locked', self.ref):
+			return True
+		return None
+
+	def signature(self, data):
+		state = CLOCK_STATE.get(int(data.get('syncState')))
+		sys_ref = REFERENCE_IDS.get(int(data.get('currRef')))
+		return state, sys_ref
+
+
+class IsUp(Condition):
+	"""Waits for the REST API to answer with a known syncState.
+
+	Args:
+			require_down: only accept the device as up after it has been seen
+					unreachable at least once (it has actually rebooted)
+			down_grace: seconds after which require_down is dropped, in case the
+					reboot was too quick to be observed
+	"""
+
+	def __init__(self, require_down=False, down_grace=120):
+		self.require_down = require_down
+		self.down_grace = down_grace
+
+	def check(self, data, watch):
+		if CLOCK_STATE.get(int(data.get('syncState'))) is None:
+			return None
+		if self.require_down and not watch.saw_down and watch.age() < self.down_grace:
+			return None
+		return True
+
+	def signature(self, data):
+		return data.get('syncState')
+
+
+class VersionIs(Condition):
+	"""Waits for /system/inventory softwareVer to report a version.
+
+	Reached when it equals version. Any other reported version, once the device
+	has been seen down (or if require_down is False), is a failed upgrade.
+	"""
+	endpoint = '/system/inventory'
+
+	def __init__(self, version, require_down=False, down_grace=120):
+		self.version = version
+		self.require_down = require_down
+		self.down_grace = down_grace
+
+	def check(self, data, watch):
+		software_version = data.get('softwareVer')
+		if software_version == self.version:
+			return True
+		if software_version is None:
+			return None
+		if self.require_down and not watch.saw_down and watch.age() < self.down_grace:
+			return None
+		return False
+
+	def signature(self, data):
+		return data.get('softwareVer')
+
+
+class PollResult:
+	"""What a Poller saw for one target."""
+
+	def __init__(self, device, reached, data, checks, elapsed, error=None):
+		self.device = device
+		self.reached = reached
+		self.data = data
+		self.checks = checks
+		self.elapsed = elapsed
+		self.error = error
+
+	def __repr__(self):
+		return 'PollResult(' + str(self.device) + ', reached=' + str(self.reached) + \
+			', checks=' + str(self.checks) + ', elapsed=' + str(round(self.elapsed, 1)) + ')'
+
+
+class Watch:
+	"""One target being polled for one condition."""
+
+	def __init__(self, target, condition, timeout, interval, delay):
+		self.target = target
+		self.condition = condition
+		self.start = time.monotonic()
+		self.deadline = self.start + delay + timeout
+		self.interval = interval
+		self.checks = 0
+		self.saw_down = False
+		self.data = None
+		self.error = None
+		self.signature = None
+
+	def age(self):
+		return time.monotonic() - self.start
+
+
+def default_fetch(target, endpoint):
+	return target.probe(endpoint)
+
+
+class Poller:
+	"""Polls many targets from one scheduler with adaptive backoff.
+
+	Each watch is checked every `initial` seconds while its state is changing
+	(or right after it comes back from being unreachable), and the interval grows
+	by `factor` up to `maximum` while the state stays the same. Unreachable
+	devices are retried every `down_interval` seconds. Each watch finishes as soon
+	as its condition is met, fails or its timeout runs out.
+
+	Args:
+			workers: number of requests that can be in flight at once
+			initial: seconds between checks when the state is changing
+			factor: growth of the interval while the state is unchanged
+			maximum: largest interval between checks
+			down_interval: seconds between checks while a device is unreachable
+			fetch: callable(target, endpoint) returning the JSON data, raising on error
+	"""
+
+	def __init__(self, workers=16, initial=2, factor=1.5, maximum=60, down_interval=5,
+				 fetch=default_fetch):
+		self.workers = workers
+		self.initial = initial
+		self.factor = factor
+		self.maximum = maximum
+		self.down_interval = down_interval
+		self.fetch = fetch
+		self.watches = []
+
+	def watch(self, target, condition, timeout=1800, delay=0):
+		"""Adds a target to be polled for the given condition.
+
+		Args:
+				target: Target (or anything fetch accepts)
+				condition: Condition instance
+				timeout: seconds to keep polling after delay
+				delay: seconds to wait before the first check
+		"""
+		watch = Watch(target, condition, timeout, self.initial, delay)
+		self.watches.append((delay, watch))
+		return watch
+
+	def _finish(self, watch, reached, results):
+		device = getattr(watch.target, 'IP', watch.target)
+		results[device] = PollResult(device, reached, watch.data, watch.checks,
+									 watch.age(), watch.error)
+		if reached:
+			logging.info(str(device) + ': condition reached after ' +
+						 str(round(watch.age(), 1)) + ' seconds.')
+		else:
+			logging.error(str(device) + ': condition not reached after ' +
+						  str(round(watch.age(), 1)) + ' seconds.')
+
+	def _evaluate(self, watch, future):
+		"""Updates the watch from a finished probe.
+
+		Returns:
+				True/False when the watch is done, otherwise the next interval
+		"""
+		watch.checks += 1
+		try:
+			data = future.result()
+		except Exception as e:
+			watch.saw_down = True
+			watch.error = e
+			watch.signature = None
+			logging.info(str(getattr(watch.target, 'IP', watch.target)) +
+						 ': unreachable (' + type(e).__name__ + ').')
+			return self.down_interval
+		watch.data = data
+		try:
+			verdict = watch.condition.check(data, watch)
+			signature = watch.condition.signature(data) if verdict is None else None
+		except Exception as e:
+			# A malformed answer only fails this watch's check, the device is up
+			watch.error = e
+			logging.warning(str(getattr(watch.target, 'IP', watch.target)) +
+							': unexpected answer (' + repr(e) + ').')
+			watch.interval = min(watch.interval * self.factor, self.maximum)
+			return watch.interval
+		watch.error = None
+		if verdict is not None:
+			return verdict
+		if signature != watch.signature:
+			watch.signature = signature
+			watch.interval = self.initial
+		else:
+			watch.interval = min(watch.interval * self.factor, self.maximum)
+		return watch.interval
+
+	def run(self):
+		"""Polls all watches until every one of them is finished.
+
+		Returns:
+				Dictionary of device IP to PollResult
+		"""
+		results = {}
+		counter = itertools.count()
+		now = time.monotonic()
+		heap = [(now + delay, next(counter), watch) for delay, watch in self.watches]
+		heapq.heapify(heap)
+		self.watches = []
+		pending = {}
+		with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+			while heap or pending:
+				now = time.monotonic()
+				while heap and heap[0][0] <= now:
+					_, _, watch = heapq.heappop(heap)
+					future = executor.submit(self.fetch, watch.target, watch.condition.endpoint)
+					pending[future] = watch
+				wait = max(heap[0][0] - now, 0) if heap else None
+				if not pending:
+					time.sleep(wait)
+					continue
+				done, _ = concurrent.futures.wait(
+					pending, timeout=wait, return_when=concurrent.futures.FIRST_COMPLETED)
+				for future in done:
+					watch = pending.pop(future)
+					outcome = self._evaluate(watch, future)
+					if outcome is True or outcome is False:
+						self._finish(watch, outcome, results)
+						continue
+					now = time.monotonic()
+					if now >= watch.deadline:
+						self._finish(watch, False, results)
+						continue
+					due = min(now + outcome, watch.deadline)
+					heapq.heappush(heap, (due, next(counter), watch))
+		return results
@@ -0,0 +1,220 @@
+import concurrent.futures
+import logging
+import time
+from classes.fleet import FleetResult
+from classes.upload import SharedImage, TokenBucket
+
+__author__ = 'Andy Nguyen'
+
+
+def plan_waves(devices, canary=1, growth=2, max_wave=16):
+	"""Splits devices into upgrade waves: canary devices first, then batches growing by growth.
+
+	ex. 10 devices with canary=1, growth=2 -> waves of 1, 2, 4 and 3
+
+	Returns:
+			List of lists of devices
+	"""
+	devices = list(devices)
+	waves = []
+	size = max(1, canary)
+	start = 0
+	while start < len(devices):
+		waves.append(devices[start:start + size])
+		start += size
+		size = min(max_wave, size * growth) if max_wave else size * growth
+	return waves
+
+
+class K2Upgrade:
+	"""Upgrades K2 Targets to the build of an Image through the REST API.
+
+	The build is downloaded and memory mapped once for the whole rollout, every
+	upload shares the optional bandwidth limit, and each unit is verified with
+	upgrade_poll once it has rebooted.
+
+	Args:
+			image: Image of type K2 pointing at the build server
+			bandwidth: total upload bytes per second over all units, None for no limit
+			timeout: seconds to wait for a unit to reboot into the new version
+	"""
+
+	def __init__(self, image, bandwidth=None, timeout=1020):
+		self.image = image
+		self.throttle = TokenBucket(bandwidth) if bandwidth else None
+		self.timeout = timeout
+		self._auth = None
+		self._upgrade_file = None
+
+	@property
+	def version(self):
+		return self.image.version
+
+	def prepare(self):
+		self.image.get_image()
+		if not self.image.is_found:
+			raise IOError('No K2 build found on ' + str(self.image.IP))
+		self._auth = SharedImage(self.image.local_path(self.image.auth_name))
+		self._upgrade_file = SharedImage(self.image.local_path(self.image.name))
+
+	def current_version(self, target):
+		return target.get('/system/inventory').get('softwareVer')
+
+	def __call__(self, target):
+		if self.current_version(target) == self.image.version:
+			logging.info(target.IP + ' already runs ' + self.image.version)
+			return True
+		target.upload_firmware(self._auth, self._upgrade_file, throttle=self.throttle)
+		return target.upgrade_poll(self.image, timeout=self.timeout, require_down=True, down_grace=600)
+
+	def close(self):
+		for shared in (self._auth, self._upgrade_file):
+			if shared is not None:
+				shared.close()
+		self.image.release_files()
+
+
+class TP4100Upgrade:
+	"""Upgrades TP4100 units, given as one Image per DUT, through the CLI.
+
+	Each DUT pulls the build from the build server itself, then the version is
+	checked with check_version once the DUT accepts logins again.
+
+	Args:
+			template: Image of type tp4100 used to look up the build once
+	"""
+
+	def __init__(self, template):
+		self.template = template
+
+	@property
+	def version(self):
+		return self.template.version
+
+	def prepare(self):
+		self.template.get_image()
+		if not self.template.is_found:
+			raise IOError('No TP4100 build found on ' + str(self.template.IP))
+
+	def __call__(self, image):
+		image.folder = self.template.folder
+		image.name = self.template.name
+		image.auth_name = self.template.auth_name
+		if not image.upgrade():
+			return False
+		return bool(image.check_version(None))
+
+	def close(self):
+		pass
+
+
+class RolloutReport:
+	"""Outcome of a rollout: FleetResults per wave, and whether it was stopped early."""
+
+	def __init__(self):
+		self.waves = []
+		self.skipped = []
+		self.stopped = False
+		self.reason = None
+		self.elapsed = 0.0
+
+	@property
+	def results(self):
+		return [r for wave in self.waves for r in wave]
+
+	@property
+	def succeeded(self):
+		return [r.device for r in self.results if r.ok and r.value]
+
+	@property
+	def failed(self):
+		return [r.device for r in self.results if not (r.ok and r.value)]
+
+	@property
+	def failure_rate(self):
+		done = len(self.results)
+		return float(len(self.failed)) / done if done else 0.0
+
+	def __repr__(self):
+		return ('RolloutReport(waves=' + str(len(self.waves)) + ', succeeded=' + str(len(self.succeeded)) +
+				', failed=' + str(len(self.failed)) + ', skipped=' + str(len(self.skipped)) +
+				', stopped=' + str(self.stopped) + ')')
+
+
+class Rollout:
+	"""Upgrades a fleet in staged waves.
+
+	A canary wave goes first, then waves that grow by growth up to max_wave
+	devices. The devices of a wave are upgraded at the same time, at most
+	concurrency at once. After every wave the failure rate so far is checked,
+	and the rollout stops before the next wave if it is over max_failure_rate,
+	so a bad build never reaches more than one wave.
+
+	Args:
+			devices: Targets for K2Upgrade or Images for TP4100Upgrade
+			upgrade: K2Upgrade, TP4100Upgrade or any object with prepare(),
+					__call__(device) returning True on success, and close()
+			canary: devices in the first wave
+			growth: factor each wave grows by
+			max_wave: most devices in one wave
+			concurrency: most devices upgraded at once within a wave
+			max_failure_rate: stop once more than this fraction of the upgraded devices failed
+
+	ex.
+			image = Image(None, path, build_ip, user, passwd, prompt, 'K2', cache=cache)
+			report = Rollout(targets, K2Upgrade(image, bandwidth=50e6)).run()
+	"""
+
+	def __init__(self, devices, upgrade, canary=1, growth=2, max_wave=16, concurrency=8,
+				 max_failure_rate=0.2):
+		self.devices = list(devices)
+		self.upgrade = upgrade
+		self.waves = plan_waves(self.devices, canary, growth, max_wave)
+		self.concurrency = concurrency
+		self.max_failure_rate = max_failure_rate
+
+	@staticmethod
+	def _key(device):
+		if getattr(device, 'DUTIP', None) is not None:
+			return device.DUTIP
+		return getattr(device, 'IP', device)
+
+	def _upgrade_one(self, device):
+		start = time.monotonic()
+		try:
+			value = self.upgrade(device)
+			return FleetResult(self._key(device), value, None, time.monotonic() - start)
+		except Exception as e:
+			logging.error('Upgrade of ' + str(self._key(device)) + ' failed: ' + repr(e))
+			return FleetResult(self._key(device), False, e, time.monotonic() - start)
+
+	def _run_wave(self, wave):
+		with concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+			return list(executor.map(self._upgrade_one, wave))
+
+	def run(self):
+		"""Runs the waves in order.
+
+		Returns:
+				RolloutReport
+		"""
+		report = RolloutReport()
+		start = time.monotonic()
+		self.upgrade.prepare()
+		try:
+			for number, wave in enumerate(self.waves):
+				if report.stopped:
+					report.skipped.extend(self._key(d) for d in wave)
+					continue
+				logging.info('Upgrade wave ' + str(number + 1) + '/' + str(len(self.waves)) + ': ' +
+							 ', '.join(str(self._key(d)) for d in wave))
+				report.waves.append(self._run_wave(wave))
+				if report.failure_rate > self.max_failure_rate:
+					report.stopped = True
+					report.reason = ('Failure rate ' + str(round(report.failure_rate * 100)) +
+									 '% after wave ' + str(number + 1))
+					logging.error('Stopping the rollout. ' + report.reason)
+		finally:
+			self.upgrade.close()
+		report.elapsed = time.monotonic() - start
+		return report
@@ -0,0 +1,222 @@
+import contextlib
+import logging
+import threading
+import time
+import pexpect
+
+__author__ = 'Andy Nguyen'
+
+# Devices are reflashed and get new host keys, so their keys are never remembered
+SSH_OPTIONS = ' -o StrictHostKeyChecking=no -o UserKnownHostsFile=/dev/null -o LogLevel=ERROR'
+
+
+def login(host, user, passwd, prompt, root_passwd=None, timeout=300, spawn=None):
+	"""Opens an ssh session, logs in and optionally su's to root.
+
+	Args:
+			host: IP or hostname
+			user: login user
+			passwd: login password
+			prompt: regex of the shell prompt
+			root_passwd: if given, su to root with this password
+			timeout: pexpect timeout in seconds
+			spawn: function used instead of pexpect.spawn ex. to record or replay the session
+
+	Returns:
+			The logged in pexpect child
+	"""
+	spawn = spawn or pexpect.spawn
+	child = spawn('ssh ' + user + '@' + host + SSH_OPTIONS, timeout=timeout)
+	child.expect('(?i)Password')
+	child.sendline(passwd)
+	child.expect(prompt)
+	if root_passwd is not None:
+		child.sendline('su')
+		child.expect('(?i)Password')
+		child.sendline(root_passwd)
+		child.expect(prompt)
+	return child
+
+
+def read_lines(child, cmd, prompt, timeout=-1, encoding='utf-8'):
+	"""Runs a command and yields its output one decoded line at a time as it arrives.
+
+	Only the current line is held in memory instead of the whole output, so
+	parsers can work on long outputs such as log dumps before the command has
+	finished. The echoed command line is skipped. If the caller stops early the
+	rest of the output is read up to the prompt, so the session stays usable.
+
+	Args:
+			child: logged in pexpect child
+			cmd: command to run
+			prompt: regex of the shell prompt
+			timeout: seconds to wait for each line, -1 for the child's timeout
+			encoding: encoding of the output
+
+	Returns:
+			Generator of lines without line endings
+	"""
+	child.sendline(cmd)
+	patterns = ['\r\n', prompt]
+	echo = True
+	done = False
+	try:
+		while True:
+			index = child.expect(patterns, timeout=timeout)
+			line = child.before.decode(encoding)
+			if index == 1:
+				done = True
+				if line.strip():
+					yield line
+				return
+			if echo:
+				echo = False
+				if line.strip() == cmd.strip():
+					continue
+			yield line
+	except GeneratorExit:
+		if not done:
+			child.expect(prompt, timeout=timeout)
+		raise
+
+
+class PooledSession:
+	"""A logged in pexpect child owned by a SessionPool."""
+
+	def __init__(self, key, child, prompt):
+		self.key = key
+		self.child = child
+		self.prompt = prompt
+		self.created = time.monotonic()
+		self.last_used = self.created
+
+	def close(self):
+		try:
+			self.child.close()
+		except Exception:
+			pass
+
+
+class SessionPool:
+	"""Keeps logged in ssh sessions keyed by (host, user, root) and hands them out again.
+
+	A session is only ever used by one caller at a time. Before a session is
+	handed out again it is checked with an empty command that must return to the
+	prompt; dead sessions are replaced by a new login. Sessions idle for longer
+	than max_idle seconds are closed.
+
+	Args:
+			max_idle: seconds an unused session is kept open
+			max_per_key: most sessions open to the same host, user and root at once
+			health_timeout: seconds the health check waits for the prompt
+			spawn: function used instead of pexpect.spawn
+	"""
+
+	def __init__(self, max_idle=300, max_per_key=4, health_timeout=5, spawn=None):
+		self.max_idle = max_idle
+		self.max_per_key = max_per_key
+		self.health_timeout = health_timeout
+		self.spawn = spawn
+		self.logins = 0
+		self.reuses = 0
+		self._idle = {}
+		self._open = {}
+		self._cond = threading.Condition()
+
+	def _healthy(self, session):
+		child = session.child
+		try:
+			if not child.isalive():
+				return False
+			child.sendline('')
+			child.expect(session.prompt, timeout=self.health_timeout)
+			return True
+		except (pexpect.EOF, pexpect.TIMEOUT, OSError):
+			return False
+
+	def _discard(self, session):
+		with self._cond:
+			self._open[session.key] -= 1
+			self._cond.notify_all()
+		session.close()
+
+	def acquire(self, host, user, passwd, prompt, root_passwd=None, timeout=300):
+		"""Checks out a logged in session, reusing an idle one if it is still healthy.
+
+		Returns:
+				PooledSession, give it back with release()
+		"""
+		key = (host, user, root_passwd is not None)
+		self.evict_idle()
+		while True:
+			with self._cond:
+				while True:
+					idle = self._idle.get(key)
+					if idle:
+						session = idle.pop()
+						break
+					if self._open.get(key, 0) < self.max_per_key:
+						self._open[key] = self._open.get(key, 0) + 1
+						session = None
+						break
+					self._cond.wait()
+			if session is None:
+				try:
+					child = login(host, user, passwd, prompt, root_passwd, timeout, self.spawn)
+				except Exception:
+					with self._cond:
+						self._open[key] -= 1
+						self._cond.notify_all()
+					raise
+				self.logins += 1
+				session = PooledSession(key, child, prompt)
+				break
+			if self._healthy(session):
+				self.reuses += 1
+				break
+			logging.info('Dropping dead ssh session to ' + host)
+			self._discard(session)
+		session.child.timeout = timeout
+		return session
+
+	def release(self, session, broken=False):
+		"""Returns a session to the pool. Pass broken=True if it should be closed instead,
+		ex. after a reboot or a failed expect."""
+		if broken:
+			self._discard(session)
+			return
+		session.last_used = time.monotonic()
+		with self._cond:
+			self._idle.setdefault(session.key, []).append(session)
+			self._cond.notify_all()
+
+	@contextlib.contextmanager
+	def session(self, host, user, passwd, prompt, root_passwd=None, timeout=300):
+		"""Context manager around acquire()/release() that yields the pexpect child.
+		The session is closed instead of reused if the block raises."""
+		session = self.acquire(host, user, passwd, prompt, root_passwd, timeout)
+		try:
+			yield session.child
+		except BaseException:
+			self.release(session, broken=True)
+			raise
+		self.release(session)
+
+	def evict_idle(self):
+		"""Closes sessions that have been idle for longer than max_idle."""
+		cutoff = time.monotonic() - self.max_idle
+		expired = []
+		with self._cond:
+			for key, sessions in self._idle.items():
+				keep = [s for s in sessions if s.last_used >= cutoff]
+				expired.extend(s for s in sessions if s.last_used < cutoff)
+				sessions[:] = keep
+		for session in expired:
+			self._discard(session)
+
+	def close_all(self):
+		with self._cond:
+			sessions = [s for idle in self._idle.values() for s in idle]
+			self._idle.clear()
+		for session in sessions:
+			self._discard(session)
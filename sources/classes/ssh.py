@@ -1,140 +1,299 @@
 import logging
-import sys
-import pexpect
-import os
 import re
+import uuid
+from classes.constants import ALARM_SEVERITY_IDS
+from classes import gnss_analytics
+from classes.session_pool import login, read_lines
+from classes.table import PipeTable
 
 __author__ = 'Andy Nguyen'
 
+# Columns of the show alarm table: output name -> (header names, default position)
+ALARM_COLUMNS = {
+	'eventId': (('ID',), 0),
+	'severity': (('Severity', 'Sev'), 1),
+	'desc': (('Description', 'Desc'), 3)
+}
+# Columns of the satellite view in show gnss status
+GNSS_VIEW_COLUMNS = {
+	'satId': (('Sat ID', 'SatId', 'SV ID'), 0),
+	'gnssId': (('GNSS ID', 'GnssId', 'GNSS'), 1),
+	'snr': (('SNR', 'C/No'), 2),
+	'azimuthAngle': (('Azimuth', 'Azimuth Angle'), 3),
+	'elevationAngle': (('Elevation', 'Elevation Angle'), 4),
+	'prRes': (('PR Res', 'PrRes', 'Residual'), 5)
+}
+# Status lines of show gnss status: label -> output name
+GNSS_STATUS_FIELDS = (
+	('Latitude', 'latitude'),
+	('Longitude', 'longitude'),
+	('HGT Val Ellipsoid', 'hgEllipsoid'),
+	('Fix Quality', 'fixQuality'),
+	('Used Satellites', 'usedSatellites'),
+	('Reciever Status', 'recieverStatus'),
+	('Operation Mode', 'opMode'),
+	('Antenna Status', 'antennaStatus'),
+	('SBAS Constellation', 'sbasUsedConstellation')
+)
+
 class SSH:
-	def __init__(self, IP, user, passwd, root_passwd, prompt):
+	def __init__(self, IP, user, passwd, root_passwd, prompt, pool=None, timeout=300, spawn=None):
 		self.IP = IP
 		self.user = user
 		self.passwd = passwd
 		self.root_passwd = root_passwd
 		self.prompt = prompt
-		self.alarm_severity = {
-			'MAJOR': 3,
-			'MINOR': 4,
-			'NOTIFY': 5
-		}
+		self.alarm_severity = ALARM_SEVERITY_IDS
+		# Optional SessionPool. With a pool the logged in session is reused by the
+		# next SSH object for the same device once this one is closed
+		self.pool = pool
+		# Seconds a login or a command may wait for the prompt
+		self.timeout = timeout
+		# Replaces pexpect.spawn when there is no pool ex. a RecordingSpawn or ReplaySpawn
+		self.spawn = spawn
+		self._session = None
+		self._root_session = None
 		self.child = self.connect()
 
 
 	def connect(self):
+		"""Logs in, or takes a logged in session from the pool.
+
+		Raises:
+				ConnectionError: If the login fails
+		"""
 		try:
-			SSH = 'ssh ' + self.user + '@' + self.IP + ' -o StrictHostKeyChecking=no'
-			os.system("ssh-keygen -f " + "$HOME/.ssh/known_hosts " +
-					  "-R " + self.IP + " >/dev/null 2>&1")
-			child = pexpect.spawn(SSH, timeout=300)
-			child.expect('(?i)Password')
-			child.sendline(self.passwd)
-			child.expect(self.prompt)
+			if self.pool is not None:
+				self._session = self.pool.acquire(self.IP, self.user, self.passwd, self.prompt,
+												  timeout=self.timeout)
+				child = self._session.child
+			else:
+				child = login(self.IP, self.user, self.passwd, self.prompt, timeout=self.timeout,
+							  spawn=self.spawn)
 			logging.info('Successfully connected to ' + self.IP)
 			return child
-		except:
+		except Exception as e:
 			logging.error('Failed to login to ' + self.IP)
-			sys.exit(1)
+			raise ConnectionError('Failed to login to ' + self.IP) from e
 
 	def connect_root(self):
+		"""Logs in and su's to root, or takes such a session from the pool.
+
+		Raises:
+				ConnectionError: If the login fails
+		"""
 		try:
-			SSH = 'ssh ' + self.user + '@' + self.IP + ' -o StrictHostKeyChecking=no'
-			os.system("ssh-keygen -f " + "$HOME/.ssh/known_hosts " +
-					  "-R " + self.IP + " >/dev/null 2>&1")
-			child = pexpect.spawn(SSH, timeout=300)
-			child.expect('(?i)Password')
-			child.sendline(self.root_passwd)
-			child.expect(self.prompt)
-			child.sendline('su')
-			child.expect('(?i)Password')
-			child.sendline(self.root_passwd)
-			child.expect(self.prompt)
+			if self.pool is not None:
+				self._root_session = self.pool.acquire(self.IP, self.user, self.root_passwd,
+													   self.prompt, root_passwd=self.root_passwd,
+													   timeout=self.timeout)
+				child = self._root_session.child
+			else:
+				child = login(self.IP, self.user, self.root_passwd, self.prompt,
+							  root_passwd=self.root_passwd, timeout=self.timeout, spawn=self.spawn)
 			logging.info('Successfully connected to ' + self.IP)
 			return child
-		except:
+		except Exception as e:
 			logging.error('Failed to login to ' + self.IP)
-			sys.exit(1)
-	
-	def get_cmd_results(self, cmd):
+			raise ConnectionError('Failed to login to ' + self.IP) from e
+
+	def close(self, broken=False):
+		"""Gives the sessions back to the pool, or closes them if there is no pool."""
+		if self._root_session is not None:
+			self.pool.release(self._root_session, broken=broken)
+			self._root_session = None
+		if self._session is not None:
+			self.pool.release(self._session, broken=broken)
+			self._session = None
+		elif self.child is not None:
+			self.child.close()
+		self.child = None
+
+	def get_cmd_results(self, cmd, timeout=-1):
+		"""Runs a command and returns its output without the prompt.
+
+		Args:
+				cmd: CLI command
+				timeout: seconds to wait for the prompt, -1 for the session timeout
+		"""
 		self.child.sendline(cmd)
-		self.child.expect(self.prompt)
+		self.child.expect(self.prompt, timeout=timeout)
 		text = self.child.before.decode('utf-8')
 		return str(text).strip()
 
+	def iter_cmd_lines(self, cmd, timeout=-1):
+		"""Runs a command and yields its output line by line as it arrives.
+
+		Unlike get_cmd_results the whole output is never held as one string, so
+		this is the one to use for log dumps and long alarm histories.
+
+		Args:
+				cmd: CLI command
+				timeout: seconds to wait for each line, -1 for the session timeout
+
+		Returns:
+				Generator of output lines
+		"""
+		return read_lines(self.child, cmd, self.prompt, timeout)
+
+	def run_batch(self, cmds, timeout=-1):
+		"""Sends several commands at once and splits the combined output per command.
+
+		A marker comment line follows every command, and everything is sent up
+		front, so N commands cost about one prompt round-trip. The output of command
+		i is everything between its echo and marker i as the CLI echoes it after its
+		prompt. A marker the tty echoes early, in the middle of an output and
+		without a prompt in front, is skipped.
+
+		Args:
+				cmds: list of CLI commands
+				timeout: seconds to wait for each line, -1 for the session timeout
+
+		Returns:
+				List with the output lines of every command, in the order of cmds
+		"""
+		token = uuid.uuid4().hex[:8]
+		markers = ['#batch-' + token + '-' + str(i) for i in range(len(cmds))]
+		for cmd, marker in zip(cmds, markers):
+			self.child.sendline(cmd)
+			self.child.sendline(marker)
+		prompt = re.compile(self.prompt)
+		outputs = [[] for _ in cmds]
+		i = 0
+		collecting = False
+		while i < len(cmds):
+			self.child.expect('\r\n', timeout=timeout)
+			line = self.child.before.decode('utf-8')
+			# Echoed lines come after the prompt ex. 'SyncServer: show alarm'
+			parts = prompt.split(line)
+			typed = parts[-1].strip()
+			if typed in markers:
+				if len(parts) > 1 and typed == markers[i]:
+					collecting = False
+					i += 1
+				continue
+			if collecting:
+				outputs[i].append(line)
+			elif typed == cmds[i].strip():
+				collecting = True
+		# The prompt after the last marker
+		self.child.expect(self.prompt, timeout=timeout)
+		return outputs
+
+	def snapshot(self):
+		"""Reads show system, show gnss status and show alarm with one run_batch, in one round-trip.
+
+		Returns:
+				Dictionary with system, gnss (satellites, status) and alarms
+		"""
+		system, gnss, alarms = self.run_batch(['show system', 'show gnss status', 'show alarm'])
+		return {
+			'system': self.parse_system(system),
+			'gnss': self.parse_gnss(gnss),
+			'alarms': self.parse_alarms(alarms)
+		}
+
 	def get_alarms(self):
-		t = self.get_cmd_results('show alarm')
+		return self.parse_alarms(self.iter_cmd_lines('show alarm'))
+
+	def parse_alarms(self, lines):
+		"""Parses the table of show alarm.
+
+		|---|--------|-------------------|--------------------------------------------------------------------------------|
+		|175|MINOR   |2021-09-09 04:14:35|No power detected on AC2                                                        |
+
+		Args:
+				lines: iterable of output lines
+
+		Returns:
+				List of alarms ex. [{'eventId': 175, 'severity': 4, 'desc': 'No power detected on AC2'}]
+		"""
+		table = PipeTable('ID', ALARM_COLUMNS)
 		alarms = []
-		alarm_section = False
-		for line in t.splitlines():
-			l = str(line.strip())
-			if 'ID' in l:
-				alarm_section = True
-				continue
-			if alarm_section:
-				# regex to see if the string has any alphabet characters don't want ---|------|----
-				#|---|--------|-------------------|--------------------------------------------------------------------------------|
-                #|175|MINOR   |2021-09-09 04:14:35|No power detected on AC2                                                        |
-				text = re.search('[a-zA-Z]', l)
-				if text:
-					line = l.split('|')
-					alarm = {}
-					alarm['eventId'] = int(line[1].strip())
-					alarm['severity'] = int(self.alarm_severity.get(line[2].strip()))
-					alarm['desc'] = line[4].strip()
-					alarms.append(alarm)
+		for row in table.records(lines):
+			alarm = {}
+			alarm['eventId'] = int(row['eventId'])
+			alarm['severity'] = int(self.alarm_severity.get(row['severity']))
+			alarm['desc'] = row['desc']
+			alarms.append(alarm)
 		return alarms
 
-	def get_gnss(self):
-		output = self.get_cmd_results('show gnss status')
-		gnss_status_section = False
+	def get_gnss(self, as_array=False, as_columns=False):
+		"""Reads show gnss status.
+
+		Args:
+				as_array: return the satellite view as a numpy structured array with
+						numeric columns (see gnss_analytics.to_array) instead of dicts
+				as_columns: return the satellite view as gnss_analytics.to_columns
+						columns, which do not need numpy
+
+		Returns:
+				Tuple of (satellites, dictionary of status fields)
+
+		Raises:
+				ImportError: If as_array is given and numpy is not installed
+		"""
+		gps_list, data = self.parse_gnss(self.iter_cmd_lines('show gnss status'))
+		if as_array:
+			gps_list = gnss_analytics.to_array(gps_list)
+		elif as_columns:
+			gps_list = gnss_analytics.to_columns(gps_list)
+		return gps_list, data
+
+	def parse_gnss(self, lines):
+		"""Parses show gnss status in one pass: the status fields, then the satellite view table.
+
+		Args:
+				lines: iterable of output lines
+
+		Returns:
+				Tuple of (list of satellites, dictionary of status fields)
+		"""
 		data = {}
 		gps_list = []
+		table = PipeTable('Index', GNSS_VIEW_COLUMNS)
+		status_section = False
 		view_section = False
-		for l in output.splitlines():
-			if 'Latitude' in l or gnss_status_section:
-				gnss_status_section = True
-				if 'Latitude' in l:
-					# add 2 to get rid of spacing and colon in the line
-					# Latitude                  : 37 24 47.054 N 
-					data['latitude'] = l[l.index(':') + 2:].strip()
-				elif 'Longitude' in l: 
-					data['longitude'] = l[l.index(':') + 2:].strip()
-				elif 'HGT Val Ellipsoid' in l: 
-					data['hgEllipsoid'] = l[l.index(':') + 2:].strip()
-				elif 'Fix Quality' in l: 
-					data['fixQuality'] = l[l.index(':') + 2:].strip()
-				elif 'Used Satellites' in l: 
-					data['usedSatellites'] = l[l.index(':') + 2:].strip()
-				elif 'Reciever Status' in l: 
-					data['recieverStatus'] = l[l.index(':') + 2:].strip()
-				elif 'Operation Mode' in l: 
-					data['opMode'] = l[l.index(':') + 2:].strip()
-				elif 'Antenna Status' in l: 
-					data['antennaStatus'] = l[l.index(':') + 2:].strip()
-				elif 'SBAS Constellation' in l: 
-					data['sbasUsedConstellation'] = l[l.index(':') + 2:].strip()
+		for l in lines:
+			if view_section:
+				cells = table.feed(l)
+				if cells is not None:
+					gps_list.append(table.record(cells))
+				continue
 			if 'Index' in l:
-				gnss_status_section = False
 				view_section = True
+				table.feed(l)
 				continue
-			if view_section:
-				text = re.search('[a-zA-Z]', l)
-				if text:
-					line = l.split('|')
-					gps = {}
-					gps['satId'] = line[1].strip()
-					gps['gnssId'] = line[2].strip()
-					gps['snr'] = line[3].strip()
-					gps['azimuthAngle'] = line[4].strip()
-					gps['elevationAngle'] = line[5].strip()
-					gps['prRes'] = line[6].strip()
-					gps_list.append(gps)
+			# The status fields start at the Latitude line
+			if not status_section:
+				if 'Latitude' not in l:
+					continue
+				status_section = True
+			if ':' not in l:
+				continue
+			key, _, value = l.partition(':')
+			key = key.strip()
+			for label, name in GNSS_STATUS_FIELDS:
+				if label in key:
+					# Latitude                  : 37 24 47.054 N
+					data[name] = value.strip()
+					break
 		return gps_list, data
-	
+
 	def get_system(self):
-		output = self.get_cmd_results('show system')
+		return self.parse_system(self.iter_cmd_lines('show system'))
+
+	def parse_system(self, lines):
+		"""Parses show system.
+
+		Args:
+				lines: iterable of output lines
+
+		Returns:
+				Dictionary with serialNumber, model, softwareVer and oscillator
+		"""
 		data = {}
-		for l in output.splitlines():
+		for l in lines:
 			if 'Serial Num' in l:
 				data['serialNumber'] = l[l.index(':') + 2:].strip()
 			elif 'Model Num' in l:
@@ -0,0 +1,99 @@
+__author__ = 'Andy Nguyen'
+
+
+def is_separator(line):
+	"""True for table rule lines such as |---|------| or +----+ and for empty rows."""
+	return not line.strip(' \t\r\n-|+=')
+
+
+def split_row(line):
+	"""Splits |a|b|c| into ['a', 'b', 'c']."""
+	line = line.strip()
+	if line.startswith('|'):
+		line = line[1:]
+	if line.endswith('|'):
+		line = line[:-1]
+	return [cell.strip() for cell in line.split('|')]
+
+
+class PipeTable:
+	"""Single pass parser for the |-delimited tables the CLI prints.
+
+	Lines are fed one at a time, so it works on a whole output or on lines as
+	they stream in. Everything before the header row is ignored; the header is
+	the first |-line (containing header_marker if one is given). Rule lines are
+	skipped with a plain str.strip, no regex runs per line.
+
+	Args:
+			header_marker: text the header row must contain ex. 'ID' for show alarm
+			columns: dictionary of output name to (header names, default index). The
+					index of each column is looked up once in the header by name,
+					case-insensitive, and falls back to the default index.
+
+	ex.
+			table = PipeTable('ID', {'eventId': (('ID',), 0), 'desc': (('Description',), 3)})
+			for row in table.records(output.splitlines()):
+				...
+	"""
+
+	def __init__(self, header_marker=None, columns=None):
+		self.header_marker = header_marker
+		self.columns = columns or {}
+		self.header = None
+		self.index = None
+
+	def _resolve(self):
+		lookup = {name.lower(): i for i, name in enumerate(self.header)}
+		self.index = {}
+		for out_name, (names, default) in self.columns.items():
+			position = default
+			for name in names:
+				if name.lower() in lookup:
+					position = lookup[name.lower()]
+					break
+			self.index[out_name] = position
+
+	def feed(self, line):
+		"""Parses one line.
+
+		Returns:
+				The list of cells for a data row, otherwise None
+		"""
+		if '|' not in line or is_separator(line):
+			return None
+		if self.header is None:
+			if self.header_marker is None or self.header_marker in line:
+				self.header = split_row(line)
+				self._resolve()
+			return None
+		return split_row(line)
+
+	def rows(self, lines):
+		"""Lazily yields the cells of every data row."""
+		for line in lines:
+			cells = self.feed(line)
+			if cells is not None:
+				yield cells
+
+	def record(self, cells):
+		"""Maps one row of cells to a dictionary using the columns."""
+		size = len(cells)
+		return {name: cells[i] if i < size else None for name, i in self.index.items()}
+
+	def records(self, lines):
+		"""Lazily yields every data row as a dictionary of the columns."""
+		for cells in self.rows(lines):
+			yield self.record(cells)
+
+	def to_columns(self, lines):
+		"""Parses the whole table into one list per column.
+
+		Returns:
+				Dictionary of column name to list of strings
+		"""
+		out = {name: [] for name in self.columns}
+		for cells in self.rows(lines):
+			size = len(cells)
+			for name, i in self.index.items():
+				out[name].append(cells[i] if i < size else None)
+		return out
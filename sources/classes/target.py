@@ -7,6 +7,15 @@ import json
 import logging
 import time
 import sys
+import threading
+from classes.constants import ALARM_SEVERITY, CLOCK_STATE, API_INPUT_TIME_SRC, READABLE_INPUT_TIME_SRC, REFERENCE_IDS
+from classes.cache import ResponseCache
+from classes.fleet import Fleet
+from classes.ntp import plan_ntp_changes
+from classes.poller import Poller, LockedTo, IsUp, VersionIs
+from classes.telemetry import FIELDS, TelemetrySampler
+from classes.transport import Transport
+from classes.upload import SharedImage, MultipartUpload
 logging.getLogger('urllib3').propagate = False
 urllib3.disable_warnings()
 
@@ -14,7 +23,7 @@ __author__ = 'Andy Nguyen'
 
 
 class Target:
-	def __init__(self, IP, v1_or_v2, user, passwd):
+	def __init__(self, IP, v1_or_v2, user, passwd, cache=None, transport=None, metrics=None):
 		self.IP = IP
 		self.user = user
 		self.passwd = passwd
@@ -22,66 +31,58 @@ class Target:
 		self.base_url = 'https://' + self.IP + '/api/' + self.v1_or_v2
 		self.curr_ref = None
 		self.failed_lock = False
-		self.alarm_severity = {
-			3: 'MAJOR',
-			4: 'MINOR',
-			5: 'NOTIFY'
-		}
-		self.clock_state = {
-			0: 'Warmup',
-			1: 'Freerun',
-			2: 'Handset',
-			3: 'Locking',
-			4: 'Locked',
-			5: 'Bridging',
-			6: 'Holdover',
-			7: 'Holdover expired',
-			8: 'Recovering',
-			9: 'Handset -M',
-			10: 'Locked - M',
-			11: 'Holdover - M'
-		}
-		self.api_input_time_src = {
-			0: 'GNSS',
-			1: 'Slot A J1 Timecode',
-			2: 'Slot B J1 Timecode',
-			3: 'PTP'
-		}
-		self.readable_input_time_src = {
-			'GNSS': 0,
-			'Slot A J1 Timecode': 1,
-			'Slot B J1 Timecode': 2,
-			'PTP': 3
-		}
-		self.reference_IDs = {
-			0: 'GNSS',
-			1: 'Slot A J1 Timecode',
-			2: 'Slot B J1 Timecode',
-			3: 'PPS Slot A',
-			4: 'PPS Slot B',
-			5: 'Frequency signal connected to J2 Slot A',
-			6: 'Frequency signal connected to J2 Slot B',
-			7: 'Frequency signal connected to J1 Slot A',
-			8: 'Frequency signal connected to J1 Slot B',
-			9: 'Frequency signal connected to J7 Slot A',
-			10: 'Frequency signal connected to J7 Slot B',
-			11: 'PTP',
-			12: 'NTP',
-			13: 'Standard',
-			14: 'OCXO Oscillator',
-			15: 'Rubidium Oscillator',
-			16: 'High Performance Rubidium Oscillator'
-		}
+		self.alarm_severity = ALARM_SEVERITY
+		self.clock_state = CLOCK_STATE
+		self.api_input_time_src = API_INPUT_TIME_SRC
+		self.readable_input_time_src = READABLE_INPUT_TIME_SRC
+		self.reference_IDs = REFERENCE_IDS
 		self.version = None
-		self.oscillator = None
-		# When creating a Target object, need to check if server is up
-		# self.ping_server()
-		# If it is up, start a new session
+		self._oscillator = None
+		# Opt-in GET cache. Pass True for the defaults or a ResponseCache to tune TTLs
+		if cache is True:
+			cache = ResponseCache()
+		self.cache = cache
+		# Creating a Target does no network I/O. The session is logged in and
+		# /system/inventory is checked on first use or by connect()/connect_all()
 		self.session = requests.Session()
 		self.session.auth = (self.user, self.passwd)
-		self.session.post(self.base_url, verify=False)
-		# Check to make sure API is working correctly
-		self.check_api()
+		# Retries, circuit breaker and typed errors for every request to this K2.
+		# Pass the same Metrics to many Targets to collect the whole fleet in one place
+		self.transport = transport or Transport(metrics=metrics)
+		self.connected = False
+		self._connect_lock = threading.Lock()
+		# Seconds the last upgrade took per step: download, upload and reboot
+		self.timings = {}
+
+	def connect(self):
+		"""Logs the session in and reads the oscillator from /system/inventory.
+		Only does the work once, every later call returns straight away.
+
+		Returns:
+				self
+
+		Raises:
+				TargetError: If the K2 can not be reached or the API is not working
+		"""
+		with self._connect_lock:
+			if not self.connected:
+				self.transport.request(self.session, 'POST', self.base_url, device=self.IP)
+				self._load_inventory()
+				self.connected = True
+		return self
+
+	def _ensure_connected(self):
+		if not self.connected:
+			self.connect()
+
+	@property
+	def oscillator(self):
+		self._ensure_connected()
+		return self._oscillator
+
+	@oscillator.setter
+	def oscillator(self, value):
+		self._oscillator = value
 
 	def ping_server(self):
 		"""Pings server to see if it is up.
@@ -111,21 +112,20 @@ class Target:
 				None
 
 		Returns:
-				True or Exit program because there is an error in API
+				True
 
 		Raises:
-				HTTPError: If there is an error in the request
+				TargetError: If there is an error in the request
 		"""
-		try:
-			url = self.base_url + '/system/inventory'
-			response = self.session.get(url, verify=False)
-			response.raise_for_status()
-			data = json.loads(response.text)
-			self.oscillator = data.get('inventory').get('oscillator')
-			return True
-		except requests.exceptions.HTTPError as e:
-			logging.error(e)
-			sys.exit(1)
+		return self._load_inventory()
+
+	def _load_inventory(self):
+		endpoint = '/system/inventory'
+		response = self.transport.request(
+			self.session, 'GET', self.base_url + endpoint, device=self.IP, endpoint=endpoint)
+		data = json.loads(response.text)
+		self.oscillator = data.get('inventory').get('oscillator')
+		return True
 
 	def get(self, endpoint):
 		"""Makes a GET request using the given in self.IP
@@ -137,17 +137,33 @@ class Target:
 				The data for the GET request
 
 		Raises:
-				HTTPError: If there is an error in the request
+				TargetError: If there is an error in the request
 		"""
-		try:
-			url = self.base_url + endpoint
-			response = self.session.get(url, verify=False)
-			response.raise_for_status()
-			data = json.loads(response.text)
-			return data
-		except requests.exceptions.HTTPError as e:
-			logging.error(e)
-			sys.exit(1)
+		if self.cache is not None:
+			hit, data = self.cache.get(endpoint)
+			if hit:
+				return data
+		response = self._request('GET', endpoint)
+		data = json.loads(response.text)
+		if self.cache is not None:
+			self.cache.put(endpoint, response.text)
+		return data
+
+	def get_typed(self, model):
+		"""Makes a GET request for a typed model, decoded straight from the response bytes.
+		Skips the text/dict round trip of get() which matters when polling many K2s.
+
+		Args:
+				model: model class from classes.models ex. SystemState, Inventory, TimingConfig, GnssConfig
+
+		Returns:
+				An instance of model
+
+		Raises:
+				TargetError: If there is an error in the request
+		"""
+		response = self._request('GET', model.ENDPOINT)
+		return model.decode(response.content)
 
 	def post(self, endpoint, data):
 		"""Makes a POST request using the given in self.IP
@@ -159,17 +175,11 @@ class Target:
 				The status code if the POST request was successful
 
 		Raises:
-				HTTPError: If there is an error in the request
+				TargetError: If there is an error in the request
 		"""
-		try:
-			url = self.base_url + endpoint
-			response = self.session.post(
-				url, data=json.dumps(data), verify=False)
-			response.raise_for_status()
-			return response.status_code
-		except requests.exceptions.HTTPError as e:
-			logging.error(e)
-			sys.exit(1)
+		self._invalidate(endpoint)
+		response = self._request('POST', endpoint, data=json.dumps(data))
+		return response.status_code
 
 	def put(self, endpoint, data):
 		"""Makes a PUT request using the given IP
@@ -181,17 +191,11 @@ class Target:
 				The status code of if the PUT request was successful
 
 		Raises:
-				HTTPError: If there is an error in the request
+				TargetError: If there is an error in the request
 		"""
-		try:
-			url = self.base_url + endpoint
-			response = self.session.put(
-				url, data=json.dumps(data), verify=False)
-			response.raise_for_status()
-			return response.status_code
-		except requests.exceptions.HTTPError as e:
-			logging.error(e)
-			sys.exit(1)
+		self._invalidate(endpoint)
+		response = self._request('PUT', endpoint, data=json.dumps(data))
+		return response.status_code
 
 	def delete(self, endpoint):
 		"""Makes a DELETE request using the given IP
@@ -203,17 +207,34 @@ class Target:
 				The status code of if the DELETE request was successful
 
 		Raises:
-				HTTPError: If there is an error in the request
+				TargetError: If there is an error in the request
 		"""
-		try:
-			url = self.base_url + endpoint
-			# For some reason the API requires you to pass in a empty {} to the data even though its optional
-			response = self.session.delete(
-				url, data=json.dumps({}), verify=False)
-			response.raise_for_status()
-		except requests.exceptions.HTTPError as e:
-			logging.error(e)
-			sys.exit(1)
+		self._invalidate(endpoint)
+		# For some reason the API requires you to pass in a empty {} to the data even though its optional
+		response = self._request('DELETE', endpoint, data=json.dumps({}))
+		return response.status_code
+
+	def _request(self, method, endpoint, **kwargs):
+		"""Sends a request to endpoint through self.transport once the session is connected."""
+		self._ensure_connected()
+		return self.transport.request(self.session, method, self.base_url + endpoint,
+									  device=self.IP, endpoint=endpoint, **kwargs)
+
+	def _invalidate(self, endpoint):
+		"""Drops cached GET data for endpoint before it is written to."""
+		if self.cache is not None:
+			self.cache.invalidate(endpoint)
+
+	@property
+	def metrics(self):
+		"""The Metrics this K2's requests are recorded in, or None."""
+		return self.transport.metrics
+
+	def cache_stats(self):
+		"""Returns the hit/miss counters of the GET cache or None if caching is off."""
+		if self.cache is None:
+			return None
+		return self.cache.stats()
 
 	def pretty_print(self, data):
 		print(json.dumps(data, indent=4))
@@ -235,148 +256,208 @@ class Target:
 		Returns:
 				True
 		"""
+		start = time.monotonic()
 		image.get_image()
-		time.sleep(20)
-
-		files = {('authfile', open(image.auth_name, 'rb')),
-				 ('upgradefile', open(image.name, 'rb'))}
-		data = {'authfile': image.auth_name, 'upgradefile': image.name}
-		endpoint = '/admin/upgrade'
-		system_inventory = '/system/inventory'
-		system_data = self.get(system_inventory)
-		software_version = system_data.get('softwareVer')
-		if software_version != image.version:
+		# get_image only returns once scp has finished and the sizes are checked
+		self.timings['download'] = time.monotonic() - start
+
+		try:
+			system_inventory = '/system/inventory'
+			system_data = self.get(system_inventory)
+			software_version = system_data.get('softwareVer')
+			if software_version == image.version:
+				logging.info('Software versions are the same. No need to update.')
+				return True
 			logging.info('Different versions. Current version = ' +
 						 software_version + '. Software version = ' + image.version)
-			try:
-				url = self.base_url + endpoint
-				response = self.session.post(
-					url, files=files, data=data, verify=False)
-				response.raise_for_status()
-			except requests.exceptions.HTTPError as e:
-				logging.error(e)
-				sys.exit(1)
-			logging.info(
-				"Sleeping for 6 minutes to let K2 upgrade and reboot.")
-			time.sleep(360)
-			os.remove(image.auth_name)
-			os.remove(image.name)
-			return self.upgrade_poll(image)
-		else:
-			logging.info('Software versions are the same. No need to update.')
-			os.remove(image.auth_name)
-			os.remove(image.name)
-		return True
+			with SharedImage(image.local_path(image.auth_name)) as auth, \
+					SharedImage(image.local_path(image.name)) as upgrade_file:
+				progress = self.upload_firmware(auth, upgrade_file)
+			logging.info(str(progress))
+			self.timings['upload'] = progress.elapsed
+		finally:
+			# Removes the files, or unpins them if they are kept in an ArtifactCache for the
+			# next unit, also when the upload failed
+			image.release_files()
+		# The K2 installs the image and reboots on its own. Instead of sleeping
+		# for 6 minutes, poll until it has gone down and reports the new version
+		return self.upgrade_poll(image, timeout=1020, require_down=True, down_grace=600)
 		# need to continue polling until system is up.
 
-	def upgrade_poll(self, image):
+	def upload_firmware(self, auth, upgrade_file, callback=None, throttle=None):
+		"""Streams the auth and upgrade files to /admin/upgrade as multipart/form-data.
+		The files are read from shared memory maps so many Targets can upload the same image at once.
+
+		Args:
+				auth: SharedImage of the _auth.dat file
+				upgrade_file: SharedImage of the .bin file
+				callback: optional function(progress) called as the upload advances
+				throttle: optional bandwidth limiter with a consume(nbytes) method
+
+		Returns:
+				UploadProgress with the bytes sent, time taken and throughput
+
+		Raises:
+				TargetError: If there is an error in the request
+				IOError: If the K2 stopped reading before the whole body was sent
+		"""
+		if self.cache is not None:
+			self.cache.clear()
+		body = MultipartUpload(
+			[('authfile', auth.name), ('upgradefile', upgrade_file.name)],
+			[('authfile', auth), ('upgradefile', upgrade_file)],
+			device=self.IP, callback=callback, throttle=throttle)
+		# The body is a stream that can only be sent once, so it is not retried
+		self._request('POST', '/admin/upgrade', data=body, retry=False,
+					  timeout=(self.transport.timeout, 600),
+					  headers={'Content-Type': body.content_type})
+		if not body.progress.done:
+			raise IOError(self.IP + ': upload stopped after ' + str(body.progress.sent) +
+						  ' of ' + str(body.progress.total) + ' bytes')
+		return body.progress
+
+	def probe(self, endpoint, timeout=10):
+		"""Makes a GET request that raises on failure instead of exiting. Used by the Poller.
+
+		Args:
+				endpoint: API endpoint string ex: /system/state
+				timeout: seconds to wait for the K2 to answer
+
+		Returns:
+				The data for the GET request
+
+		Raises:
+				TargetError: If there is an error in the request
+		"""
+		# Polling a rebooting K2 is expected to fail, so skip the retries and the breaker
+		response = self._request('GET', endpoint, retry=False, use_breaker=False, timeout=timeout)
+		return json.loads(response.text)
+
+	def read_telemetry(self, alarms_endpoint=None):
+		"""Reads the numeric fields the TelemetrySampler records from /system/state, /gnss and the alarms.
+		Fields the K2 does not report, or whose request failed, are left as None.
+
+		Args:
+				alarms_endpoint: endpoint listing the active alarms, None to skip the alarm counts
+
+		Returns:
+				Dictionary with syncState, currRef, satellites, majorAlarms and minorAlarms
+
+		Raises:
+				TargetError: If none of the requests succeeded
+		"""
+		sample = dict.fromkeys(FIELDS)
+		probes = 2
+		errors = []
+		try:
+			state = self.probe('/system/state')
+			sample['syncState'] = state.get('syncState')
+			sample['currRef'] = state.get('currRef')
+		except Exception as e:
+			errors.append(e)
+		try:
+			gnss = self.probe('/gnss')
+			status = gnss.get('status') or {}
+			sample['satellites'] = gnss.get('usedSatellites', status.get('usedSatellites'))
+		except Exception as e:
+			errors.append(e)
+		if alarms_endpoint is not None:
+			probes += 1
+			try:
+				severities = [self.get_alarm_severity(alarm) for alarm in self.probe(alarms_endpoint)]
+				sample['majorAlarms'] = severities.count('MAJOR')
+				sample['minorAlarms'] = severities.count('MINOR')
+			except Exception as e:
+				errors.append(e)
+		for error in errors:
+			logging.debug(self.IP + ': telemetry field failed: ' + repr(error))
+		if len(errors) == probes:
+			raise errors[-1]
+		return sample
+
+	def start_telemetry(self, interval=1.0, alarms_endpoint=None, **kwargs):
+		"""Starts sampling this K2 in the background. Call stop() on the returned sampler to end it.
+
+		Args:
+				interval: seconds between samples
+				alarms_endpoint: endpoint listing the active alarms, None to skip the alarm counts
+				**kwargs: passed to TelemetrySampler ex. capacity, rollup
+
+		Returns:
+				The running TelemetrySampler
+		"""
+		return TelemetrySampler([self], interval=interval, alarms_endpoint=alarms_endpoint,
+								**kwargs).start()
+
+	def upgrade_poll(self, image, timeout=660, require_down=False, down_grace=120):
 		"""Polls after upgrading until the K2 is back up by checking /syste/inventory for softwareVer.
 		Checks to see if the upgrade is successful by comparing the version on the image and on the K2
 
 		Args:
 				image: Image class that has the data to ssh into the build to download the files	
+				timeout: seconds to keep polling before giving up
+				require_down: only judge the version once the K2 has been seen rebooting
+				down_grace: seconds to wait for the reboot before judging the version anyway
 
 		Return:
 				True or False depending if the software version is the same as the image file
 		"""
-		sleep_count = 0
-		endpoint = '/system/inventory'
-		url = self.base_url + endpoint
-		while True:
-			try:
-				if sleep_count > 10:  # just choose arbitrary number
-					self.version = "Failed to get software version"
-					logging.error('Failed to upgrade.')
-					return False
-				response = self.session.get(url, verify=False)
-				response.raise_for_status()
-				data = json.loads(response.text)
-				self.version = data.get('softwareVer')
-				if self.version == image.version:
-					return True
-				if self.version is not None:
-					return False
-			except requests.exceptions.HTTPError as e:
-				logging.error(
-					str(e) + 'Unsuccessful connectin to server. Sleeping still.')
-				sleep_count += 1
-				time.sleep(60)
-
-	def reboot_poll(self):
-		# need to let system reboot for some time before polling
-		"""Polls after reboot until the K2 is up.
+		poller = Poller()
+		poller.watch(self, VersionIs(image.version, require_down, down_grace), timeout=timeout)
+		result = poller.run().get(self.IP)
+		self.timings['reboot'] = result.elapsed
+		if result.data is not None:
+			self.version = result.data.get('softwareVer')
+		else:
+			self.version = "Failed to get software version"
+			logging.error('Failed to upgrade.')
+		return result.reached
+
+	def reboot_poll(self, timeout=900):
+		"""Polls after reboot until the K2 is up. Checks quickly once the K2 answers again
+		instead of sleeping for a fixed time first.
 
 		Args:
-				image: Image class that has the data to ssh into the build to download the files	
+				timeout: seconds to keep polling before giving up
 
 		Return:
-				True or False depending if the software version is the same as the image file
+				True or False depending on if the K2 came back up
 		"""
-		sleep_count = 0
-		logging.info('Sleeping for 6 minutes for reboot')
-		time.sleep(360)
-		endpoint = '/system/state'
-		while True:
-			try:
-				if sleep_count > 10:
-					return False
-				url = self.base_url + endpoint
-				response = self.session.get(url, verify=False)
-				response.raise_for_status()
-				data = json.loads(response.text)
-				curr_state = self.clock_state.get(int(data.get('syncState')))
-				logging.info(curr_state)
-				if curr_state is not None:
-					return True
-			except requests.exceptions.ConnectionError:
-				logging.info("Server is still down. Sleeping for 5 seconds.")
-				sleep_count += 1
-				time.sleep(5)
-
-	def lock_poll_for(self, endpoint, ref):
+		poller = Poller()
+		poller.watch(self, IsUp(require_down=True), timeout=timeout)
+		result = poller.run().get(self.IP)
+		if result.data is not None:
+			logging.info(self.clock_state.get(int(result.data.get('syncState'))))
+		return result.reached
+
+	def lock_poll_for(self, endpoint, ref, timeout=1800):
 		"""Polls until it is "Locked" to the ref given.
 
 		Args:
 				endpoint: API endpoint string ex: /system/state
 				ref: Reference that the user wants to lock to ex: GNSS, NTP, or PTP
+				timeout: seconds to keep polling before giving up
 
 		Return:
-				True or False depending on if K2 is "Locked" to the given ref after 20 minutes
+				True or False depending on if K2 is "Locked" to the given ref after 30 minutes
 		"""
-		sleep_count = 0
-		url = self.base_url + endpoint
-		while True:
-			try:
-				logging.info('Sleep count = ' + str(sleep_count))
-				response = self.session.get(url, verify=False)
-				response.raise_for_status()
-				data = json.loads(response.text)
-				state = self.clock_state.get(int(data.get('syncState')))
-				sys_ref = self.reference_IDs.get(int(data.get('currRef')))
-				if sleep_count > 30:
-					logging.error('Failed to lock to ' + ref + '.')
-					logging.error('Currently locked to ' + sys_ref + '.')
-					self.curr_ref = 'FAILED. Timed out before locking.\nCurrently locked to ' + \
-						sys_ref + '.\nCurrent sync state = ' + state + '.'
-					self.failed_lock = True
-					return False
-				if state is not None and sys_ref is not None:
-					logging.info('state = ' + state)
-					logging.info('ref = ' + sys_ref)
-					if state == 'Locked' and sys_ref == ref:
-						logging.info('Sucessfully locked to ' + sys_ref + '.')
-						self.curr_ref = sys_ref
-						self.failed_lock = False
-						return True
-					else:
-						logging.info('Sleeping for 60 seconds.')
-						sleep_count += 1
-						time.sleep(60)
-				else:
-					logging.info(
-						'State or reference has a None type. Check dictionary.')
-			except requests.exceptions.ConnectionError:
-				time.sleep(30)
+		poller = Poller()
+		poller.watch(self, LockedTo(ref, endpoint), timeout=timeout)
+		result = poller.run().get(self.IP)
+		if result.reached:
+			logging.info('Sucessfully locked to ' + ref + '.')
+			self.curr_ref = ref
+			self.failed_lock = False
+			return True
+		state, sys_ref = None, None
+		if result.data is not None:
+			state, sys_ref = LockedTo(ref).signature(result.data)
+		logging.error('Failed to lock to ' + ref + '.')
+		logging.error('Currently locked to ' + str(sys_ref) + '.')
+		self.curr_ref = 'FAILED. Timed out before locking.\nCurrently locked to ' + \
+			str(sys_ref) + '.\nCurrent sync state = ' + str(state) + '.'
+		self.failed_lock = True
+		return False
 
 	def get_gnss_config_data_for(self, constellations, SBAS):
 		"""Disables all other constellations except the given constellation
@@ -454,12 +535,7 @@ class Target:
 	def del_all_ntp_servers(self):
 		"""Deletes all NTP servers.
 		"""
-		endpoint = '/ntp/servers'
-		servers = self.get(endpoint)
-		if len(servers) > 0:
-			for _ in servers:
-				# It is always 1 because once you delete an alarm, the position of the second alarm becomes 1
-				self.delete('/ntp/servers/1')
+		self.reconcile_ntp_servers([], restart=False)
 
 	def add_ntp_server(self, ntp_list):
 		"""Adds a NTP server to the K2 at self.IP
@@ -468,10 +544,35 @@ class Target:
 				ntp_list: list of NTP servers ex. [{'role': 0, 'addrName': '10.241.55.21'}]
 		"""
 		endpoint = '/ntp/servers'
-		# Will change this to ntp_list when I start adding NTP servers
-		data = {'servers': [{'role': 0, 'addrName': '10.241.55.21'}]}
+		data = {'servers': ntp_list}
 		self.post(endpoint, data)
 
+	def reconcile_ntp_servers(self, desired_list, restart=True):
+		"""Makes the NTP server list on the K2 match desired_list with the fewest requests.
+		Servers that are already configured the same way are not touched.
+
+		Args:
+				desired_list: list of NTP servers ex. [{'role': 0, 'addrName': '10.241.55.21', 'prefer': True}]
+				restart: restart NTPd through reset_ntp if anything changed
+
+		Returns:
+				The number of requests sent to change the configuration
+		"""
+		endpoint = '/ntp/servers'
+		current = self.get(endpoint)
+		ops = plan_ntp_changes(current, desired_list)
+		for method, op_endpoint, data in ops:
+			if method == 'DELETE':
+				self.delete(op_endpoint)
+			elif method == 'PUT':
+				self.put(op_endpoint, data)
+			else:
+				self.post(op_endpoint, data)
+		if ops and restart:
+			self.reset_ntp()
+		logging.info(self.IP + ': NTP servers reconciled with ' + str(len(ops)) + ' changes.')
+		return len(ops)
+
 	def setup_gnss_prefer_to(self, bool_value):
 		"""Sets Hardware Reference Clock in NTPd Config page to prefered or unpreferred.
 
@@ -493,7 +594,7 @@ class Target:
 		endpoint = '/ntp/servers'
 		data = self.get(endpoint)
 		for index, s in enumerate(data, start=1):
-			if s.get('addrName') == server_ip:
+			if s.get('addrName') == server_ip and s.get('prefer') != bool_value:
 				s.update({'prefer': bool_value})
 				server_config = {'server': s}
 				self.put('/ntp/servers/' + str(index), server_config)
@@ -614,3 +715,16 @@ class Target:
 		print(json.dumps(d, indent=2))
 		clock_class = d[0].get('status').get('clockClass')
 		print(clock_class)
+
+
+def connect_all(targets, concurrency=16):
+	"""Logs in and checks the API of many Targets concurrently.
+
+	Args:
+			targets: list of Target
+			concurrency: how many Targets to connect at once
+
+	Returns:
+			Dictionary of IP to FleetResult. Targets that failed have the exception in .error
+	"""
+	return Fleet(targets, concurrency=concurrency).call('connect')
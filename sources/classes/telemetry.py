@@ -0,0 +1,201 @@
+import array
+import concurrent.futures
+import logging
+import math
+import threading
+import time
+
+__author__ = 'Andy Nguyen'
+
+FIELDS = ('syncState', 'currRef', 'satellites', 'majorAlarms', 'minorAlarms')
+
+
+class RingBuffer:
+	"""Fixed size buffer of floats backed by a preallocated array.
+
+	Appending never allocates; once full the oldest value is overwritten.
+
+	Args:
+			capacity: number of values kept
+	"""
+
+	def __init__(self, capacity):
+		self.capacity = capacity
+		self._data = array.array('d', [math.nan]) * capacity
+		self._next = 0
+		self._count = 0
+
+	def append(self, value):
+		self._data[self._next] = value
+		self._next = (self._next + 1) % self.capacity
+		if self._count < self.capacity:
+			self._count += 1
+
+	def __len__(self):
+		return self._count
+
+	def values(self):
+		"""Returns the values oldest first as an array."""
+		if self._count < self.capacity:
+			return self._data[:self._count]
+		return self._data[self._next:] + self._data[:self._next]
+
+	def last(self):
+		if not self._count:
+			return math.nan
+		return self._data[self._next - 1]
+
+
+class Series:
+	"""One metric of one device: recent raw samples plus min/max/mean rollups of older ones.
+
+	Every `rollup` raw samples are also folded into one rollup point, so the
+	rollup buffers cover rollup times more history than the raw buffer in the
+	same amount of memory.
+
+	Args:
+			capacity: raw samples kept
+			rollup: raw samples per rollup point
+			rollup_capacity: rollup points kept
+	"""
+
+	def __init__(self, capacity=3600, rollup=60, rollup_capacity=1440):
+		self.rollup = rollup
+		self.times = RingBuffer(capacity)
+		self.raw = RingBuffer(capacity)
+		self.rollup_times = RingBuffer(rollup_capacity)
+		self.mins = RingBuffer(rollup_capacity)
+		self.maxs = RingBuffer(rollup_capacity)
+		self.means = RingBuffer(rollup_capacity)
+		self._reset_bucket()
+
+	def _reset_bucket(self):
+		self._n = 0
+		self._valid = 0
+		self._sum = 0.0
+		self._min = math.inf
+		self._max = -math.inf
+		self._start = math.nan
+
+	def append(self, timestamp, value):
+		self.times.append(timestamp)
+		self.raw.append(value)
+		if self._n == 0:
+			self._start = timestamp
+		self._n += 1
+		if not math.isnan(value):
+			self._valid += 1
+			self._sum += value
+			if value < self._min:
+				self._min = value
+			if value > self._max:
+				self._max = value
+		if self._n == self.rollup:
+			self.rollup_times.append(self._start)
+			if self._valid:
+				self.mins.append(self._min)
+				self.maxs.append(self._max)
+				self.means.append(self._sum / self._valid)
+			else:
+				self.mins.append(math.nan)
+				self.maxs.append(math.nan)
+				self.means.append(math.nan)
+			self._reset_bucket()
+
+
+class DeviceTelemetry:
+	"""The Series of every telemetry field for one device."""
+
+	def __init__(self, device, capacity=3600, rollup=60, rollup_capacity=1440):
+		self.device = device
+		self.series = {field: Series(capacity, rollup, rollup_capacity) for field in FIELDS}
+		self.errors = 0
+		self.skipped = 0
+
+	def record(self, timestamp, sample):
+		for field, series in self.series.items():
+			value = sample.get(field)
+			series.append(timestamp, math.nan if value is None else float(value))
+
+	def latest(self):
+		return {field: series.raw.last() for field, series in self.series.items()}
+
+
+class TelemetrySampler:
+	"""Samples read_telemetry() of many Targets at a fixed rate on a background thread.
+
+	Ticks are scheduled at fixed times from the start, so a slow round does not
+	drift the rate. If a device's previous sample is still running when the next
+	tick is due, that tick is skipped for the device and counted in .skipped.
+
+	Args:
+			targets: list of Target
+			interval: seconds between samples
+			capacity: raw samples kept per field and device
+			rollup: raw samples per min/max/mean rollup point
+			rollup_capacity: rollup points kept per field and device
+			workers: number of requests in flight at once
+			alarms_endpoint: endpoint listing the active alarms, passed to every
+					read_telemetry() call, None to leave the alarm counts out
+	"""
+
+	def __init__(self, targets, interval=1.0, capacity=3600, rollup=60,
+				 rollup_capacity=1440, workers=16, alarms_endpoint=None):
+		self.targets = list(targets)
+		self.interval = interval
+		self.workers = workers
+		self.alarms_endpoint = alarms_endpoint
+		self.devices = {t.IP: DeviceTelemetry(t.IP, capacity, rollup, rollup_capacity)
+						for t in self.targets}
+		self._stop = threading.Event()
+		self._thread = None
+
+	def start(self):
+		self._stop.clear()
+		self._thread = threading.Thread(target=self._run, name='telemetry', daemon=True)
+		self._thread.start()
+		return self
+
+	def stop(self):
+		self._stop.set()
+		if self._thread is not None:
+			self._thread.join()
+			self._thread = None
+
+	def _sample(self, target, timestamp):
+		telemetry = self.devices[target.IP]
+		try:
+			sample = target.read_telemetry(alarms_endpoint=self.alarms_endpoint)
+		except Exception as e:
+			telemetry.errors += 1
+			logging.debug(target.IP + ': telemetry sample failed: ' + repr(e))
+			sample = {}
+		telemetry.record(timestamp, sample)
+
+	def _run(self):
+		in_flight = {}
+		start = time.monotonic()
+		tick = 0
+		with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+			while not self._stop.is_set():
+				timestamp = time.time()
+				for target in self.targets:
+					future = in_flight.get(target.IP)
+					if future is not None and not future.done():
+						self.devices[target.IP].skipped += 1
+						continue
+					in_flight[target.IP] = executor.submit(self._sample, target, timestamp)
+				tick += 1
+				next_tick = start + tick * self.interval
+				now = time.monotonic()
+				if now > next_tick:
+					tick = int((now - start) / self.interval) + 1
+					next_tick = start + tick * self.interval
+				self._stop.wait(next_tick - now)
+
+	def series(self, device, field):
+		return self.devices[device].series[field]
+
+	def snapshot(self):
+		"""Returns the latest value of every field for every device."""
+		return {device: telemetry.latest() for device, telemetry in self.devices.items()}
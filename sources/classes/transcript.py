@@ -0,0 +1,298 @@
+import gzip
+import json
+import re
+import threading
+import time
+import pexpect
+
+__author__ = 'Andy Nguyen'
+
+# Recorded in place of a line sent in answer to a password prompt
+REDACTED = '<redacted>'
+_PASSWORD_PROMPT = re.compile(rb'(?i)password[^\n]*$')
+
+
+class ReplayError(Exception):
+	"""The code under replay did something the transcript does not contain."""
+
+
+def _open(path, mode):
+	if path.endswith('.gz'):
+		return gzip.open(path, mode + 't', encoding='utf-8')
+	return open(path, mode, encoding='utf-8')
+
+
+def _to_text(data):
+	# latin-1 maps every byte to one character, so any output survives JSON
+	return data.decode('latin-1')
+
+
+def _to_bytes(text):
+	return text.encode('latin-1')
+
+
+class TranscriptWriter:
+	"""Writes the sessions of a RecordingSpawn to a transcript file.
+
+	The file holds one JSON event per line, gzip compressed if the path ends in
+	.gz. Every event has the session number and the seconds since that session
+	was spawned:
+			{"s": 0, "t": 0.0, "spawn": "ssh testuser@10.0.0.1 ..."}
+			{"s": 0, "t": 1.2, "send": "show system"}
+			{"s": 0, "t": 1.5, "recv": "show system\\r\\nSerial Num ..."}
+			{"s": 0, "t": 9.1, "exit": 0}
+
+	Lines sent right after a password prompt are written as REDACTED, so
+	transcripts can be shared without the login or root passwords.
+
+	Args:
+			path: transcript file
+	"""
+
+	def __init__(self, path):
+		self.path = path
+		self._file = _open(path, 'w')
+		self._lock = threading.Lock()
+		self._sessions = 0
+
+	def new_session(self):
+		with self._lock:
+			self._sessions += 1
+			return self._sessions - 1
+
+	def write(self, event):
+		line = json.dumps(event, separators=(',', ':'))
+		with self._lock:
+			self._file.write(line + '\n')
+
+	def close(self):
+		with self._lock:
+			self._file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+
+class RecordingChild:
+	"""Wraps a pexpect child and records everything sent and every byte consumed by expect."""
+
+	def __init__(self, child, writer, command):
+		self._child = child
+		self._writer = writer
+		self._session = writer.new_session()
+		self._start = time.monotonic()
+		self._password_prompt = False
+		self._event({'spawn': command})
+
+	def _event(self, event):
+		event['s'] = self._session
+		event['t'] = round(time.monotonic() - self._start, 4)
+		self._writer.write(event)
+
+	def _received(self):
+		data = self._child.before or b''
+		if isinstance(self._child.after, bytes):
+			data += self._child.after
+		self._password_prompt = _PASSWORD_PROMPT.search(data) is not None
+		if data:
+			self._event({'recv': _to_text(data)})
+
+	def sendline(self, line=''):
+		self._event({'send': REDACTED if self._password_prompt else line})
+		self._password_prompt = False
+		return self._child.sendline(line)
+
+	def expect(self, pattern, timeout=-1, **kwargs):
+		try:
+			index = self._child.expect(pattern, timeout=timeout, **kwargs)
+		except pexpect.EOF:
+			self._received()
+			self._event({'eof': True})
+			raise
+		self._received()
+		if self._child.after is pexpect.EOF:
+			self._event({'eof': True})
+		return index
+
+	def close(self, *args, **kwargs):
+		try:
+			return self._child.close(*args, **kwargs)
+		finally:
+			self._event({'exit': self._child.exitstatus})
+
+	def __getattr__(self, name):
+		return getattr(self._child, name)
+
+
+class RecordingSpawn:
+	"""Drop-in for pexpect.spawn that records every session to a TranscriptWriter.
+
+	Pass it as spawn= to login, SessionPool, SSH or Image.
+
+	Args:
+			writer: TranscriptWriter
+			spawn: function that really starts the process, defaults to pexpect.spawn
+	"""
+
+	def __init__(self, writer, spawn=None):
+		self.writer = writer
+		self.spawn = spawn or pexpect.spawn
+
+	def __call__(self, command, timeout=30, **kwargs):
+		child = self.spawn(command, timeout=timeout, **kwargs)
+		return RecordingChild(child, self.writer, command)
+
+
+def load_transcript(path):
+	"""Reads a transcript file into a list of sessions.
+
+	Returns:
+			List of dictionaries with the spawn command, the output segments as
+			[sent line or None, output bytes, seconds], eof and exit status
+	"""
+	sessions = {}
+	with _open(path, 'r') as f:
+		for line in f:
+			event = json.loads(line)
+			if 'spawn' in event:
+				sessions[event['s']] = {'command': event['spawn'], 'segments': [[None, b'', 0.0]],
+										'eof': False, 'exit': None, 'sent_at': 0.0}
+				continue
+			session = sessions[event['s']]
+			if 'send' in event:
+				session['segments'].append([event['send'], b'', 0.0])
+				session['sent_at'] = event['t']
+			elif 'recv' in event:
+				segment = session['segments'][-1]
+				segment[1] += _to_bytes(event['recv'])
+				segment[2] = event['t'] - session['sent_at']
+			elif 'eof' in event:
+				session['eof'] = True
+			elif 'exit' in event:
+				session['exit'] = event['exit']
+	return [sessions[i] for i in sorted(sessions)]
+
+
+def _compile(pattern):
+	if isinstance(pattern, str):
+		pattern = pattern.encode('utf-8')
+	if isinstance(pattern, bytes):
+		return re.compile(pattern, re.DOTALL)
+	return pattern
+
+
+class ReplayChild:
+	"""Serves a recorded session in place of a pexpect child.
+
+	Each sendline releases the output that followed it in the recording, and
+	expect runs the real patterns against that output, so the code under test
+	does not have to expect in exactly the same steps as when it was recorded.
+
+	Args:
+			session: one session from load_transcript
+			timeout: pexpect timeout, kept for code that reads or sets it
+			strict: raise ReplayError if a different line is sent than was recorded,
+					any line is accepted where the recording is REDACTED
+			speed: replay the recorded output delays divided by this, None for no delay
+	"""
+
+	def __init__(self, session, timeout=30, strict=True, speed=None):
+		self.command = session['command']
+		self.timeout = timeout
+		self.strict = strict
+		self.speed = speed
+		self.before = None
+		self.after = None
+		self.match = None
+		self.exitstatus = session['exit']
+		self.signalstatus = None
+		self._segments = session['segments']
+		self._eof = session['eof']
+		self._next = 1
+		self._buffer = b''
+		self._closed = False
+		self._release(self._segments[0])
+
+	def _release(self, segment):
+		if self.speed:
+			time.sleep(segment[2] / self.speed)
+		self._buffer += segment[1]
+
+	def sendline(self, line=''):
+		if self._next >= len(self._segments):
+			raise ReplayError('Nothing recorded after ' + repr(line) + ' for ' + self.command)
+		segment = self._segments[self._next]
+		if self.strict and segment[0] != line and segment[0] != REDACTED:
+			raise ReplayError('Sent ' + repr(line) + ' but the recording sent ' + repr(segment[0]))
+		self._next += 1
+		self._release(segment)
+		return len(line) + 1
+
+	def expect(self, pattern, timeout=-1, **kwargs):
+		patterns = pattern if isinstance(pattern, list) else [pattern]
+		best = None
+		for i, p in enumerate(patterns):
+			if p is pexpect.EOF or p is pexpect.TIMEOUT:
+				continue
+			m = _compile(p).search(self._buffer)
+			if m is not None and (best is None or m.start() < best[1].start()):
+				best = (i, m)
+		if best is not None:
+			index, m = best
+			self.before = self._buffer[:m.start()]
+			self.after = m.group(0)
+			self.match = m
+			self._buffer = self._buffer[m.end():]
+			return index
+		# Nothing matches the output that is left: the recording ended in EOF or
+		# the real device would have timed out
+		ending = pexpect.EOF if self._eof and self._next >= len(self._segments) else pexpect.TIMEOUT
+		self.before = self._buffer
+		if ending in patterns:
+			self.after = ending
+			self._buffer = b''
+			return patterns.index(ending)
+		raise ending('No recorded output matches ' + repr(pattern))
+
+	def isalive(self):
+		return not self._closed and not (self._eof and self._next >= len(self._segments))
+
+	def close(self, force=True):
+		self._closed = True
+
+
+class ReplaySpawn:
+	"""Drop-in for pexpect.spawn that serves the sessions of a transcript file.
+
+	A spawn takes the first unused recorded session started with the same
+	command, so the same transcript can drive SSH, Image and SessionPool.
+
+	Args:
+			path: transcript file written by RecordingSpawn
+			strict: raise ReplayError if a different line is sent than was recorded
+			speed: replay the recorded delays divided by this, None to replay at full speed
+
+	ex.
+			ssh = SSH(IP, user, passwd, root_passwd, prompt, spawn=ReplaySpawn('lab.jsonl.gz'))
+			ssh.get_gnss()
+	"""
+
+	def __init__(self, path, strict=True, speed=None):
+		self.sessions = load_transcript(path)
+		self.strict = strict
+		self.speed = speed
+		self._used = set()
+		self._lock = threading.Lock()
+
+	def __call__(self, command, timeout=30, **kwargs):
+		with self._lock:
+			for i, session in enumerate(self.sessions):
+				if i not in self._used and session['command'] == command:
+					self._used.add(i)
+					break
+			else:
+				raise ReplayError('No recorded session for ' + command)
+		return ReplayChild(session, timeout, self.strict, self.speed)
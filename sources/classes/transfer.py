@@ -0,0 +1,204 @@
+import concurrent.futures
+import hashlib
+import json
+import logging
+import os
+import shlex
+import time
+import pexpect
+from classes.session_pool import SSH_OPTIONS
+
+__author__ = 'Andy Nguyen'
+
+
+class TransferReport:
+	"""Bytes moved, time taken and throughput of one download."""
+
+	def __init__(self, path, size):
+		self.path = path
+		self.size = size
+		self.downloaded = 0
+		self.resumed = 0
+		self.retries = 0
+		self.sha256 = None
+		self.elapsed = 0.0
+
+	@property
+	def rate(self):
+		"""Bytes per second actually downloaded."""
+		return self.downloaded / self.elapsed if self.elapsed else 0.0
+
+	def __repr__(self):
+		return ('TransferReport(' + os.path.basename(self.path) + ', ' + str(self.downloaded) + '/' +
+				str(self.size) + ' bytes, ' + str(round(self.rate / 1e6, 2)) + ' MB/s, resumed ' +
+				str(self.resumed) + ')')
+
+
+def split_ranges(size, streams):
+	"""Splits size bytes into at most streams (offset, length) ranges."""
+	if size <= 0:
+		return []
+	streams = max(1, min(streams, size))
+	step = -(-size // streams)
+	return [(offset, min(step, size - offset)) for offset in range(0, size, step)]
+
+
+class RangedTransfer:
+	"""Downloads a file from a host over several parallel ssh streams.
+
+	Every stream copies one byte range of the remote file with tail and head
+	into its own part file. Part files survive a dropped link, and the next
+	download() only fetches what each part is missing. The parts are joined
+	and hashed in one pass, and the file is only moved into place if the
+	SHA-256 matches (the expected one, or sha256sum run on the host).
+
+	Args:
+			host: IP or hostname of the build server
+			user: login user
+			passwd: login password
+			streams: number of parallel ranged streams
+			timeout: seconds one stream may take
+			retries: attempts per range after a failure, each resumes the part
+			spawn: function used instead of pexpect.spawn
+
+	ex.
+			transfer = RangedTransfer(build_ip, user, passwd, streams=4)
+			report = transfer.download('/builds/2021_09_09_sdk/SyncServer6x0_v5.1.2.bin', 'SyncServer6x0_v5.1.2.bin')
+	"""
+
+	def __init__(self, host, user, passwd, streams=4, timeout=1800, retries=3, spawn=None):
+		self.host = host
+		self.user = user
+		self.passwd = passwd
+		self.streams = streams
+		self.timeout = timeout
+		self.retries = retries
+		self.spawn = spawn or pexpect.spawn
+
+	def _ssh(self, remote_cmd, output=None):
+		"""Runs a command on the host and returns its output, or appends it to output.
+
+		Raises:
+				IOError: If ssh or the command fails
+		"""
+		cmd = 'ssh' + SSH_OPTIONS + ' ' + self.user + '@' + self.host + ' ' + shlex.quote(remote_cmd)
+		if output is not None:
+			cmd = '/bin/bash -c ' + shlex.quote(cmd + ' >> ' + shlex.quote(output))
+		child = self.spawn(cmd, timeout=self.timeout)
+		try:
+			if child.expect(['(?i)Password', pexpect.EOF]) == 0:
+				child.sendline(self.passwd)
+				child.expect(pexpect.EOF)
+			text = (child.before or b'').decode('utf-8', 'replace')
+		finally:
+			# Also stops an ssh that timed out, so it can not keep writing to output
+			child.close(force=True)
+		if child.exitstatus != 0:
+			raise IOError(remote_cmd + ' on ' + self.host + ' failed with exit status ' + str(child.exitstatus))
+		return text
+
+	def remote_size(self, remote_path):
+		return int(self._ssh('stat -c %s ' + shlex.quote(remote_path)).split()[-1])
+
+	def remote_sha256(self, remote_path):
+		return self._ssh('sha256sum ' + shlex.quote(remote_path)).split()[-2]
+
+	def _fetch_range(self, remote_path, part, offset, length, report):
+		attempts = 0
+		while True:
+			have = os.path.getsize(part) if os.path.exists(part) else 0
+			if have > length:
+				# Left over from a different split, start the part again
+				os.remove(part)
+				have = 0
+			if have == length:
+				return
+			try:
+				self._ssh('tail -c +' + str(offset + have + 1) + ' ' + shlex.quote(remote_path) +
+						  ' | head -c ' + str(length - have), output=part)
+				if os.path.getsize(part) != length:
+					raise IOError(part + ' is short after the transfer')
+				return
+			except (IOError, pexpect.TIMEOUT) as e:
+				# Drop whatever the failed attempt appended, the retry starts from have
+				with open(part, 'ab') as f:
+					f.truncate(have)
+				attempts += 1
+				if attempts > self.retries:
+					raise
+				report.retries += 1
+				logging.warning('Resuming ' + part + ' after ' + repr(e))
+
+	def _manifest(self, dest, size):
+		"""Loads the ranges of an earlier attempt at the same file, or plans new ones."""
+		path = dest + '.parts.json'
+		try:
+			with open(path) as f:
+				manifest = json.load(f)
+			if manifest['size'] == size:
+				return [tuple(r) for r in manifest['ranges']]
+		except (IOError, ValueError, KeyError):
+			pass
+		ranges = split_ranges(size, self.streams)
+		with open(path, 'w') as f:
+			json.dump({'size': size, 'ranges': ranges}, f)
+		return ranges
+
+	def download(self, remote_path, dest, size=None, expected_sha256=None, verify=True):
+		"""Downloads remote_path to dest, resuming any parts left by an earlier attempt.
+
+		Args:
+				remote_path: path of the file on the host
+				dest: local path to write
+				size: size of the remote file if known, otherwise asked with stat
+				expected_sha256: hex digest the file must have
+				verify: if no expected_sha256 is given, compare with sha256sum on the host
+
+		Returns:
+				TransferReport
+
+		Raises:
+				IOError: If a range can not be fetched or the hash does not match
+		"""
+		start = time.monotonic()
+		if size is None:
+			size = self.remote_size(remote_path)
+		report = TransferReport(dest, size)
+		ranges = self._manifest(dest, size)
+		parts = [dest + '.part' + str(i) for i in range(len(ranges))]
+		report.resumed = sum(min(os.path.getsize(p), length) for p, (_, length) in zip(parts, ranges)
+							 if os.path.exists(p))
+		with concurrent.futures.ThreadPoolExecutor(max_workers=len(ranges) + 1) as executor:
+			remote_hash = None
+			if expected_sha256 is None and verify:
+				# Hashed on the host while the ranges are downloading
+				remote_hash = executor.submit(self.remote_sha256, remote_path)
+			futures = [executor.submit(self._fetch_range, remote_path, part, offset, length, report)
+					   for part, (offset, length) in zip(parts, ranges)]
+			for future in futures:
+				future.result()
+			if remote_hash is not None:
+				expected_sha256 = remote_hash.result()
+		digest = hashlib.sha256()
+		tmp = dest + '.joining'
+		with open(tmp, 'wb') as out:
+			for part in parts:
+				with open(part, 'rb') as f:
+					for block in iter(lambda: f.read(1024 * 1024), b''):
+						digest.update(block)
+						out.write(block)
+		report.sha256 = digest.hexdigest()
+		report.downloaded = size - report.resumed
+		if expected_sha256 is not None and report.sha256 != expected_sha256.lower():
+			os.remove(tmp)
+			for part in parts:
+				os.remove(part)
+			raise IOError(os.path.basename(dest) + ' checksum mismatch. Expected ' + expected_sha256 +
+						  ', got ' + report.sha256)
+		os.replace(tmp, dest)
+		for part in parts:
+			os.remove(part)
+		os.remove(dest + '.parts.json')
+		report.elapsed = time.monotonic() - start
+		logging.info(str(report))
+		return report
@@ -0,0 +1,288 @@
+import contextlib
+import logging
+import random
+import threading
+import time
+import requests
+import urllib3
+
+__author__ = 'Andy Nguyen'
+
+
+class TargetError(Exception):
+	"""Base class for errors talking to a K2.
+
+	Args:
+			device: IP of the K2
+			endpoint: API endpoint the request was for
+			message: description of the error
+	"""
+
+	def __init__(self, device, endpoint, message):
+		super().__init__(str(device) + ' ' + str(endpoint) + ': ' + message)
+		self.device = device
+		self.endpoint = endpoint
+
+
+class TargetHTTPError(TargetError):
+	"""The K2 answered with an HTTP error status."""
+
+	def __init__(self, device, endpoint, status_code, message):
+		super().__init__(device, endpoint, message)
+		self.status_code = status_code
+
+
+class TargetConnectionError(TargetError):
+	"""The K2 could not be reached or did not answer in time."""
+
+
+class CircuitOpenError(TargetError):
+	"""The circuit breaker for the K2 is open, so the request was not sent."""
+
+
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS')
+
+_deadline = threading.local()
+
+
+@contextlib.contextmanager
+def deadline(seconds):
+	"""Limits how long the requests sent from this thread may take, retries included.
+
+	Every request inside the block has its timeout cut to the time left, and no
+	retry is started that could not finish in time. Nested deadlines keep the
+	earliest one.
+
+	Args:
+			seconds: time allowed from now, None for no limit
+	"""
+	previous = getattr(_deadline, 'at', None)
+	at = time.monotonic() + seconds if seconds is not None else None
+	if previous is not None and (at is None or previous < at):
+		at = previous
+	_deadline.at = at
+	try:
+		yield
+	finally:
+		_deadline.at = previous
+
+
+def _time_left():
+	at = getattr(_deadline, 'at', None)
+	return at - time.monotonic() if at is not None else None
+
+
+def _cap_timeout(timeout, left):
+	if timeout is None:
+		return left
+	if isinstance(timeout, tuple):
+		return tuple(left if t is None else min(t, left) for t in timeout)
+	return min(timeout, left)
+
+
+class RetryPolicy:
+	"""Bounded retries with exponential backoff and jitter.
+
+	Idempotent requests are retried on connection errors, timeouts and the
+	retry_statuses. POSTs are only retried when the connection could not be
+	made, since the K2 may already have acted on one that timed out.
+
+	Args:
+			retries: number of retries after the first attempt
+			backoff: seconds to wait before the first retry, doubled every retry
+			maximum: largest wait between retries
+			jitter: randomise each wait between half and all of it
+			retry_statuses: HTTP status codes worth retrying
+	"""
+
+	def __init__(self, retries=3, backoff=0.5, maximum=10, jitter=True,
+				 retry_statuses=(429, 500, 502, 503, 504)):
+		self.retries = retries
+		self.backoff = backoff
+		self.maximum = maximum
+		self.jitter = jitter
+		self.retry_statuses = retry_statuses
+
+	def delay(self, attempt):
+		delay = min(self.maximum, self.backoff * (2 ** attempt))
+		if self.jitter:
+			delay = delay / 2 + random.uniform(0, delay / 2)
+		return delay
+
+	def should_retry(self, method, error=None, status_code=None):
+		if status_code is not None:
+			return method in IDEMPOTENT_METHODS and status_code in self.retry_statuses
+		if isinstance(error, requests.exceptions.ConnectTimeout):
+			return True
+		if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+			return method in IDEMPOTENT_METHODS or _never_connected(error)
+		return False
+
+
+def _never_connected(error):
+	"""True if the request failed while opening the connection, so nothing was sent."""
+	seen = set()
+	while error is not None and id(error) not in seen:
+		seen.add(id(error))
+		if isinstance(error, urllib3.exceptions.NewConnectionError):
+			return True
+		reason = getattr(error, 'reason', None)
+		if reason is None and error.args and isinstance(error.args[0], BaseException):
+			reason = error.args[0]
+		error = reason if isinstance(reason, BaseException) else error.__cause__
+	return False
+
+
+class CircuitBreaker:
+	"""Stops sending requests to a device after repeated failures.
+
+	After `threshold` failures in a row the breaker opens and requests fail
+	straight away with CircuitOpenError. Once `reset_timeout` seconds have passed
+	one trial request is let through; success closes the breaker again.
+
+	Args:
+			threshold: failures in a row that open the breaker
+			reset_timeout: seconds before a trial request is allowed
+	"""
+
+	def __init__(self, threshold=5, reset_timeout=60, clock=time.monotonic):
+		self.threshold = threshold
+		self.reset_timeout = reset_timeout
+		self.clock = clock
+		self.failures = 0
+		self.opened_at = None
+		self._lock = threading.Lock()
+
+	@property
+	def state(self):
+		if self.opened_at is None:
+			return 'closed'
+		if self.clock() - self.opened_at >= self.reset_timeout:
+			return 'half-open'
+		return 'open'
+
+	def allow(self):
+		with self._lock:
+			if self.state == 'open':
+				return False
+			if self.state == 'half-open':
+				# Let one trial request through and hold the rest until it finishes
+				self.opened_at = self.clock()
+			return True
+
+	def record_success(self):
+		with self._lock:
+			self.failures = 0
+			self.opened_at = None
+
+	def record_failure(self):
+		with self._lock:
+			self.failures += 1
+			if self.failures >= self.threshold:
+				self.opened_at = self.clock()
+
+
+class Transport:
+	"""Sends a Target's requests with retries, a circuit breaker and typed errors.
+
+	Args:
+			policy: RetryPolicy, defaults to RetryPolicy()
+			breaker: CircuitBreaker for this device, defaults to CircuitBreaker()
+			timeout: seconds to wait for the K2 to answer
+			sleep: function used to wait between retries
+			metrics: optional Metrics that every request is recorded in
+	"""
+
+	def __init__(self, policy=None, breaker=None, timeout=30, sleep=time.sleep, metrics=None):
+		self.policy = policy or RetryPolicy()
+		self.breaker = breaker or CircuitBreaker()
+		self.timeout = timeout
+		self.sleep = sleep
+		self.metrics = metrics
+
+	def request(self, session, method, url, device=None, endpoint=None, retry=True,
+				use_breaker=True, **kwargs):
+		"""Sends one request.
+
+		Args:
+				session: requests.Session to send it on
+				method: HTTP method ex. GET
+				url: full URL
+				device: IP used in errors and logs
+				endpoint: API endpoint used in errors and logs
+				retry: retry the request according to the policy
+				use_breaker: check and update the circuit breaker
+				**kwargs: passed to session.request
+
+		Returns:
+				The successful requests.Response
+
+		Raises:
+				CircuitOpenError: If the breaker for the device is open
+				TargetHTTPError: If the K2 answered with an error status
+				TargetConnectionError: If the K2 could not be reached
+		"""
+		kwargs.setdefault('verify', False)
+		kwargs.setdefault('timeout', self.timeout)
+		timeout = kwargs['timeout']
+		start = time.monotonic()
+		if use_breaker and not self.breaker.allow():
+			self._record(device, method, endpoint, 'circuit_open', start, kwargs, None, 0)
+			raise CircuitOpenError(device, endpoint, 'circuit breaker is open after ' +
+								   str(self.breaker.failures) + ' failures')
+		attempt = 0
+		while True:
+			response = None
+			left = _time_left()
+			if left is not None:
+				if left <= 0:
+					self._record(device, method, endpoint, 'error', start, kwargs, None, attempt)
+					raise TargetConnectionError(device, endpoint, 'deadline passed before the request was sent')
+				kwargs['timeout'] = _cap_timeout(timeout, left)
+			try:
+				response = session.request(method, url, **kwargs)
+			except requests.exceptions.RequestException as e:
+				error = TargetConnectionError(device, endpoint, str(e))
+				retryable = self.policy.should_retry(method, error=e)
+				error.__cause__ = e
+			else:
+				if response.status_code < 400:
+					if use_breaker:
+						self.breaker.record_success()
+					self._record(device, method, endpoint, response.status_code, start, kwargs,
+								 response, attempt)
+					return response
+				error = TargetHTTPError(device, endpoint, response.status_code,
+										str(response.status_code) + ' ' + str(response.reason))
+				retryable = self.policy.should_retry(method, status_code=response.status_code)
+			delay = self.policy.delay(attempt)
+			left = _time_left()
+			if (not retry or not retryable or attempt >= self.policy.retries or
+					(left is not None and delay >= left)):
+				if use_breaker:
+					# A K2 answering with a 4xx is up, only count it being unreachable or failing
+					if isinstance(error, TargetHTTPError) and error.status_code < 500:
+						self.breaker.record_success()
+					else:
+						self.breaker.record_failure()
+				status = response.status_code if response is not None else 'error'
+				self._record(device, method, endpoint, status, start, kwargs, response, attempt)
+				raise error
+			logging.warning(str(error) + '. Retrying in ' + str(round(delay, 2)) + ' seconds.')
+			attempt += 1
+			self.sleep(delay)
+
+	def _record(self, device, method, endpoint, status, start, kwargs, response, retries):
+		if self.metrics is None:
+			return
+		body = kwargs.get('data')
+		try:
+			bytes_sent = len(body) if body is not None else 0
+		except TypeError:
+			bytes_sent = 0
+		bytes_received = 0
+		if response is not None:
+			length = response.headers.get('Content-Length')
+			bytes_received = int(length) if length is not None else len(response.content)
+		self.metrics.record(device, method, endpoint, status, time.monotonic() - start,
+							bytes_sent, bytes_received, retries)
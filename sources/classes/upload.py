@@ -0,0 +1,226 @@
+import hashlib
+import logging
+import mmap
+import os
+import threading
+import time
+import uuid
+from classes.fleet import Fleet
+
+__author__ = 'Andy Nguyen'
+
+
+class SharedImage:
+	"""Read-only memory map of a firmware file that any number of uploads can share.
+
+	The file is mapped once and every upload reads zero-copy slices of it, so
+	upgrading many units at once does not read or buffer the image once per unit.
+
+	Args:
+			path: path to the .bin or _auth.dat file
+			expected_sha256: hex digest the file must have, checked when it is opened
+
+	Raises:
+			ValueError: If expected_sha256 is given and does not match the file
+	"""
+
+	def __init__(self, path, expected_sha256=None):
+		self.path = path
+		self.name = os.path.basename(path)
+		self._file = open(path, 'rb')
+		self.size = os.fstat(self._file.fileno()).st_size
+		if self.size:
+			self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+			self.view = memoryview(self._map)
+		else:
+			self._map = None
+			self.view = memoryview(b'')
+		self._sha256 = None
+		self._lock = threading.Lock()
+		if expected_sha256 is not None:
+			try:
+				self.verify(expected_sha256)
+			except ValueError:
+				self.close()
+				raise
+
+	def sha256(self):
+		"""Returns the hex SHA-256 of the file. Only computed once."""
+		with self._lock:
+			if self._sha256 is None:
+				self._sha256 = hashlib.sha256(self.view).hexdigest()
+			return self._sha256
+
+	def verify(self, expected_sha256):
+		actual = self.sha256()
+		if actual != expected_sha256.lower():
+			raise ValueError(self.name + ' checksum mismatch. Expected ' +
+							 expected_sha256 + ', got ' + actual)
+		return True
+
+	def close(self):
+		self.view.release()
+		if self._map is not None:
+			self._map.close()
+		self._file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+
+class UploadProgress:
+	"""Bytes sent and throughput of one upload."""
+
+	def __init__(self, device, total):
+		self.device = device
+		self.total = total
+		self.sent = 0
+		self.start = None
+		self.end = None
+
+	@property
+	def elapsed(self):
+		if self.start is None:
+			return 0.0
+		return (self.end or time.monotonic()) - self.start
+
+	@property
+	def rate(self):
+		"""Bytes per second so far."""
+		elapsed = self.elapsed
+		return self.sent / elapsed if elapsed else 0.0
+
+	@property
+	def done(self):
+		return self.sent == self.total
+
+	def __repr__(self):
+		return 'UploadProgress(' + str(self.device) + ', ' + str(self.sent) + '/' + \
+			str(self.total) + ' bytes, ' + str(round(self.rate / 1e6, 2)) + ' MB/s)'
+
+
+class MultipartUpload:
+	"""File-like multipart/form-data body that streams SharedImages.
+
+	requests sends it in blocks through read(), and __len__ gives it a
+	Content-Length. The body is laid out like requests' own files= encoding:
+	the plain form fields first, then one part per file.
+
+	Args:
+			fields: list of (name, value) form fields
+			files: list of (name, SharedImage)
+			device: label used in the progress and log messages
+			callback: optional function(progress) called after every block
+			throttle: optional object with a consume(nbytes) method that blocks to limit bandwidth
+	"""
+
+	def __init__(self, fields, files, device=None, callback=None, throttle=None):
+		self.boundary = uuid.uuid4().hex
+		self.content_type = 'multipart/form-data; boundary=' + self.boundary
+		self.callback = callback
+		self.throttle = throttle
+		self._segments = []
+		for name, value in fields:
+			self._segments.append(self._header(name) + str(value).encode('utf-8') + b'\r\n')
+		for name, image in files:
+			self._segments.append(self._header(name, image.name))
+			self._segments.append(image.view)
+			self._segments.append(b'\r\n')
+		self._segments.append(('--' + self.boundary + '--\r\n').encode('ascii'))
+		self.progress = UploadProgress(device, sum(len(s) for s in self._segments))
+		self._index = 0
+		self._offset = 0
+
+	def _header(self, name, filename=None):
+		disposition = 'Content-Disposition: form-data; name="' + name + '"'
+		if filename is None:
+			return ('--' + self.boundary + '\r\n' + disposition + '\r\n\r\n').encode('utf-8')
+		return ('--' + self.boundary + '\r\n' + disposition + '; filename="' + filename +
+				'"\r\nContent-Type: application/octet-stream\r\n\r\n').encode('utf-8')
+
+	def __len__(self):
+		return self.progress.total
+
+	def read(self, size=-1):
+		if self.progress.start is None:
+			self.progress.start = time.monotonic()
+		if size is None or size < 0:
+			size = self.progress.total - self.progress.sent
+		out = []
+		remaining = size
+		while remaining > 0 and self._index < len(self._segments):
+			segment = self._segments[self._index]
+			chunk = segment[self._offset:self._offset + remaining]
+			out.append(bytes(chunk))
+			remaining -= len(chunk)
+			self._offset += len(chunk)
+			if self._offset >= len(segment):
+				self._index += 1
+				self._offset = 0
+		data = b''.join(out)
+		if data:
+			if self.throttle is not None:
+				self.throttle.consume(len(data))
+			self.progress.sent += len(data)
+			if self.progress.done:
+				self.progress.end = time.monotonic()
+			if self.callback is not None:
+				self.callback(self.progress)
+		return data
+
+
+class TokenBucket:
+	"""Bandwidth limit shared by any number of uploads, passed to them as throttle.
+
+	consume() takes bytes from the bucket, which refills at rate bytes per
+	second up to burst bytes, and sleeps while the bucket is in debt.
+
+	Args:
+			rate: bytes per second
+			burst: most bytes sent at full speed after an idle period, defaults to one second worth
+	"""
+
+	def __init__(self, rate, burst=None, clock=time.monotonic, sleep=time.sleep):
+		self.rate = float(rate)
+		self.burst = float(burst if burst is not None else rate)
+		self.clock = clock
+		self.sleep = sleep
+		self._tokens = self.burst
+		self._last = clock()
+		self._lock = threading.Lock()
+
+	def consume(self, nbytes):
+		with self._lock:
+			now = self.clock()
+			self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+			self._last = now
+			self._tokens -= nbytes
+			wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+		if wait:
+			self.sleep(wait)
+
+
+def upload_to_all(targets, image_path, auth_path, concurrency=8, expected_sha256=None,
+				  callback=None, throttle=None):
+	"""Uploads one firmware image to many Targets, mapping the files only once.
+
+	Args:
+			targets: list of Target
+			image_path: path to the .bin upgrade file
+			auth_path: path to the _auth.dat file
+			concurrency: number of uploads running at once
+			expected_sha256: hex digest the .bin must have
+			callback: optional function(progress) called as each upload advances
+			throttle: optional TokenBucket shared by all the uploads
+
+	Returns:
+			Dictionary of IP to FleetResult whose value is the UploadProgress
+	"""
+	with SharedImage(auth_path) as auth, SharedImage(image_path, expected_sha256) as image:
+		logging.info('Uploading ' + image.name + ' (' + str(image.size) + ' bytes, sha256 ' +
+					 image.sha256() + ') to ' + str(len(targets)) + ' targets.')
+		return Fleet(targets, concurrency=concurrency).call(
+			'upload_firmware', auth, image, callback=callback, throttle=throttle)
@@ -0,0 +1,51 @@
+import re
+import pexpect
+
+
+class FakeShell:
+	"""Stands in for a pexpect child of a shell session.
+
+	Every sent line is answered with reply(line), and expect() searches the
+	output not consumed yet for the earliest match, like pexpect does.
+	Subclasses override reply() to play a device or a build server.
+
+	Args:
+			data: output waiting before anything is sent
+			timeout: pexpect timeout, kept for code that reads or sets it
+	"""
+
+	# Raised when no pattern matches the rest of the output
+	no_match = pexpect.TIMEOUT
+
+	def __init__(self, data='', timeout=30):
+		self.data = data.encode('utf-8')
+		self.timeout = timeout
+		self.sent = []
+		self.before = None
+		self.after = None
+		self.exitstatus = None
+
+	def reply(self, line):
+		return ''
+
+	def sendline(self, line=''):
+		self.sent.append(line)
+		self.data += self.reply(line).encode('utf-8')
+
+	def expect(self, pattern, timeout=-1):
+		patterns = pattern if isinstance(pattern, list) else [pattern]
+		best = None
+		for i, p in enumerate(patterns):
+			m = re.search(p.encode('utf-8'), self.data)
+			if m is not None and (best is None or m.start() < best[1].start()):
+				best = (i, m)
+		if best is None:
+			raise self.no_match('no match')
+		index, m = best
+		self.before = self.data[:m.start()]
+		self.after = m.group(0)
+		self.data = self.data[m.end():]
+		return index
+
+	def close(self):
+		self.exitstatus = 0
@@ -0,0 +1,33 @@
+from classes.alarms import AlarmWatcher
+
+HEADER = """|ID |Severity|Time               |Description              |
+|---|--------|-------------------|-------------------------|"""
+
+
+def table(*rows):
+	lines = HEADER.splitlines()
+	for event_id, severity, desc in rows:
+		lines.append('|' + str(event_id) + '|' + severity + '|2021-09-09 04:14:35|' + desc + '|')
+	return lines
+
+
+def test_raised_and_cleared_between_polls():
+	watcher = AlarmWatcher()
+	raised, cleared = watcher.update(table((175, 'MINOR', 'No power on AC2'),
+										   (176, 'MAJOR', 'GNSS antenna open')))
+	assert [a['eventId'] for a in raised] == [175, 176]
+	assert cleared == []
+	raised, cleared = watcher.update(table((176, 'MAJOR', 'GNSS antenna open'),
+										   (180, 'NOTIFY', 'Login')))
+	assert [a['eventId'] for a in raised] == [180]
+	assert [a['eventId'] for a in cleared] == [175]
+	assert watcher.update(table((176, 'MAJOR', 'x'), (180, 'NOTIFY', 'Login'))) == ([], [])
+
+
+def test_severity_index():
+	watcher = AlarmWatcher()
+	watcher.update(table((1, 'MAJOR', 'a'), (2, 'MAJOR', 'b'), (3, 'MINOR', 'c')))
+	assert sorted(a['eventId'] for a in watcher.alarms_with('MAJOR')) == [1, 2]
+	assert watcher.counts() == {'MAJOR': 2, 'MINOR': 1, 'NOTIFY': 0}
+	watcher.update(table((3, 'MINOR', 'c')))
+	assert watcher.counts() == {'MAJOR': 0, 'MINOR': 1, 'NOTIFY': 0}
@@ -0,0 +1,91 @@
+import hashlib
+import os
+import threading
+import pytest
+from classes.artifact_cache import ArtifactCache
+
+
+def downloader(content, calls):
+	def download(directory, name='SyncServer6x0_v5.1.2.bin'):
+		calls.append(directory)
+		with open(os.path.join(directory, name), 'wb') as f:
+			f.write(content)
+	return download
+
+
+def test_fetch_downloads_once(tmp_path):
+	cache = ArtifactCache(str(tmp_path))
+	calls = []
+	first = cache.fetch('5.1.2', 'SyncServer6x0_v5.1.2.bin', downloader(b'image', calls))
+	again = cache.fetch('5.1.2', 'SyncServer6x0_v5.1.2.bin', downloader(b'image', calls))
+	assert first == again and len(calls) == 1
+	assert os.path.basename(first) == 'SyncServer6x0_v5.1.2.bin'
+	assert hashlib.sha256(b'image').hexdigest() in first
+	assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_concurrent_fetches_share_one_download(tmp_path):
+	cache = ArtifactCache(str(tmp_path))
+	calls = []
+	paths = []
+	threads = [threading.Thread(target=lambda: paths.append(
+		cache.fetch('5.1.2', 'SyncServer6x0_v5.1.2.bin', downloader(b'image', calls)))) for _ in range(8)]
+	for t in threads:
+		t.start()
+	for t in threads:
+		t.join()
+	assert len(calls) == 1 and len(set(paths)) == 1
+
+
+def test_checksum_mismatch_is_not_cached(tmp_path):
+	cache = ArtifactCache(str(tmp_path))
+	with pytest.raises(ValueError):
+		cache.fetch('5.1.2', 'SyncServer6x0_v5.1.2.bin', downloader(b'image', []), expected_sha256='00')
+	assert cache.get('5.1.2', 'SyncServer6x0_v5.1.2.bin') is None
+
+
+def test_lru_eviction_by_budget(tmp_path):
+	cache = ArtifactCache(str(tmp_path), budget=10)
+	for version in ('1', '2', '3'):
+		src = tmp_path / ('download-' + version)
+		src.write_bytes(version.encode() * 4)
+		cache.put(version, 'image.bin', str(src))
+		if version == '2':
+			cache.get('1', 'image.bin')
+	assert cache.get('2', 'image.bin') is None
+	assert cache.get('1', 'image.bin') is not None
+	assert cache.size() == 8
+
+
+def test_newest_entry_is_kept_over_budget(tmp_path):
+	cache = ArtifactCache(str(tmp_path), budget=4)
+	src = tmp_path / 'download'
+	src.write_bytes(b'12345678')
+	path = cache.put('1', 'image.bin', str(src))
+	assert os.path.exists(path)
+	assert cache.get('1', 'image.bin') == path
+
+
+def test_fetched_file_is_pinned_until_released(tmp_path):
+	cache = ArtifactCache(str(tmp_path), budget=10)
+	path = cache.fetch('1', 'SyncServer6x0_v5.1.2.bin', downloader(b'11111111', []), pin=True)
+	# Another build that does not fit next to the first one
+	cache.fetch('2', 'SyncServer6x0_v5.1.2.bin', downloader(b'22222222', []))
+	assert os.path.exists(path)
+	cache.release(path)
+	cache.evict()
+	assert not os.path.exists(path)
+	assert cache.get('2', 'SyncServer6x0_v5.1.2.bin') is not None
+
+
+def test_pin_holds_against_another_process(tmp_path):
+	# A second ArtifactCache on the same root shares nothing in memory, like another process
+	mine = ArtifactCache(str(tmp_path), budget=10)
+	other = ArtifactCache(str(tmp_path), budget=10)
+	path = mine.fetch('1', 'SyncServer6x0_v5.1.2.bin', downloader(b'11111111', []), pin=True)
+	# Over budget, but the other cache can not evict the pinned file
+	other.fetch('2', 'SyncServer6x0_v5.1.2.bin', downloader(b'22222222', []))
+	assert os.path.exists(path)
+	mine.release(path)
+	other.evict()
+	assert not os.path.exists(path)
@@ -0,0 +1,53 @@
+import json
+from classes.cache import ResponseCache
+
+
+class FakeClock:
+	def __init__(self):
+		self.now = 0.0
+
+	def __call__(self):
+		return self.now
+
+
+def test_hit_miss_and_expiry():
+	clock = FakeClock()
+	cache = ResponseCache(ttl=5, clock=clock)
+	assert cache.get('/timing') == (False, None)
+	cache.put('/timing', json.dumps({'timeRefPriority': []}))
+	assert cache.get('/timing') == (True, {'timeRefPriority': []})
+	clock.now = 6
+	assert cache.get('/timing') == (False, None)
+	assert cache.stats()['hits'] == 1
+	assert cache.stats()['misses'] == 2
+
+
+def test_returned_data_is_a_copy():
+	cache = ResponseCache()
+	cache.put('/gnss', json.dumps({'sbas': 'enabled'}))
+	_, data = cache.get('/gnss')
+	data['sbas'] = 'disabled'
+	assert cache.get('/gnss') == (True, {'sbas': 'enabled'})
+
+
+def test_write_invalidates_parents_and_children():
+	cache = ResponseCache()
+	for endpoint in ['/ntp/servers', '/ntp/servers/1', '/ntp/option', '/timing']:
+		cache.put(endpoint, '{}')
+	cache.invalidate('/ntp/servers/1')
+	assert not cache.get('/ntp/servers')[0]
+	assert not cache.get('/ntp/servers/1')[0]
+	assert cache.get('/ntp/option')[0]
+	cache.invalidate('/ntp')
+	assert not cache.get('/ntp/option')[0]
+	assert cache.get('/timing')[0]
+
+
+def test_per_endpoint_ttl():
+	clock = FakeClock()
+	cache = ResponseCache(ttl=5, ttls={'/system': 0, '/system/inventory': 60}, clock=clock)
+	cache.put('/system/state', '{}')
+	cache.put('/system/inventory', '{}')
+	clock.now = 30
+	assert not cache.get('/system/state')[0]
+	assert cache.get('/system/inventory')[0]
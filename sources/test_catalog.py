@@ -0,0 +1,65 @@
+import shlex
+from conftest import FakeShell
+from classes.catalog import BuildCatalog
+
+LISTINGS = {
+	'2021_09_08_sdk': {'SyncServer6x0_v5.1.1.bin': 100, '5.1.1.0_auth.dat': 10},
+	'2021_09_09_sdk': {'SyncServer6x0_v5.1.2.bin': 200, 'TimeProvider4100_v2.4.1.bin': 300,
+					   '5.1.2.0_auth.dat': 10, 'notes.txt': 5}
+}
+
+
+class ShellChild(FakeShell):
+	"""Fake build server shell answering cd, ls -1d and the per folder ls -l loop."""
+
+	def __init__(self, listings):
+		FakeShell.__init__(self)
+		self.listings = listings
+
+	def reply(self, line):
+		out = ''
+		if line.startswith('ls -1d'):
+			out = ''.join(f + '/\r\n' for f in sorted(self.listings))
+		elif line.startswith('for d in'):
+			for folder in shlex.split(line.split(';')[0])[3:]:
+				out += '== ' + folder + '\r\ntotal 8\r\n'
+				for name, size in self.listings[folder].items():
+					out += '-rw-r--r-- 1 build build ' + str(size) + ' Sep  9 04:14 ' + name + '\r\n'
+		return line + '\r\n' + out + 'build:'
+
+
+def test_latest_and_find(tmp_path):
+	catalog = BuildCatalog(str(tmp_path / 'builds.json'))
+	catalog.refresh(ShellChild(LISTINGS), 'build:', '/builds/')
+	k2 = catalog.latest('K2')
+	assert (k2.folder, k2.name, k2.version) == ('2021_09_09_sdk', 'SyncServer6x0_v5.1.2.bin', '5.1.2.0')
+	assert k2.sizes == {'SyncServer6x0_v5.1.2.bin': 200, '5.1.2.0_auth.dat': 10}
+	assert catalog.latest('tp4100').name == 'TimeProvider4100_v2.4.1.bin'
+	assert catalog.find('tp4100', '2.4.1').folder == '2021_09_09_sdk'
+	assert catalog.find('tp4100', '5.1.2') is None
+	assert catalog.find('K2', '5.1.1').folder == '2021_09_08_sdk'
+	assert catalog.find('K2', '4.0') is None
+	# The index is kept on disk
+	assert BuildCatalog(str(tmp_path / 'builds.json')).latest('K2').version == '5.1.2.0'
+
+
+def test_refresh_only_lists_new_folders():
+	catalog = BuildCatalog()
+	listings = dict(LISTINGS)
+	catalog.refresh(ShellChild(listings), 'build:', '/builds/')
+	listings['2021_09_10_sdk'] = {'SyncServer6x0_v5.1.3.bin': 100, '5.1.3.0_auth.dat': 10}
+	child = ShellChild(listings)
+	listed = catalog.refresh(child, 'build:', '/builds/')
+	# The newest known folder is listed again in case it was still being written
+	assert sorted(listed) == ['2021_09_09_sdk', '2021_09_10_sdk']
+	assert catalog.latest('K2').version == '5.1.3.0'
+	assert not catalog.stale()
+
+
+def test_folder_names_are_quoted():
+	catalog = BuildCatalog()
+	listings = {'2021_09_11_sdk (rc1)': {'SyncServer6x0_v5.1.4.bin': 100, '5.1.4.0_auth.dat': 10}}
+	child = ShellChild(listings)
+	catalog.refresh(child, 'build:', '/builds/')
+	assert "'2021_09_11_sdk (rc1)'" in child.sent[-1]
+	assert catalog.latest('K2').version == '5.1.4.0'
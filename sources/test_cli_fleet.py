@@ -0,0 +1,63 @@
+import time
+import pexpect
+from classes.cli_fleet import CliFleet
+
+
+class FakeChild:
+	def __init__(self):
+		self.timeout = 300
+
+
+class FakeSSH:
+	def __init__(self, IP, delay=0.0, output='', fail=False):
+		self.IP = IP
+		self.delay = delay
+		self.output = output
+		self.fail = fail
+		self.child = FakeChild()
+
+	def get_cmd_results(self, cmd, timeout=-1):
+		self.timeout_seen = self.child.timeout
+		time.sleep(self.delay)
+		if self.fail:
+			raise pexpect.TIMEOUT('no prompt from ' + self.IP)
+		return cmd + ' on ' + self.IP
+
+	def get_system(self):
+		return {'softwareVer': self.output}
+
+
+def test_results_stream_in_finish_order():
+	devices = [FakeSSH('10.0.0.1', delay=0.3), FakeSSH('10.0.0.2'), FakeSSH('10.0.0.3', delay=0.1)]
+	order = [r.device for r in CliFleet(devices, concurrency=3).stream('get_cmd_results', 'show clock')]
+	assert order == ['10.0.0.2', '10.0.0.3', '10.0.0.1']
+
+
+def test_commands_overlap_and_failures_are_per_device():
+	devices = [FakeSSH('10.0.0.' + str(i), delay=0.2) for i in range(8)]
+	devices.append(FakeSSH('10.0.0.99', fail=True))
+	start = time.monotonic()
+	results = CliFleet(devices, concurrency=8, timeout=5).command('show clock')
+	assert time.monotonic() - start < 1.0
+	assert list(results)[-1] == '10.0.0.99'
+	assert results['10.0.0.0'].value == 'show clock on 10.0.0.0'
+	assert isinstance(results['10.0.0.99'].error, pexpect.TIMEOUT)
+	assert all(d.timeout_seen == 5 for d in devices)
+	# The callers' sessions get their own timeout back
+	assert all(d.child.timeout == 300 for d in devices)
+
+
+def test_callable_parser():
+	devices = [FakeSSH('10.0.0.1', output='5.1.2')]
+	results = CliFleet(devices).call(lambda ssh: ssh.get_system()['softwareVer'])
+	assert results['10.0.0.1'].value == '5.1.2'
+
+
+def test_failed_login_is_a_per_device_error():
+	def spawn(command, timeout=30):
+		raise pexpect.EOF('Connection refused')
+	devices = [{'IP': '10.0.0.1', 'user': 'admin', 'passwd': 'pw', 'root_passwd': 'root',
+				'prompt': 'SyncServer:', 'spawn': spawn}, FakeSSH('10.0.0.2')]
+	results = CliFleet(devices).command('show clock')
+	assert isinstance(results['10.0.0.1'].error, ConnectionError)
+	assert results['10.0.0.2'].ok
@@ -0,0 +1,110 @@
+import asyncio
+import time
+from classes.async_target import AsyncTarget
+from classes.fleet import Fleet
+from classes.transport import Transport
+
+
+class FakeTarget:
+	def __init__(self, IP, delay=0.0, fail=False):
+		self.IP = IP
+		self.delay = delay
+		self.fail = fail
+
+	def get(self, endpoint):
+		time.sleep(self.delay)
+		if self.fail:
+			raise ConnectionError(self.IP + ' is down')
+		return {'endpoint': endpoint, 'IP': self.IP}
+
+
+class FakeAsyncTarget(FakeTarget):
+	async def get(self, endpoint):
+		await asyncio.sleep(self.delay)
+		if self.fail:
+			raise ConnectionError(self.IP + ' is down')
+		return {'endpoint': endpoint, 'IP': self.IP}
+
+
+def test_results_per_device():
+	targets = [FakeTarget('10.0.0.1'), FakeTarget('10.0.0.2', fail=True)]
+	results = Fleet(targets).call('get', '/system/state')
+	assert list(results) == ['10.0.0.1', '10.0.0.2']
+	assert results['10.0.0.1'].value == {'endpoint': '/system/state', 'IP': '10.0.0.1'}
+	assert not results['10.0.0.2'].ok
+	assert isinstance(results['10.0.0.2'].error, ConnectionError)
+
+
+def test_slow_device_does_not_stall_fleet():
+	targets = [FakeAsyncTarget('10.0.0.' + str(i)) for i in range(20)]
+	targets.append(FakeAsyncTarget('10.0.0.99', delay=5))
+	start = time.monotonic()
+	results = Fleet(targets, concurrency=4, timeout=0.2).call('get', '/gnss')
+	assert time.monotonic() - start < 2
+	assert sum(r.ok for r in results.values()) == 20
+	assert isinstance(results['10.0.0.99'].error, TimeoutError)
+
+
+def test_concurrency_limit():
+	targets = [FakeTarget('10.0.0.' + str(i), delay=0.1) for i in range(8)]
+	start = time.monotonic()
+	Fleet(targets, concurrency=8).call('get', '/timing')
+	assert time.monotonic() - start < 0.5
+
+
+def test_blocking_device_does_not_stall_fleet():
+	targets = [FakeTarget('10.0.0.' + str(i)) for i in range(8)]
+	targets.append(FakeTarget('10.0.0.99', delay=3))
+	start = time.monotonic()
+	results = Fleet(targets, concurrency=4, timeout=0.2).call('get', '/gnss')
+	assert time.monotonic() - start < 2
+	assert sum(r.ok for r in results.values()) == 8
+	assert isinstance(results['10.0.0.99'].error, TimeoutError)
+
+
+def test_blocking_requests_get_the_fleet_timeout():
+	class Session:
+		def request(self, method, url, **kwargs):
+			self.timeout = kwargs['timeout']
+			return FakeResponse()
+
+	class FakeResponse:
+		status_code = 200
+
+	class RestTarget:
+		IP = '10.0.0.1'
+
+		def __init__(self):
+			self.session = Session()
+			self.transport = Transport(timeout=30)
+
+		def get(self, endpoint):
+			return self.transport.request(self.session, 'GET', 'https://k2' + endpoint).status_code
+
+	target = RestTarget()
+	assert Fleet([target], timeout=0.5).call('get', '/gnss')['10.0.0.1'].value == 200
+	assert target.session.timeout <= 0.5
+
+
+def test_async_target_opens_one_session_for_concurrent_first_calls():
+	class SlowLoginTransport:
+		def __init__(self):
+			self.logins = 0
+			self.metrics = None
+
+		def request(self, session, method, url, **kwargs):
+			if method == 'POST':
+				self.logins += 1
+				time.sleep(0.05)
+
+			class Response:
+				text = '{}'
+			return Response()
+
+	transport = SlowLoginTransport()
+	target = AsyncTarget('10.0.0.1', 'v2', 'admin', 'admin', transport=transport)
+
+	async def main():
+		return await asyncio.gather(*[target.get('/gnss') for _ in range(8)])
+	assert asyncio.run(main()) == [{}] * 8
+	assert transport.logins == 1
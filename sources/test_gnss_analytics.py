@@ -0,0 +1,46 @@
+import math
+import pytest
+from classes import gnss_analytics
+from classes.gnss_analytics import SatelliteSamples, summarize, summarize_by_device, to_array, to_columns
+
+needs_numpy = pytest.mark.skipif(gnss_analytics.np is None, reason='numpy is not installed')
+
+
+def sat(sat_id, gnss_id, snr, elevation):
+	return {'satId': str(sat_id), 'gnssId': gnss_id, 'snr': str(snr),
+			'azimuthAngle': '120', 'elevationAngle': str(elevation), 'prRes': '0.5'}
+
+
+VIEW = [sat(1, 'GPS', 40, 60), sat(2, 'GPS', 30, 5), sat(3, 'GLONASS', 45, 30), sat(4, 'GPS', '', 20)]
+
+
+@needs_numpy
+def test_to_array_has_numeric_columns():
+	sats = to_array(VIEW)
+	assert sats['snr'].dtype == gnss_analytics.np.float32
+	assert list(sats['satId']) == [1, 2, 3, 4]
+	assert math.isnan(sats['snr'][3])
+
+
+def test_to_columns_without_numpy():
+	columns = to_columns(VIEW)
+	assert list(columns['elevationAngle']) == [60.0, 5.0, 30.0, 20.0]
+	assert columns['gnssId'][2] == 'GLONASS'
+
+
+@needs_numpy
+def test_summaries_over_devices_and_samples():
+	samples = SatelliteSamples()
+	samples.add('10.0.0.1', VIEW)
+	samples.add('10.0.0.1', VIEW[:2])
+	samples.add('10.0.0.2', to_array(VIEW[2:]))
+	sats = samples.to_array()
+	assert len(sats) == 8
+	summary = summarize(sats, min_elevation=10)
+	assert summary['used'] == 6
+	assert summary['constellations'] == {'GLONASS': 2, 'GPS': 4}
+	assert summary['satsPerSample'] == 2.0
+	assert summary['snrPercentiles'][50] == 42.5
+	by_device = summarize_by_device(sats, samples.devices)
+	assert by_device['10.0.0.1']['rows'] == 6
+	assert by_device['10.0.0.2']['constellations'] == {'GLONASS': 1, 'GPS': 1}
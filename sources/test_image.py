@@ -0,0 +1,60 @@
+import os
+import re
+import pexpect
+import pytest
+from classes.image import Image
+
+
+class ScpChild:
+	"""Fake scp: writes the requested files into the destination when it finishes."""
+
+	def __init__(self, command, files, exitstatus=0):
+		self.command = command
+		self.files = files
+		self.exitstatus = None
+		self._exitstatus = exitstatus
+
+	def expect(self, pattern, timeout=-1):
+		if pattern is pexpect.EOF:
+			dest = self.command.split()[-1]
+			for name, content in self.files.items():
+				with open(os.path.join(dest, name), 'wb') as f:
+					f.write(content)
+		return 0
+
+	def sendline(self, line=''):
+		pass
+
+	def close(self):
+		self.exitstatus = self._exitstatus
+
+
+def make_image(files, exitstatus=0):
+	spawned = []
+
+	def spawn(command):
+		spawned.append(ScpChild(command, files, exitstatus))
+		return spawned[-1]
+	image = Image('10.0.0.5', '/builds/', '10.0.0.2', 'build', 'pw', 'build:', 'K2', spawn=spawn)
+	return image, spawned
+
+
+def test_scp_waits_for_exit_and_checks_sizes(tmp_path):
+	image, spawned = make_image({'a.bin': b'12345', 'a_auth.dat': b'1'})
+	image.sizes = {'a.bin': 5, 'a_auth.dat': 1}
+	image._scp('2021_09_09_sdk', ['a.bin', 'a_auth.dat'], str(tmp_path))
+	assert re.search(r'/builds/2021_09_09_sdk/\{a.bin,a_auth.dat\} ', spawned[0].command)
+	assert image.timings['scp'] >= 0
+
+
+def test_scp_truncated_file_fails(tmp_path):
+	image, spawned = make_image({'a.bin': b'123'})
+	image.sizes = {'a.bin': 5}
+	with pytest.raises(IOError):
+		image._scp('2021_09_09_sdk', ['a.bin'], str(tmp_path))
+
+
+def test_scp_exit_status_fails(tmp_path):
+	image, spawned = make_image({'a.bin': b'12345'}, exitstatus=1)
+	with pytest.raises(IOError):
+		image._scp('2021_09_09_sdk', ['a.bin'], str(tmp_path))
@@ -0,0 +1,47 @@
+from classes import inventory
+from classes.inventory import collect_inventory, plan_upgrade, version_key
+from classes.models import Inventory
+
+
+class FakeTarget:
+	def __init__(self, IP, version, model='SyncServer S650', fail=False):
+		self.IP = IP
+		self.version = version
+		self.model = model
+		self.fail = fail
+
+	def get_typed(self, model):
+		if self.fail:
+			raise ConnectionError(self.IP + ' is down')
+		return model(self.version, self.model, '123', 'Rubidium')
+
+
+def test_version_key():
+	assert version_key('5.1.2') == version_key('5.1.2.0')
+	assert version_key('5.1.10') > version_key('5.1.9')
+
+
+def test_plan_lists_only_differing_devices():
+	targets = [FakeTarget('10.0.0.1', '5.1.2.0'), FakeTarget('10.0.0.2', '5.1.1.0'),
+			   FakeTarget('10.0.0.3', '5.2.0'), FakeTarget('10.0.0.4', None, fail=True),
+			   FakeTarget('10.0.0.5', '2.4.1', model='TimeProvider 4100')]
+	inventory = collect_inventory(targets)
+	assert isinstance(inventory['10.0.0.1'].value, Inventory)
+	plan = plan_upgrade(inventory, '5.1.2', models=['S650'])
+	assert plan.current == ['10.0.0.1']
+	assert plan.upgrade == [('10.0.0.2', '5.1.1.0'), ('10.0.0.3', '5.2.0')]
+	assert plan.downgrades == ['10.0.0.3']
+	assert plan.skipped == ['10.0.0.5']
+	assert plan.unknown[0][0] == '10.0.0.4'
+	assert [t.IP for t in plan.select(targets)] == ['10.0.0.2', '10.0.0.3']
+
+
+def test_rest_falls_back_to_cli(monkeypatch):
+	class FakeSSH:
+		IP = '10.0.0.1'
+
+		def get_system(self):
+			return {'softwareVer': '5.1.2.0', 'model': 'S650', 'serialNumber': '9', 'oscillator': 'OCXO'}
+	monkeypatch.setattr(inventory, 'SSH', FakeSSH)
+	result = collect_inventory([(FakeTarget('10.0.0.1', None, fail=True), FakeSSH())])
+	assert result['10.0.0.1'].value.software_ver == '5.1.2.0'
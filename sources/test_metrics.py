@@ -0,0 +1,64 @@
+import json
+from classes.fleet import Fleet
+from classes.metrics import Metrics
+
+
+def test_snapshot_groups_by_device_and_endpoint():
+	metrics = Metrics()
+	metrics.record('10.0.0.1', 'DELETE', '/ntp/servers/1', 200, 0.02)
+	metrics.record('10.0.0.1', 'DELETE', '/ntp/servers/2', 503, 1.5, retries=3)
+	metrics.record('10.0.0.1', 'GET', '/gnss', 200, 0.2, bytes_received=1200)
+	rows = metrics.snapshot()
+	assert [(r['method'], r['endpoint']) for r in rows] == [
+		('DELETE', '/ntp/servers/{id}'), ('GET', '/gnss')]
+	assert rows[0]['count'] == 2 and rows[0]['errors'] == 1 and rows[0]['retries'] == 3
+	assert rows[1]['bytesReceived'] == 1200
+
+
+def test_exports(tmp_path):
+	metrics = Metrics()
+	metrics.record('10.0.0.1', 'GET', '/gnss', 200, 0.03)
+	metrics.to_json(str(tmp_path / 'metrics.json'))
+	assert json.loads((tmp_path / 'metrics.json').read_text())[0]['count'] == 1
+	metrics.to_prometheus(str(tmp_path / 'k2.prom'))
+	text = (tmp_path / 'k2.prom').read_text()
+	assert 'k2_requests_total{device="10.0.0.1",method="GET",endpoint="/gnss",status="200"} 1' in text
+	assert 'k2_request_duration_seconds_bucket{device="10.0.0.1",method="GET",endpoint="/gnss",le="0.025"} 0' in text
+	assert 'k2_request_duration_seconds_bucket{device="10.0.0.1",method="GET",endpoint="/gnss",le="0.05"} 1' in text
+
+
+
+def test_prometheus_families_are_contiguous_and_escaped():
+	metrics = Metrics()
+	metrics.record('10.0.0.1', 'GET', '/gnss', 200, 0.03)
+	metrics.record('10.0.0.2', 'GET', '/a"b\\c', 200, 0.03)
+	families = []
+	for line in metrics.prometheus_text().splitlines():
+		if line.startswith('#'):
+			continue
+		family = line.split('{')[0]
+		for suffix in ('_bucket', '_sum', '_count'):
+			if family.endswith(suffix) and 'duration' in family:
+				family = family[:-len(suffix)]
+		if not families or families[-1] != family:
+			families.append(family)
+	assert families == ['k2_requests_total', 'k2_request_duration_seconds',
+						'k2_request_retries_total', 'k2_request_bytes_total']
+	assert 'endpoint="/a\\"b\\\\c"' in metrics.prometheus_text()
+
+
+class FakeTarget:
+	def __init__(self, IP, metrics):
+		self.IP = IP
+		self.metrics = metrics
+
+
+def test_fleet_combines_shared_and_separate_metrics():
+	shared = Metrics()
+	shared.record('10.0.0.1', 'GET', '/gnss', 200, 0.1)
+	shared.record('10.0.0.2', 'GET', '/gnss', 200, 0.1)
+	own = Metrics()
+	own.record('10.0.0.3', 'GET', '/gnss', 200, 0.1)
+	fleet = Fleet([FakeTarget('10.0.0.1', shared), FakeTarget('10.0.0.2', shared),
+				   FakeTarget('10.0.0.3', own)])
+	assert sum(r['count'] for r in fleet.metrics().snapshot()) == 3
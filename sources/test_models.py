@@ -0,0 +1,39 @@
+import json
+from classes.models import SystemState, Inventory, TimingConfig, GnssConfig, set_json_backend
+
+
+def test_system_state_resolves_enums():
+	state = SystemState.decode(b'{"syncState": "4", "currRef": 0, "powerSupply1": 2}')
+	assert state.state == 'Locked' and state.reference == 'GNSS'
+	assert state.locked
+	assert not hasattr(state, '__dict__')
+
+
+def test_inventory_nested_or_flat():
+	flat = Inventory.decode(b'{"softwareVer": "5.1.0", "inventory": {"oscillator": "OCXO"}}')
+	assert flat.software_ver == '5.1.0' and flat.oscillator == 'OCXO'
+
+
+def test_timing_and_gnss():
+	timing = TimingConfig.decode(json.dumps({'timeRefPriority': [
+		{'source': 3, 'priority': 1, 'enabled': True},
+		{'source': 0, 'priority': 0, 'enabled': True}]}).encode())
+	assert timing.first_priority().name == 'GNSS'
+	gnss = GnssConfig.decode(json.dumps({'constellation': {'sbas': 'disabled', 'satelliteSystem': [
+		{'satConstellation': 'gps', 'state': 'enabled'},
+		{'satConstellation': 'Glonass', 'state': 'disabled'}]}}).encode())
+	assert gnss.enabled() == {'GPS'}
+
+
+def test_pluggable_backend():
+	calls = []
+
+	def loads(content):
+		calls.append(content)
+		return json.loads(content)
+	set_json_backend(loads)
+	try:
+		SystemState.decode(b'{"syncState": 1, "currRef": 13}')
+	finally:
+		set_json_backend(None)
+	assert calls == [b'{"syncState": 1, "currRef": 13}']
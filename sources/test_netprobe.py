@@ -0,0 +1,60 @@
+import math
+from classes.netprobe import PingResult, latency_summary, parse_ping, probe_all
+
+IPUTILS = """PING 10.0.0.1 (10.0.0.1) 56(84) bytes of data.
+64 bytes from 10.0.0.1: icmp_seq=1 ttl=64 time=0.412 ms
+64 bytes from 10.0.0.1: icmp_seq=2 ttl=64 time=0.388 ms
+64 bytes from 10.0.0.1: icmp_seq=4 ttl=64 time=0.501 ms
+
+--- 10.0.0.1 ping statistics ---
+4 packets transmitted, 3 received, 25% packet loss, time 3004ms
+rtt min/avg/max/mdev = 0.388/0.433/0.501/0.048 ms"""
+
+BUSYBOX = """PING 10.0.0.1 (10.0.0.1): 56 data bytes
+64 bytes from 10.0.0.1: seq=0 ttl=64 time=1.200 ms
+64 bytes from 10.0.0.1: seq=1 ttl=64 time=0.800 ms
+
+--- 10.0.0.1 ping statistics ---
+2 packets transmitted, 2 packets received, 0% packet loss
+round-trip min/avg/max = 0.800/1.000/1.200 ms"""
+
+
+def test_parse_iputils():
+	result = parse_ping(IPUTILS.splitlines(), '10.0.0.1')
+	assert (result.sent, result.received, result.loss) == (4, 3, 25.0)
+	assert (result.rtt_min, result.rtt_avg, result.rtt_max, result.rtt_mdev) == (0.388, 0.433, 0.501, 0.048)
+	assert result.rtts == [0.412, 0.388, 0.501]
+	assert not result.ok
+
+
+def test_parse_busybox():
+	result = parse_ping(BUSYBOX.splitlines())
+	assert result.ok and result.loss == 0.0
+	assert result.rtt_avg == 1.0 and math.isnan(result.rtt_mdev)
+
+
+def test_latency_summary():
+	summary = latency_summary([parse_ping(IPUTILS.splitlines()), parse_ping(BUSYBOX.splitlines())])
+	assert summary['sent'] == 6 and summary['received'] == 5
+	assert summary['min'] == 0.388 and summary['max'] == 1.2
+	assert summary['p50'] == 0.501
+
+
+class FakeImage:
+	def __init__(self, DUTIP, fail=False):
+		self.DUTIP = DUTIP
+		self.fail = fail
+
+	def probe_gateway(self, rounds=1):
+		if self.fail:
+			raise OSError('no route')
+		return [PingResult(self.DUTIP, 4, 4, 0.0, rtts=[1.0, 2.0, 3.0, 4.0])] * rounds
+
+
+def test_probe_all_keeps_failures_per_dut():
+	results, summary = probe_all([FakeImage('10.0.1.5'), FakeImage('10.0.2.5', fail=True)], rounds=2)
+	assert list(results) == ['10.0.1.5', '10.0.2.5']
+	assert len(results['10.0.1.5'].value) == 2
+	assert not results['10.0.2.5'].ok
+	assert isinstance(results['10.0.2.5'].error, OSError)
+	assert summary['runs'] == 2 and summary['mean'] == 2.5
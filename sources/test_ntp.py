@@ -0,0 +1,32 @@
+from classes.ntp import plan_ntp_changes
+
+
+def test_nothing_to_do():
+	current = [{'role': 0, 'addrName': '10.241.55.21', 'prefer': False}]
+	assert plan_ntp_changes(current, [{'role': 0, 'addrName': '10.241.55.21'}]) == []
+
+
+def test_delete_all_goes_from_highest_index():
+	current = [{'addrName': 'a'}, {'addrName': 'b'}, {'addrName': 'c'}]
+	assert plan_ntp_changes(current, []) == [
+		('DELETE', '/ntp/servers/3', None),
+		('DELETE', '/ntp/servers/2', None),
+		('DELETE', '/ntp/servers/1', None)
+	]
+
+
+def test_update_uses_index_after_deletes():
+	current = [{'addrName': 'a', 'prefer': False}, {'addrName': 'b', 'prefer': False}]
+	desired = [{'addrName': 'b', 'prefer': True}, {'role': 0, 'addrName': 'c'}]
+	assert plan_ntp_changes(current, desired) == [
+		('DELETE', '/ntp/servers/1', None),
+		('PUT', '/ntp/servers/1', {'server': {'addrName': 'b', 'prefer': True}}),
+		('POST', '/ntp/servers', {'servers': [{'role': 0, 'addrName': 'c'}]})
+	]
+
+
+def test_duplicate_servers_are_removed():
+	current = [{'addrName': 'a'}, {'addrName': 'a'}]
+	assert plan_ntp_changes(current, [{'addrName': 'a'}]) == [
+		('DELETE', '/ntp/servers/2', None)
+	]
@@ -0,0 +1,77 @@
+from classes.poller import Poller, LockedTo, IsUp, VersionIs
+
+
+class ScriptedTarget:
+	"""Answers each probe with the next entry of a script. Exceptions are raised."""
+
+	def __init__(self, IP, script):
+		self.IP = IP
+		self.script = list(script)
+		self.calls = 0
+
+	def probe(self, endpoint):
+		self.calls += 1
+		step = self.script[min(self.calls, len(self.script)) - 1]
+		if isinstance(step, Exception):
+			raise step
+		return step
+
+
+def fast_poller():
+	return Poller(initial=0.01, factor=2, maximum=0.05, down_interval=0.01)
+
+
+def test_lock_reached_on_many_targets():
+	freerun = {'syncState': 1, 'currRef': 13}
+	locked_gnss = {'syncState': 4, 'currRef': 0}
+	a = ScriptedTarget('10.0.0.1', [freerun, freerun, locked_gnss])
+	b = ScriptedTarget('10.0.0.2', [locked_gnss])
+	poller = fast_poller()
+	poller.watch(a, LockedTo('GNSS'), timeout=5)
+	poller.watch(b, LockedTo('GNSS'), timeout=5)
+	results = poller.run()
+	assert results['10.0.0.1'].reached and results['10.0.0.1'].checks == 3
+	assert results['10.0.0.2'].reached and results['10.0.0.2'].checks == 1
+
+
+def test_lock_times_out():
+	target = ScriptedTarget('10.0.0.1', [{'syncState': 1, 'currRef': 13}])
+	poller = fast_poller()
+	poller.watch(target, LockedTo('GNSS'), timeout=0.2)
+	result = poller.run()['10.0.0.1']
+	assert not result.reached
+	assert result.data == {'syncState': 1, 'currRef': 13}
+
+
+def test_reboot_waits_for_device_to_go_down():
+	up = {'syncState': 4, 'currRef': 0}
+	target = ScriptedTarget('10.0.0.1', [up, up, ConnectionError(), ConnectionError(), up])
+	poller = fast_poller()
+	poller.watch(target, IsUp(require_down=True), timeout=5)
+	result = poller.run()['10.0.0.1']
+	assert result.reached
+	assert target.calls == 5
+
+
+def test_upgrade_to_wrong_version_fails_early():
+	target = ScriptedTarget('10.0.0.1', [ConnectionError(), {'softwareVer': '5.1.0'}])
+	poller = fast_poller()
+	poller.watch(target, VersionIs('5.2.0'), timeout=5)
+	result = poller.run()['10.0.0.1']
+	assert not result.reached
+	assert target.calls == 2
+
+
+def test_malformed_answer_only_fails_its_own_watch():
+	good = ScriptedTarget('10.0.0.1', [{'syncState': 4, 'currRef': 0}])
+	bad = ScriptedTarget('10.0.0.2', [{'currRef': 0}, {'syncState': 4, 'currRef': 0}])
+	broken = ScriptedTarget('10.0.0.3', [{'currRef': 0}])
+	poller = fast_poller()
+	for target in (good, bad, broken):
+		poller.watch(target, LockedTo('GNSS'), timeout=0.3)
+	results = poller.run()
+	assert results['10.0.0.1'].reached
+	# Polling goes on after the missing syncState
+	assert results['10.0.0.2'].reached and results['10.0.0.2'].checks == 2
+	assert not results['10.0.0.3'].reached
+	assert isinstance(results['10.0.0.3'].error, TypeError)
@@ -0,0 +1,72 @@
+from classes.rollout import Rollout, plan_waves
+from classes.upload import TokenBucket
+
+
+class FakeUpgrade:
+	def __init__(self, bad=()):
+		self.bad = set(bad)
+		self.upgraded = []
+		self.closed = False
+
+	def prepare(self):
+		pass
+
+	def __call__(self, device):
+		self.upgraded.append(device.IP)
+		if device.IP in self.bad:
+			raise IOError('upload failed')
+		return True
+
+	def close(self):
+		self.closed = True
+
+
+class Device:
+	def __init__(self, IP):
+		self.IP = IP
+
+
+def devices(n):
+	return [Device('10.0.0.' + str(i)) for i in range(n)]
+
+
+def test_plan_waves():
+	assert [len(w) for w in plan_waves(range(10))] == [1, 2, 4, 3]
+	assert [len(w) for w in plan_waves(range(10), canary=2, growth=3, max_wave=4)] == [2, 4, 4]
+
+
+def test_rollout_upgrades_everything():
+	upgrade = FakeUpgrade()
+	report = Rollout(devices(7), upgrade).run()
+	assert len(report.succeeded) == 7 and not report.stopped
+	assert len(report.waves) == 3 and upgrade.closed
+
+
+def test_failed_canary_stops_rollout():
+	upgrade = FakeUpgrade(bad=['10.0.0.0'])
+	report = Rollout(devices(7), upgrade).run()
+	assert report.stopped and report.failed == ['10.0.0.0']
+	assert upgrade.upgraded == ['10.0.0.0']
+	assert len(report.skipped) == 6
+
+
+def test_failure_rate_threshold():
+	upgrade = FakeUpgrade(bad=['10.0.0.3'])
+	report = Rollout(devices(15), upgrade, max_failure_rate=0.5).run()
+	assert not report.stopped and len(report.failed) == 1
+	report = Rollout(devices(15), FakeUpgrade(bad=['10.0.0.1', '10.0.0.2']), max_failure_rate=0.5).run()
+	assert report.stopped and len(report.skipped) == 12
+
+
+def test_token_bucket_limits_rate():
+	now = [0.0]
+	slept = []
+
+	def sleep(seconds):
+		slept.append(seconds)
+		now[0] += seconds
+	bucket = TokenBucket(1000, clock=lambda: now[0], sleep=sleep)
+	bucket.consume(1000)
+	assert slept == []
+	bucket.consume(500)
+	assert slept == [0.5]
@@ -0,0 +1,91 @@
+import threading
+import pexpect
+from classes.session_pool import SessionPool
+
+
+class FakeChild:
+	"""Stands in for pexpect.spawn: every expect() succeeds while the child is alive."""
+
+	def __init__(self, command, timeout=30):
+		self.command = command
+		self.timeout = timeout
+		self.sent = []
+		self.alive = True
+
+	def expect(self, pattern, timeout=-1):
+		if not self.alive:
+			raise pexpect.EOF('closed')
+		return 0
+
+	def sendline(self, line=''):
+		self.sent.append(line)
+
+	def isalive(self):
+		return self.alive
+
+	def close(self):
+		self.alive = False
+
+
+def make_pool(**kwargs):
+	spawned = []
+
+	def spawn(command, timeout=30):
+		child = FakeChild(command, timeout)
+		spawned.append(child)
+		return child
+	return SessionPool(spawn=spawn, **kwargs), spawned
+
+
+def test_reuses_logged_in_session():
+	pool, spawned = make_pool()
+	with pool.session('10.0.0.1', 'testuser', 'pw', 'SyncServer:') as child:
+		child.sendline('show system')
+	with pool.session('10.0.0.1', 'testuser', 'pw', 'SyncServer:') as again:
+		assert again is child
+	assert len(spawned) == 1
+	assert pool.logins == 1 and pool.reuses == 1
+
+
+def test_root_and_user_sessions_are_separate():
+	pool, spawned = make_pool()
+	with pool.session('10.0.0.1', 'testuser', 'pw', 'SyncServer:'):
+		pass
+	with pool.session('10.0.0.1', 'testuser', 'pw', 'SyncServer:', root_passwd='root') as child:
+		assert 'su' in child.sent
+	assert len(spawned) == 2
+
+
+def test_dead_session_is_replaced():
+	pool, spawned = make_pool()
+	with pool.session('10.0.0.1', 'testuser', 'pw', 'SyncServer:') as child:
+		child.close()
+	with pool.session('10.0.0.1', 'testuser', 'pw', 'SyncServer:') as again:
+		assert again is not child
+	assert len(spawned) == 2
+
+
+def test_idle_eviction():
+	pool, spawned = make_pool(max_idle=0)
+	with pool.session('10.0.0.1', 'testuser', 'pw', 'SyncServer:'):
+		pass
+	pool.evict_idle()
+	assert not spawned[0].alive
+
+
+def test_concurrent_callers_get_their_own_session():
+	pool, spawned = make_pool(max_per_key=2)
+	held = []
+	barrier = threading.Barrier(2)
+
+	def worker():
+		with pool.session('10.0.0.2', 'testuser', 'pw', 'SyncServer:') as child:
+			held.append(child)
+			barrier.wait(timeout=5)
+	threads = [threading.Thread(target=worker) for _ in range(2)]
+	for t in threads:
+		t.start()
+	for t in threads:
+		t.join()
+	assert held[0] is not held[1]
+	assert len(spawned) == 2
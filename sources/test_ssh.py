@@ -0,0 +1,124 @@
+import math
+import pexpect
+import pytest
+from conftest import FakeShell
+from classes import gnss_analytics
+from classes import ssh as ssh_module
+from classes.session_pool import read_lines
+from classes.ssh import SSH
+
+SHOW_SYSTEM = """show system\r
+Serial Num      : 1234567\r
+Model Num       : SyncServer S650\r
+Build           : 5.1.2\r
+Oscillator Type : Rubidium\r
+"""
+
+
+class BufferChild(FakeShell):
+	"""pexpect child that serves a fixed output, enough for expect on patterns and lists."""
+
+	no_match = pexpect.EOF
+
+	def __init__(self, output, prompt='SyncServer:'):
+		FakeShell.__init__(self, output + prompt)
+
+
+def test_read_lines_skips_echo():
+	child = BufferChild(SHOW_SYSTEM)
+	lines = list(read_lines(child, 'show system', 'SyncServer:'))
+	assert child.sent == ['show system']
+	assert lines[0].startswith('Serial Num')
+	assert len(lines) == 4
+
+
+def test_read_lines_drains_to_prompt_when_stopped_early():
+	child = BufferChild(SHOW_SYSTEM + 'extra\r\n')
+	lines = read_lines(child, 'show system', 'SyncServer:')
+	next(lines)
+	lines.close()
+	assert child.data == b''
+
+
+def test_get_system_streams(monkeypatch):
+	child = BufferChild(SHOW_SYSTEM)
+	monkeypatch.setattr(ssh_module, 'login', lambda *args, **kwargs: child)
+	device = SSH('10.0.0.1', 'testuser', 'pw', 'root', 'SyncServer:')
+	assert device.get_system() == {'serialNumber': '1234567', 'model': 'SyncServer S650',
+								   'softwareVer': '5.1.2', 'oscillator': 'Rubidium'}
+
+SHOW_GNSS = """show gnss status\r
+Latitude                  : 37 24 47.054 N\r
+Used Satellites           : 2\r
+|Index|Sat ID|GNSS ID|SNR|Azimuth|Elevation|PR Res|\r
+|1    |12    |GPS    |42 |180    |45       |0.3   |\r
+|2    |7     |GPS    |-- |90     |10       |0.1   |\r
+"""
+
+
+def test_get_gnss_as_columns_without_numpy(monkeypatch):
+	monkeypatch.setattr(gnss_analytics, 'np', None)
+	monkeypatch.setattr(ssh_module, 'login', lambda *args, **kwargs: BufferChild(SHOW_GNSS))
+	device = SSH('10.0.0.1', 'testuser', 'pw', 'root', 'SyncServer:')
+	with pytest.raises(ImportError):
+		device.get_gnss(as_array=True)
+	device.child = BufferChild(SHOW_GNSS)
+	columns, status = device.get_gnss(as_columns=True)
+	assert status['usedSatellites'] == '2'
+	assert list(columns['satId']) == [12.0, 7.0]
+	assert columns['snr'][0] == 42.0
+	assert math.isnan(columns['snr'][1])
+
+
+class CliChild(BufferChild):
+	"""Echoes every line it is sent, then its output and the prompt, like the CLI does."""
+
+	outputs = {
+		'show system': SHOW_SYSTEM.split('\r\n', 1)[1],
+		'show alarm': '|ID |Severity|Time               |Description|\r\n'
+					  '|175|MINOR   |2021-09-09 04:14:35|No power   |\r\n'
+	}
+
+	def __init__(self):
+		BufferChild.__init__(self, '', '')
+
+	def reply(self, line):
+		return ' ' + line + '\r\n' + self.outputs.get(line, '') + 'SyncServer:'
+
+	def expect(self, pattern, timeout=-1):
+		self.sent_before_read = getattr(self, 'sent_before_read', len(self.sent))
+		return BufferChild.expect(self, pattern, timeout)
+
+
+def test_run_batch_splits_output_per_command(monkeypatch):
+	child = CliChild()
+	monkeypatch.setattr(ssh_module, 'login', lambda *args, **kwargs: child)
+	device = SSH('10.0.0.1', 'testuser', 'pw', 'root', 'SyncServer:')
+	system, alarms, empty = device.run_batch(['show system', 'show alarm', 'show clock'])
+	assert device.parse_system(system)['softwareVer'] == '5.1.2'
+	assert device.parse_alarms(alarms)[0]['eventId'] == 175
+	assert empty == []
+	assert child.data == b''
+	assert len(child.sent) == 6
+	# Every command and marker goes out before the first read
+	assert child.sent_before_read == 6
+
+
+class TtyEchoChild(CliChild):
+	"""Echoes the typed ahead marker in the middle of a command's output, like a tty does."""
+
+	def reply(self, line):
+		if line.startswith('#batch'):
+			return line + '\r\n' + self.rest + 'SyncServer: ' + line + '\r\nSyncServer:'
+		first, _, self.rest = self.outputs.get(line, '').partition('\r\n')
+		return ' ' + line + '\r\n' + (first + '\r\n' if first else '')
+
+
+def test_run_batch_ignores_marker_echo_inside_output(monkeypatch):
+	child = TtyEchoChild()
+	monkeypatch.setattr(ssh_module, 'login', lambda *args, **kwargs: child)
+	device = SSH('10.0.0.1', 'testuser', 'pw', 'root', 'SyncServer:')
+	system, alarms = device.run_batch(['show system', 'show alarm'])
+	assert system == SHOW_SYSTEM.split('\r\n')[1:-1]
+	assert device.parse_alarms(alarms)[0]['eventId'] == 175
+	assert child.data == b''
@@ -0,0 +1,62 @@
+from classes.table import PipeTable, is_separator, split_row
+from classes.ssh import SSH
+
+ALARMS = """show alarm
+|ID |Severity|Time               |Description                    |
+|---|--------|-------------------|-------------------------------|
+|175|MINOR   |2021-09-09 04:14:35|No power detected on AC2       |
+|176|MAJOR   |2021-09-09 04:15:00|GNSS antenna open              |
+|---|--------|-------------------|-------------------------------|
+SyncServer:"""
+
+GNSS = """show gnss status
+Latitude                  : 37 24 47.054 N
+Longitude                 : 121 55 47.370 W
+Used Satellites           : 2
+Antenna Status            : OK
+|Index|GNSS ID|SNR|Azimuth|Elevation|PR Res|
+|-----|-------|---|-------|---------|------|
+|  1  |GPS    |45 |120    |60       |0.5   |
+|  2  |GLONASS|38 |200    |15       |-1.2  |
+"""
+
+
+def parser():
+	# Skip the login in __init__, only the parsers are under test
+	ssh = SSH.__new__(SSH)
+	ssh.alarm_severity = {'MAJOR': 3, 'MINOR': 4, 'NOTIFY': 5}
+	return ssh
+
+
+def test_helpers():
+	assert is_separator('|---|--------|')
+	assert is_separator('+----+----+')
+	assert not is_separator('|175|MINOR|')
+	assert split_row('|175|MINOR   | x |') == ['175', 'MINOR', 'x']
+
+
+def test_columns_are_found_by_header_name():
+	table = PipeTable('ID', {'desc': (('Description',), 0), 'sev': (('Severity',), 0)})
+	rows = list(table.records(ALARMS.splitlines()))
+	assert rows[0] == {'desc': 'No power detected on AC2', 'sev': 'MINOR'}
+	assert table.header == ['ID', 'Severity', 'Time', 'Description']
+
+
+def test_columnar_output():
+	table = PipeTable('ID', {'eventId': (('ID',), 0)})
+	assert table.to_columns(ALARMS.splitlines()) == {'eventId': ['175', '176']}
+
+
+def test_get_alarms_parser():
+	assert parser().parse_alarms(ALARMS.splitlines()) == [
+		{'eventId': 175, 'severity': 4, 'desc': 'No power detected on AC2'},
+		{'eventId': 176, 'severity': 3, 'desc': 'GNSS antenna open'}
+	]
+
+
+def test_get_gnss_parser():
+	gps_list, data = parser().parse_gnss(GNSS.splitlines())
+	assert data == {'latitude': '37 24 47.054 N', 'longitude': '121 55 47.370 W',
+					'usedSatellites': '2', 'antennaStatus': 'OK'}
+	assert gps_list[1] == {'satId': '2', 'gnssId': 'GLONASS', 'snr': '38',
+						   'azimuthAngle': '200', 'elevationAngle': '15', 'prRes': '-1.2'}
@@ -0,0 +1,77 @@
+import pytest
+import requests
+from classes.target import Target, connect_all
+from classes.transport import Transport, RetryPolicy
+
+
+class UnreachableSession:
+	"""Stands in for requests.Session on a network where no K2 answers."""
+
+	def __init__(self):
+		self.calls = 0
+
+	def request(self, method, url, **kwargs):
+		self.calls += 1
+		raise requests.exceptions.ConnectionError('No route to host')
+
+
+def test_construction_does_no_network_io():
+	target = Target('127.0.0.1', 'v2', 'admin', 'admin')
+	assert not target.connected
+
+
+def test_connect_all_reports_failures_per_target():
+	targets = []
+	for IP in ('10.0.0.1', '10.0.0.2'):
+		target = Target(IP, 'v2', 'admin', 'admin',
+						transport=Transport(policy=RetryPolicy(retries=1, backoff=0), sleep=lambda s: None))
+		target.session = UnreachableSession()
+		targets.append(target)
+	results = connect_all(targets)
+	assert sorted(results) == ['10.0.0.1', '10.0.0.2']
+	assert not any(r.ok for r in results.values())
+	assert not any(t.connected for t in targets)
+	assert all(t.session.calls for t in targets)
+
+
+def test_read_telemetry_keeps_fields_of_working_probes():
+	target = Target('10.0.0.1', 'v2', 'admin', 'admin')
+
+	def probe(endpoint, timeout=10):
+		if endpoint == '/gnss':
+			raise ConnectionError('gnss timed out')
+		return {'syncState': 4, 'currRef': 0}
+	target.probe = probe
+	sample = target.read_telemetry()
+	assert sample['syncState'] == 4
+	assert sample['satellites'] is None
+	assert sample['majorAlarms'] is None
+
+
+def test_upgrade_releases_image_files_when_upload_fails(tmp_path):
+	class FakeImage:
+		version = '5.1.2.0'
+		name = 'SyncServer6x0_v5.1.2.bin'
+		auth_name = '5.1.2.0_auth.dat'
+		released = False
+
+		def get_image(self):
+			for name in (self.name, self.auth_name):
+				(tmp_path / name).write_bytes(b'data')
+
+		def local_path(self, name):
+			return str(tmp_path / name)
+
+		def release_files(self):
+			self.released = True
+
+	target = Target('10.0.0.1', 'v2', 'admin', 'admin')
+	target.get = lambda endpoint: {'softwareVer': '5.1.1.0'}
+
+	def upload_firmware(auth, upgrade_file):
+		raise ConnectionError('upload dropped')
+	target.upload_firmware = upload_firmware
+	image = FakeImage()
+	with pytest.raises(ConnectionError):
+		target.upgrade(image)
+	assert image.released
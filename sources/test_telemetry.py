@@ -0,0 +1,63 @@
+import math
+import time
+from classes.target import Target
+from classes.telemetry import RingBuffer, Series, TelemetrySampler
+
+
+def test_ring_buffer_wraps():
+	ring = RingBuffer(3)
+	for value in range(5):
+		ring.append(value)
+	assert len(ring) == 3
+	assert list(ring.values()) == [2.0, 3.0, 4.0]
+	assert ring.last() == 4.0
+
+
+def test_series_rollup_skips_missing_values():
+	series = Series(capacity=4, rollup=3, rollup_capacity=10)
+	for t, value in enumerate([1, math.nan, 5, 2, 2, 2, 7]):
+		series.append(t, value)
+	assert list(series.raw.values())[-1] == 7.0
+	assert list(series.rollup_times.values()) == [0.0, 3.0]
+	assert list(series.mins.values()) == [1.0, 2.0]
+	assert list(series.maxs.values()) == [5.0, 2.0]
+	assert list(series.means.values()) == [3.0, 2.0]
+
+
+class FakeTarget:
+	def __init__(self, IP, fail=False):
+		self.IP = IP
+		self.fail = fail
+
+	def read_telemetry(self, alarms_endpoint=None):
+		if self.fail:
+			raise ConnectionError(self.IP)
+		return {'syncState': 4, 'currRef': 0, 'satellites': 11, 'majorAlarms': 0, 'minorAlarms': 1}
+
+
+def test_sampler_records_every_device():
+	sampler = TelemetrySampler([FakeTarget('10.0.0.1'), FakeTarget('10.0.0.2', fail=True)],
+							   interval=0.01, capacity=50).start()
+	time.sleep(0.2)
+	sampler.stop()
+	snapshot = sampler.snapshot()
+	assert snapshot['10.0.0.1']['satellites'] == 11.0
+	assert math.isnan(snapshot['10.0.0.2']['satellites'])
+	assert len(sampler.series('10.0.0.1', 'syncState').raw) > 5
+	assert sampler.devices['10.0.0.2'].errors > 5
+
+
+def test_sampler_counts_alarms(monkeypatch):
+	target = Target('10.0.0.1', 'v2', 'admin', 'admin')
+	responses = {
+		'/system/state': {'syncState': 4, 'currRef': 0},
+		'/gnss': {'usedSatellites': 9},
+		'/alarms/active': [{'severity': 3}, {'severity': 4}, {'severity': 4}]
+	}
+	monkeypatch.setattr(target, 'probe', lambda endpoint, timeout=10: responses[endpoint])
+	sampler = target.start_telemetry(interval=0.01, capacity=50, alarms_endpoint='/alarms/active')
+	time.sleep(0.1)
+	sampler.stop()
+	latest = sampler.snapshot()['10.0.0.1']
+	assert (latest['majorAlarms'], latest['minorAlarms']) == (1.0, 2.0)
+	assert latest['satellites'] == 9.0
@@ -0,0 +1,69 @@
+import pytest
+from conftest import FakeShell
+from classes.ssh import SSH
+from classes.transcript import REDACTED, RecordingSpawn, ReplayError, ReplaySpawn, TranscriptWriter
+
+OUTPUTS = {
+	'show system': 'Serial Num      : 1234567\r\nBuild           : 5.1.2\r\n',
+	'show alarm': '|ID |Severity|Time               |Description|\r\n'
+				  '|---|--------|-------------------|-----------|\r\n'
+				  '|175|MINOR   |2021-09-09 04:14:35|No power   |\r\n'
+}
+
+
+class ScriptedChild(FakeShell):
+	"""Fake ssh process: asks for a password, then answers the OUTPUTS commands."""
+
+	def __init__(self, command, timeout=30):
+		FakeShell.__init__(self, 'Password: ', timeout)
+
+	def reply(self, line):
+		if line == 'su':
+			return 'su\r\nPassword: '
+		if line in OUTPUTS:
+			return line + '\r\n' + OUTPUTS[line] + '\r\nSyncServer:'
+		return '\r\nSyncServer:'
+
+
+@pytest.mark.parametrize('name', ['lab.jsonl', 'lab.jsonl.gz'])
+def test_record_then_replay(tmp_path, name):
+	path = str(tmp_path / name)
+	with TranscriptWriter(path) as writer:
+		device = SSH('10.0.0.1', 'testuser', 'pw', 'root', 'SyncServer:',
+					 spawn=RecordingSpawn(writer, spawn=ScriptedChild))
+		system = device.get_system()
+		alarms = device.get_alarms()
+		device.close()
+
+	replayed = SSH('10.0.0.1', 'testuser', 'pw', 'root', 'SyncServer:', spawn=ReplaySpawn(path))
+	assert replayed.get_system() == system == {'serialNumber': '1234567', 'softwareVer': '5.1.2'}
+	# Replay matches on the output, not on the recorded expect steps
+	assert 'No power' in replayed.get_cmd_results('show alarm')
+	assert alarms[0]['eventId'] == 175
+
+
+def test_replay_rejects_unrecorded_commands(tmp_path):
+	path = str(tmp_path / 'lab.jsonl')
+	with TranscriptWriter(path) as writer:
+		SSH('10.0.0.1', 'testuser', 'pw', 'root', 'SyncServer:',
+			spawn=RecordingSpawn(writer, spawn=ScriptedChild)).get_system()
+	replayed = SSH('10.0.0.1', 'testuser', 'pw', 'root', 'SyncServer:', spawn=ReplaySpawn(path))
+	with pytest.raises(ReplayError):
+		replayed.get_gnss()
+
+
+def test_passwords_are_not_recorded(tmp_path):
+	path = str(tmp_path / 'lab.jsonl')
+	with TranscriptWriter(path) as writer:
+		device = SSH('10.0.0.1', 'testuser', 'login-secret', 'root-secret', 'SyncServer:',
+					 spawn=RecordingSpawn(writer, spawn=ScriptedChild))
+		device.connect_root()
+		device.get_system()
+	with open(path) as f:
+		text = f.read()
+	assert 'secret' not in text
+	assert REDACTED in text
+	# Replay takes any password where the recording was redacted
+	replayed = SSH('10.0.0.1', 'testuser', 'other', 'other-root', 'SyncServer:', spawn=ReplaySpawn(path))
+	replayed.connect_root()
+	assert replayed.get_system()['serialNumber'] == '1234567'
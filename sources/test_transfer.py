@@ -0,0 +1,100 @@
+import hashlib
+import os
+import pexpect
+import pytest
+from classes.session_pool import SSH_OPTIONS
+from classes.transfer import RangedTransfer, split_ranges
+
+SSH = 'ssh' + SSH_OPTIONS + ' build@buildhost '
+
+
+def local_spawn(calls):
+	# Runs the "remote" command on this machine instead of over ssh
+	def spawn(command, timeout=30):
+		calls.append(command)
+		return pexpect.spawn(command.replace(SSH, 'bash -c '), timeout=timeout)
+	return spawn
+
+
+@pytest.fixture
+def remote(tmp_path):
+	path = tmp_path / 'SyncServer6x0_v5.1.2.bin'
+	path.write_bytes(os.urandom(100000))
+	return str(path)
+
+
+def test_split_ranges():
+	assert split_ranges(10, 4) == [(0, 3), (3, 3), (6, 3), (9, 1)]
+	assert split_ranges(2, 4) == [(0, 1), (1, 1)]
+	assert split_ranges(0, 4) == []
+
+
+def test_parallel_download_is_verified(tmp_path, remote):
+	calls = []
+	transfer = RangedTransfer('buildhost', 'build', 'pw', streams=4, spawn=local_spawn(calls))
+	dest = str(tmp_path / 'out.bin')
+	report = transfer.download(remote, dest)
+	with open(remote, 'rb') as f:
+		expected = f.read()
+	with open(dest, 'rb') as f:
+		assert f.read() == expected
+	assert report.sha256 == hashlib.sha256(expected).hexdigest()
+	assert report.downloaded == 100000 and report.resumed == 0
+	assert len([c for c in calls if 'tail -c' in c]) == 4
+	assert sorted(os.listdir(str(tmp_path))) == ['SyncServer6x0_v5.1.2.bin', 'out.bin']
+
+
+def test_resumes_partial_parts(tmp_path, remote):
+	with open(remote, 'rb') as f:
+		expected = f.read()
+	dest = str(tmp_path / 'out.bin')
+	transfer = RangedTransfer('buildhost', 'build', 'pw', streams=2, spawn=local_spawn([]))
+	transfer._manifest(dest, len(expected))
+	with open(dest + '.part0', 'wb') as f:
+		f.write(expected[:30000])
+	with open(dest + '.part1', 'wb') as f:
+		f.write(expected[50000:])
+	report = transfer.download(remote, dest, size=len(expected),
+							   expected_sha256=hashlib.sha256(expected).hexdigest())
+	assert report.resumed == 80000 and report.downloaded == 20000
+	with open(dest, 'rb') as f:
+		assert f.read() == expected
+
+
+def test_checksum_mismatch(tmp_path, remote):
+	transfer = RangedTransfer('buildhost', 'build', 'pw', spawn=local_spawn([]))
+	with pytest.raises(IOError):
+		transfer.download(remote, str(tmp_path / 'out.bin'), expected_sha256='00')
+	assert not os.path.exists(str(tmp_path / 'out.bin'))
+
+
+def test_timed_out_stream_is_stopped_and_its_bytes_dropped(tmp_path, remote):
+	dest = str(tmp_path / 'out.bin')
+	hung = []
+
+	class HungChild:
+		"""ssh that writes part of a range, then stops answering."""
+
+		exitstatus = None
+
+		def expect(self, pattern, timeout=-1):
+			with open(dest + '.part0', 'ab') as f:
+				f.write(b'garbage')
+			raise pexpect.TIMEOUT('no EOF')
+
+		def close(self, force=False):
+			self.closed = force
+
+	real = local_spawn([])
+
+	def spawn(command, timeout=30):
+		if 'tail -c +1 ' in command and not hung:
+			hung.append(HungChild())
+			return hung[0]
+		return real(command, timeout)
+	transfer = RangedTransfer('buildhost', 'build', 'pw', streams=2, spawn=spawn)
+	report = transfer.download(remote, dest)
+	assert hung[0].closed
+	assert report.retries == 1
+	with open(remote, 'rb') as f, open(dest, 'rb') as out:
+		assert out.read() == f.read()
@@ -0,0 +1,104 @@
+import pytest
+import requests
+import urllib3
+from classes.transport import Transport, RetryPolicy, CircuitBreaker, deadline, \
+	TargetHTTPError, TargetConnectionError, CircuitOpenError
+
+
+class FakeResponse:
+	def __init__(self, status_code):
+		self.status_code = status_code
+		self.reason = 'Reason'
+		self.text = '{}'
+
+
+class FakeSession:
+	"""Answers requests from a script of status codes and exceptions."""
+
+	def __init__(self, script):
+		self.script = list(script)
+		self.calls = 0
+
+	def request(self, method, url, **kwargs):
+		step = self.script[min(self.calls, len(self.script) - 1)]
+		self.calls += 1
+		if isinstance(step, Exception):
+			raise step
+		return FakeResponse(step)
+
+
+def transport(**kwargs):
+	return Transport(policy=RetryPolicy(retries=3, backoff=0), sleep=lambda s: None, **kwargs)
+
+
+def test_retries_then_succeeds():
+	session = FakeSession([requests.exceptions.ConnectionError(), 503, 200])
+	response = transport().request(session, 'GET', 'https://k2/api/v2/gnss')
+	assert response.status_code == 200
+	assert session.calls == 3
+
+
+def test_gives_up_with_typed_error():
+	session = FakeSession([requests.exceptions.ConnectionError()])
+	with pytest.raises(TargetConnectionError):
+		transport().request(session, 'GET', 'https://k2/api/v2/gnss', device='10.0.0.1')
+	assert session.calls == 4
+
+
+def test_client_errors_and_post_timeouts_are_not_retried():
+	session = FakeSession([404])
+	with pytest.raises(TargetHTTPError) as e:
+		transport().request(session, 'GET', 'https://k2/api/v2/nope')
+	assert e.value.status_code == 404
+	assert session.calls == 1
+	session = FakeSession([requests.exceptions.ReadTimeout()])
+	with pytest.raises(TargetConnectionError):
+		transport().request(session, 'POST', 'https://k2/api/v2/ntp/servers')
+	assert session.calls == 1
+
+
+def test_circuit_breaker_opens_and_resets():
+	now = [0.0]
+	breaker = CircuitBreaker(threshold=2, reset_timeout=60, clock=lambda: now[0])
+	t = transport(breaker=breaker)
+	session = FakeSession([requests.exceptions.ConnectionError()] * 8 + [200])
+	for _ in range(2):
+		with pytest.raises(TargetConnectionError):
+			t.request(session, 'GET', 'https://k2/api/v2/gnss')
+	with pytest.raises(CircuitOpenError):
+		t.request(session, 'GET', 'https://k2/api/v2/gnss')
+	assert session.calls == 8
+	now[0] = 61
+	assert t.request(session, 'GET', 'https://k2/api/v2/gnss').status_code == 200
+	assert breaker.state == 'closed'
+
+
+def test_deadline_caps_timeout_and_retries():
+	class RecordingSession(FakeSession):
+		def request(self, method, url, **kwargs):
+			self.timeout = kwargs['timeout']
+			return super().request(method, url, **kwargs)
+
+	session = RecordingSession([requests.exceptions.ConnectionError()])
+	t = Transport(policy=RetryPolicy(retries=3, backoff=1, jitter=False), sleep=lambda s: None,
+				  timeout=(5, 30))
+	with deadline(0.5):
+		with pytest.raises(TargetConnectionError):
+			t.request(session, 'GET', 'https://k2/api/v2/gnss')
+	assert all(0 < t <= 0.5 for t in session.timeout)
+	# The first retry would wait a second, longer than the time left
+	assert session.calls == 1
+
+
+def test_post_is_only_retried_when_never_sent():
+	dropped = requests.exceptions.ConnectionError(urllib3.exceptions.MaxRetryError(
+		None, '/api/v2/ntp/reset', urllib3.exceptions.ProtocolError('Connection aborted.')))
+	session = FakeSession([dropped, 200])
+	with pytest.raises(TargetConnectionError):
+		transport().request(session, 'POST', 'https://k2/api/v2/ntp/reset')
+	assert session.calls == 1
+	refused = requests.exceptions.ConnectionError(urllib3.exceptions.MaxRetryError(
+		None, '/api/v2/ntp/reset', urllib3.exceptions.NewConnectionError(None, 'Connection refused')))
+	session = FakeSession([refused, 200])
+	assert transport().request(session, 'POST', 'https://k2/api/v2/ntp/reset').status_code == 200
+	assert session.calls == 2
@@ -0,0 +1,63 @@
+import email
+import hashlib
+import pytest
+from classes.upload import SharedImage, MultipartUpload
+
+
+@pytest.fixture
+def firmware(tmp_path):
+	bin_path = tmp_path / 'SyncServer6x0_v5.1.0.bin'
+	bin_path.write_bytes(bytes(range(256)) * 4096)
+	auth_path = tmp_path / '5.1.0_auth.dat'
+	auth_path.write_bytes(b'auth')
+	return str(bin_path), str(auth_path)
+
+
+def read_all(body, block=8192):
+	chunks = []
+	while True:
+		chunk = body.read(block)
+		if not chunk:
+			return b''.join(chunks)
+		chunks.append(chunk)
+
+
+def test_body_is_valid_multipart(firmware):
+	bin_path, auth_path = firmware
+	seen = []
+	with SharedImage(auth_path) as auth, SharedImage(bin_path) as image:
+		body = MultipartUpload([('authfile', auth.name), ('upgradefile', image.name)],
+							   [('authfile', auth), ('upgradefile', image)],
+							   device='10.0.0.1', callback=seen.append)
+		raw = read_all(body)
+		assert len(raw) == len(body)
+		assert body.progress.done
+		assert seen[-1].sent == len(raw)
+		message = email.message_from_bytes(
+			b'Content-Type: ' + body.content_type.encode('ascii') + b'\r\n\r\n' + raw)
+		parts = message.get_payload()
+		assert [p.get_param('name', header='content-disposition') for p in parts] == \
+			['authfile', 'upgradefile', 'authfile', 'upgradefile']
+		assert parts[0].get_payload() == '5.1.0_auth.dat'
+		assert parts[2].get_payload(decode=True) == b'auth'
+		assert parts[3].get_payload(decode=True) == bytes(image.view)
+
+
+def test_one_map_many_uploads(firmware):
+	bin_path, auth_path = firmware
+	with SharedImage(bin_path) as image:
+		first = MultipartUpload([], [('upgradefile', image)])
+		second = MultipartUpload([], [('upgradefile', image)])
+		data = bytes(image.view)
+		assert data in read_all(first, 1000)
+		assert data in read_all(second, 3000)
+
+
+def test_checksum(firmware):
+	bin_path, _ = firmware
+	with open(bin_path, 'rb') as f:
+		digest = hashlib.sha256(f.read()).hexdigest()
+	with SharedImage(bin_path, expected_sha256=digest.upper()) as image:
+		assert image.sha256() == digest
+	with pytest.raises(ValueError):
+		SharedImage(bin_path, expected_sha256='0' * 64)